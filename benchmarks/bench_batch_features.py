@@ -0,0 +1,80 @@
+"""
+Feature extraction throughput in (user, medication) pairs/sec: the per-pair
+extract_features loop vs. extract_features_batch.
+
+    python benchmarks/bench_batch_features.py --pairs 10000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from common import setup_django, make_users
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pairs', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--scalar-sample', type=int, default=1000,
+                        help='Pairs timed through the per-pair loop (it is too slow for all of them)')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from medicines.models import Medication
+    from medicines.utils.batch_features import extract_features_batch
+    from medicines.utils.feature_extractor import extract_features
+
+    rng = random.Random(42)
+    user_ids = make_users(args.pairs // 2)
+    Medication.objects.bulk_create(
+        [
+            Medication(user_id=user_id, pill_name=f"Pill {n}", dosage=100, times=['08:00', '20:00'])
+            for user_id in user_ids for n in range(2)
+        ],
+        batch_size=5000
+    )
+    meds = list(Medication.objects.values_list('id', 'user_id'))
+    now = datetime.now(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    first_day = now - timedelta(days=args.days)
+
+    print(f"Inserting {len(meds) * 2 * (args.days + 1)} dose logs for {len(meds)} pairs...")
+    with connection.cursor() as cursor:
+        for day in range(args.days + 1):
+            rows = []
+            for med_id, user_id in meds:
+                for hour in (8, 20):
+                    scheduled = first_day + timedelta(days=day, hours=hour)
+                    if scheduled > now:
+                        status = 'pending'
+                    else:
+                        status = 'taken' if rng.random() < 0.85 else 'missed'
+                    rows.append((scheduled, scheduled, status, med_id, user_id))
+            cursor.executemany(
+                'INSERT INTO medicines_doselog (timestamp, scheduled_time, status, medication_id, user_id) '
+                'VALUES (%s, %s, %s, %s, %s)',
+                rows
+            )
+        cursor.execute('ANALYZE')
+
+    sample = rng.sample(meds, min(args.scalar_sample, len(meds)))
+    users = User.objects.in_bulk({user_id for _, user_id in sample})
+    med_objs = Medication.objects.in_bulk([med_id for med_id, _ in sample])
+    start = time.perf_counter()
+    for med_id, user_id in sample:
+        extract_features(users[user_id], med_objs[med_id])
+    scalar = len(sample) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    frame = extract_features_batch()
+    batch = len(frame) / (time.perf_counter() - start)
+
+    print(f"{'extractor':>10} {'pairs':>8} {'pairs/s':>12}")
+    print(f"{'scalar':>10} {len(sample):>8} {scalar:>12,.0f}")
+    print(f"{'batch':>10} {len(frame):>8} {batch:>12,.0f}   ({batch / scalar:.0f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+DoseLog hot-path queries on the original schema (single-column FK indexes plus
+Meta.ordering = ['scheduled_time']) vs. the composite indexes, with query plans.
+
+    python benchmarks/bench_doselog_indexes.py --rows 2000000
+"""
+import argparse
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from common import setup_django, timed, make_users
+
+COMPOSITE_INDEXES = ['doselog_user_time_idx', 'doselog_user_status_idx', 'doselog_status_time_idx']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from medicines.models import DoseLog, Medication
+
+    rng = random.Random(42)
+    user_ids = make_users(args.users)
+    # Two medications per user, each taken twice a day
+    Medication.objects.bulk_create(
+        [
+            Medication(user_id=user_id, pill_name=f"Pill {n}", dosage=100, times=['08:00', '20:00'])
+            for user_id in user_ids for n in range(2)
+        ],
+        batch_size=5000
+    )
+    meds = list(Medication.objects.values_list('id', 'user_id'))
+    days = max(args.rows // (len(meds) * 2), 1)
+    now = datetime.now(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    first_day = now - timedelta(days=days)
+
+    print(f"Inserting {len(meds) * 2 * days} dose logs ({days} days of history)...")
+    with connection.cursor() as cursor:
+        for day in range(days):
+            rows = []
+            for med_id, user_id in meds:
+                for hour in (8, 20):
+                    scheduled = first_day + timedelta(days=day, hours=hour)
+                    if scheduled > now:
+                        status = 'pending'
+                    else:
+                        status = 'taken' if rng.random() < 0.85 else rng.choice(['missed', 'pending'])
+                    rows.append((scheduled, scheduled, status, med_id, user_id))
+            cursor.executemany(
+                'INSERT INTO medicines_doselog (timestamp, scheduled_time, status, medication_id, user_id) '
+                'VALUES (%s, %s, %s, %s, %s)',
+                rows
+            )
+        cursor.execute('ANALYZE')
+
+    def queries(user_id, med_id, ordered):
+        # Meta.ordering used to add ORDER BY scheduled_time to every non-aggregate query
+        def order(qs):
+            return qs.order_by('scheduled_time') if ordered else qs.order_by()
+        day = now - timedelta(days=1)
+        return {
+            'today logs': order(DoseLog.objects.filter(
+                user_id=user_id, scheduled_time__range=(day, day + timedelta(days=1))
+            )),
+            '30-day window': order(DoseLog.objects.filter(
+                user_id=user_id, status='taken', scheduled_time__gte=now - timedelta(days=30)
+            )),
+            'slot lookup': order(DoseLog.objects.filter(
+                user_id=user_id, medication_id=med_id, scheduled_time=day + timedelta(hours=8)
+            )),
+            'missed history': order(DoseLog.objects.filter(user_id=user_id, status='missed')),
+            'sweeper batch': order(DoseLog.objects.filter(
+                status='pending', scheduled_time__lt=now - timedelta(days=1)
+            ).values_list('id', flat=True))[:5000],
+        }
+
+    def run(label, ordered):
+        print(f"\n== {label} ==")
+        samples = [rng.choice(meds) for _ in range(args.repeat)]
+        names = list(queries(samples[0][1], samples[0][0], ordered))
+        for name in names:
+            plan = queries(samples[0][1], samples[0][0], ordered)[name].explain()
+            picks = iter(samples)
+
+            def one():
+                med_id, user_id = next(picks)
+                return len(list(queries(user_id, med_id, ordered)[name]))
+            ms, _ = timed(one, repeat=args.repeat)
+            print(f"{name:>15}: {ms:8.2f} ms   plan: {' | '.join(line.strip() for line in plan.splitlines())}")
+
+    with connection.cursor() as cursor:
+        for name in COMPOSITE_INDEXES:
+            cursor.execute(f'DROP INDEX {name}')
+        cursor.execute('CREATE INDEX bench_doselog_user ON medicines_doselog (user_id)')
+        cursor.execute('CREATE INDEX bench_doselog_medication ON medicines_doselog (medication_id)')
+        cursor.execute('ANALYZE')
+    run("original: FK indexes + Meta.ordering", ordered=True)
+
+    with connection.cursor() as cursor:
+        cursor.execute('DROP INDEX bench_doselog_user')
+        cursor.execute('DROP INDEX bench_doselog_medication')
+        cursor.execute('CREATE INDEX doselog_user_time_idx ON medicines_doselog (user_id, scheduled_time)')
+        cursor.execute('CREATE INDEX doselog_user_status_idx ON medicines_doselog (user_id, status, scheduled_time)')
+        cursor.execute('CREATE INDEX doselog_status_time_idx ON medicines_doselog (status, scheduled_time)')
+        cursor.execute('ANALYZE')
+    run("composite indexes, no default ordering", ordered=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Rows/sec and peak RSS of the streaming dose-history export (medicines.export).
+
+The fixture is built once in a SQLite file; every measurement then runs in a fresh
+process so its peak RSS reflects the export alone, not the fixture build.
+
+    python benchmarks/bench_export.py --rows 5000000
+    python benchmarks/bench_export.py --rows 5000000 --naive   # also the load-everything baseline
+"""
+import argparse
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from common import setup_django, make_users
+
+DB_FILE = os.path.join(os.environ.get('TMPDIR', '/tmp'), 'medimimes_bench_export.sqlite3')
+
+
+def build_fixture(rows, users):
+    setup_django(DB_FILE)
+    from django.db import connection
+    from medicines.models import DoseLog, Medication
+
+    if DoseLog.objects.count() >= rows:
+        return
+    DoseLog.objects.all().delete()
+    Medication.objects.all().delete()
+
+    user_ids = make_users(users)
+    Medication.objects.bulk_create(
+        [Medication(user_id=user_id, pill_name="Bench, coated", dosage=100, times=['08:00', '20:00'])
+         for user_id in user_ids],
+        batch_size=5000
+    )
+    meds = list(Medication.objects.values_list('id', 'user_id'))
+    days = -(-rows // (len(meds) * 2))
+    start = datetime.now(dt_timezone.utc) - timedelta(days=days)
+    rng = random.Random(42)
+    print(f"Building {len(meds) * 2 * days} dose logs in {DB_FILE}...")
+    with connection.cursor() as cursor:
+        # Fixture only: skip fsync and insert medication by medication, so the
+        # (medication, scheduled_time) and (user, ...) B-trees grow at their ends;
+        # the status-led indexes are rebuilt once at the end
+        cursor.execute('PRAGMA synchronous = OFF')
+        cursor.execute('PRAGMA cache_size = -262144')
+        cursor.execute('DROP INDEX doselog_status_time_idx')
+        cursor.execute('DROP INDEX doselog_user_status_idx')
+        batch = []
+        for med_id, user_id in meds:
+            for day in range(days):
+                for hour in (8, 20):
+                    scheduled = start + timedelta(days=day, hours=hour)
+                    batch.append((scheduled, scheduled, 'taken' if rng.random() < 0.85 else 'missed', med_id, user_id))
+            if len(batch) >= 50000:
+                _insert(cursor, batch)
+                batch = []
+        _insert(cursor, batch)
+        cursor.execute('CREATE INDEX doselog_status_time_idx ON medicines_doselog (status, scheduled_time)')
+        cursor.execute('CREATE INDEX doselog_user_status_idx ON medicines_doselog (user_id, status, scheduled_time)')
+
+
+def _insert(cursor, batch):
+    cursor.executemany(
+        'INSERT INTO medicines_doselog (timestamp, scheduled_time, status, medication_id, user_id) '
+        'VALUES (%s, %s, %s, %s, %s)',
+        batch
+    )
+
+
+def measure(mode, fmt, gzip):
+    setup_django(DB_FILE)
+    from medicines.export import EXPORT_FIELDS, export_rows, export_stream
+    from medicines.models import DoseLog
+
+    rows = DoseLog.objects.count()
+    start = time.perf_counter()
+    written = 0
+    if mode == 'stream':
+        for chunk in export_stream(None, fmt, gzip):
+            written += len(chunk)
+    else:
+        # Baseline: materialize every row, then render the whole file in memory
+        data = list(export_rows(None))
+        body = '\n'.join(','.join('' if v is None else str(v) for v in row) for row in [EXPORT_FIELDS] + data)
+        written = len(body.encode())
+    elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    label = f"{mode} {fmt}{' +gzip' if gzip else ''}"
+    print(f"{label:>18} {rows / elapsed:>12,.0f} {peak_mb:>10.0f} {written / 1e6:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=5000000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--naive', action='store_true', help='Also run the load-everything baseline')
+    parser.add_argument('--measure', nargs=3, metavar=('MODE', 'FORMAT', 'GZIP'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        mode, fmt, gzip = args.measure
+        measure(mode, fmt, gzip == '1')
+        return
+
+    build_fixture(args.rows, args.users)
+    runs = [('stream', 'csv', '0'), ('stream', 'csv', '1'), ('stream', 'ndjson', '0'), ('stream', 'ndjson', '1')]
+    if args.naive:
+        runs.append(('naive', 'csv', '0'))
+
+    print(f"{'export':>18} {'rows/s':>12} {'peak MB':>10} {'out MB':>10}")
+    for run in runs:
+        subprocess.run([sys.executable, __file__, '--measure', *run], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Adherence model scoring latency: sklearn on a pandas DataFrame (the old
+predictor_model/model_run_eg.py path) vs. medicines.utils.linear_inference.LinearModel,
+for single rows and for one 100k-row batch. Also times the bare imports.
+
+    python benchmarks/bench_linear_inference.py --rows 100000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import warnings
+
+from common import PROJECT_PATH, timed
+
+TIME_OF_DAY = ['Morning', 'Afternoon', 'Evening', 'Night']
+
+
+def import_ms(module):
+    code = f"import time; t = time.perf_counter(); import {module}; print((time.perf_counter() - t) * 1000)"
+    return float(subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--single', type=int, default=2000, help='Single-row calls timed per path')
+    args = parser.parse_args()
+
+    sys.path.insert(0, PROJECT_PATH)
+    import joblib
+    import numpy as np
+    import pandas as pd
+    from medicines.utils.linear_inference import LinearModel
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')  # pickled with an older scikit-learn
+        model = joblib.load(os.path.join(PROJECT_PATH, 'medicines', 'ml_model', 'adherence_model.pkl'))
+    linear = LinearModel.from_estimator(model)
+
+    rng = np.random.default_rng(42)
+    slots = rng.choice(TIME_OF_DAY, args.rows)
+    frame = pd.DataFrame({
+        'dose_complexity': rng.integers(1, 5, args.rows),
+        'past_adherence_rate': rng.random(args.rows),
+        'lifestyle_routine': rng.integers(0, 2, args.rows),
+        **{name: (slots == name).astype(int) for name in TIME_OF_DAY},
+    })
+    rows = frame.head(args.single).to_dict('records')
+
+    def sklearn_single():
+        for features in rows:
+            df = pd.DataFrame([features])[model.feature_names_in_]
+            prediction = model.predict(df)[0]
+            model.predict_proba(df)[0][prediction]
+
+    def linear_single():
+        for features in rows:
+            linear.miss_probability(features)
+
+    matrix = frame[list(linear.feature_order)].to_numpy(dtype=float)
+    ordered = frame[model.feature_names_in_]
+
+    print(f"{'path':>28} {'sklearn':>12} {'linear':>12} {'speed-up':>9}")
+    sk_ms, _ = timed(sklearn_single, repeat=3)
+    lin_ms, _ = timed(linear_single, repeat=3)
+    print(f"{'single row (us/row)':>28} {sk_ms * 1000 / len(rows):>12.1f} {lin_ms * 1000 / len(rows):>12.2f} "
+          f"{sk_ms / lin_ms:>8.0f}x")
+
+    sk_ms, _ = timed(lambda: model.predict_proba(ordered)[:, 1])
+    lin_ms, _ = timed(lambda: linear.miss_probabilities(matrix))
+    print(f"{f'{args.rows} rows batch (ms)':>28} {sk_ms:>12.2f} {lin_ms:>12.2f} {sk_ms / lin_ms:>8.1f}x")
+
+    print(f"{'cold import (ms)':>28} {'pandas ' + format(import_ms('pandas'), '.0f'):>12} "
+          f"{'numpy ' + format(import_ms('numpy'), '.0f'):>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Tick latency of run_medication_check: full Medication scan vs. the MedicationSchedule index.
+
+    python benchmarks/bench_schedule_index.py --sizes 10000 100000 1000000
+"""
+import argparse
+import random
+
+from common import setup_django, timed, make_users
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from medicines.models import Medication
+    from medicines.utils.schedule_index import rebuild_schedule_index, schedule_entries_due
+
+    rng = random.Random(42)
+    user_ids = make_users(args.users)
+    tick_time = "08:00"
+
+    def scan_tick():
+        # The pre-index behaviour: load every medication, filter in Python
+        return [m for m in Medication.objects.all() if m.times and tick_time in m.times]
+
+    def indexed_tick():
+        # The scheduler's own per-tick query (process_minutes), relations included
+        return [entry.medication for entry in schedule_entries_due([tick_time])]
+
+    print(f"{'medications':>12} {'due':>6} {'scan ms':>10} {'index ms':>10} {'speedup':>8}")
+    created = 0
+    for size in sorted(args.sizes):
+        batch = []
+        for _ in range(size - created):
+            # Mostly spread over the day, with a morning peak at 08:00
+            times = sorted({
+                "08:00" if rng.random() < 0.01 else f"{rng.randrange(24):02d}:{rng.randrange(60):02d}"
+                for _ in range(rng.randint(1, 3))
+            })
+            batch.append(Medication(
+                user_id=rng.choice(user_ids), pill_name="Bench", dosage=100,
+                times_per_day=len(times), times=times
+            ))
+        last_id = Medication.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        Medication.objects.bulk_create(batch, batch_size=5000)
+        # bulk_create skips the post_save signal, so index the new rows explicitly
+        rebuild_schedule_index(Medication.objects.filter(id__gt=last_id))
+        created = size
+
+        scan_ms, scan_due = timed(scan_tick, args.repeat)
+        index_ms, index_due = timed(indexed_tick, args.repeat)
+        assert {m.id for m in scan_due} == {m.id for m in index_due}
+        print(f"{size:>12} {len(index_due):>6} {scan_ms:>10.1f} {index_ms:>10.2f} {scan_ms / index_ms:>7.0f}x")
+
+
+if __name__ == '__main__':
+    main()
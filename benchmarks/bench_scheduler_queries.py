@@ -0,0 +1,103 @@
+"""
+Database queries per minute of run_medication_check in tick and event mode.
+
+Each mode runs for --minutes of simulated wall-clock time: time.time, time.monotonic,
+time.sleep and django.utils.timezone.now are driven by a fake clock, so an hour takes
+a few seconds and both modes see exactly the same schedule. Every statement sent to
+the database is counted, grouped by the table it touches.
+
+    python benchmarks/bench_scheduler_queries.py --medications 2000 --minutes 60
+"""
+import argparse
+import random
+import re
+import time
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
+
+from common import setup_django, make_users
+
+TABLE = re.compile(r'(?:FROM|INTO|UPDATE)\s+"(\w+)"')
+
+
+class FakeClock:
+    def __init__(self, start, end):
+        self.now_seconds = start
+        self.end = end
+
+    def time(self):
+        return self.now_seconds
+
+    def now(self):
+        return datetime.fromtimestamp(self.now_seconds, tz=dt_timezone.utc)
+
+    def sleep(self, seconds):
+        # Never stand still, or a zero-length wait would spin forever
+        self.now_seconds += max(seconds, 0.001)
+        if self.now_seconds >= self.end:
+            raise KeyboardInterrupt
+
+
+def run(mode, start, minutes):
+    from django.core.management import call_command
+    from django.db import connection
+    from medicines.models import NotificationLog, SchedulerCursor, WorkerHeartbeat, WorkerLease
+
+    # Every run starts like a fresh deployment
+    for model in (NotificationLog, SchedulerCursor, WorkerHeartbeat, WorkerLease):
+        model.objects.all().delete()
+
+    clock = FakeClock(start, start + minutes * 60)
+    tables = Counter()
+
+    def count(execute, sql, params, many, context):
+        match = TABLE.search(sql)
+        tables[match.group(1) if match else sql.split()[0]] += 1
+        return execute(sql, params, many, context)
+
+    with mock.patch('time.time', clock.time), mock.patch('time.monotonic', clock.time), \
+            mock.patch('time.sleep', clock.sleep), mock.patch('django.utils.timezone.now', clock.now), \
+            connection.execute_wrapper(count):
+        call_command('run_medication_check', mode=mode, stdout=StringIO())
+    return tables, NotificationLog.objects.count()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--medications', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--minutes', type=int, default=60)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.utils import timezone
+    from medicines.models import Medication
+    from medicines.utils.schedule_index import rebuild_schedule_index
+
+    rng = random.Random(42)
+    user_ids = make_users(args.users)
+    Medication.objects.bulk_create([
+        Medication(
+            user_id=rng.choice(user_ids), pill_name="Bench", dosage=100, times_per_day=1,
+            times=[f"{rng.randrange(24):02d}:{rng.randrange(60):02d}"]
+        )
+        for _ in range(args.medications)
+    ], batch_size=5000)
+    rebuild_schedule_index()
+
+    # Start on a minute boundary, like a worker that was just deployed
+    start = (timezone.now().timestamp() // 60) * 60 + 0.5
+    print(f"{args.medications} medications, {args.minutes} simulated minutes")
+    for mode in ('tick', 'event'):
+        wall = time.perf_counter()
+        tables, notified = run(mode, start, args.minutes)
+        wall = time.perf_counter() - wall
+        total = sum(tables.values())
+        top = ', '.join(f"{table} {n / args.minutes:.1f}" for table, n in tables.most_common(6))
+        print(f"{mode:>6}: {total / args.minutes:6.1f} queries/min, {notified} slots claimed ({wall:.1f}s)  [{top}]")
+
+
+if __name__ == '__main__':
+    main()
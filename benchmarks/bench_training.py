@@ -0,0 +1,68 @@
+"""
+Wall time, rows/sec and peak RSS of training the adherence model
+(medicines.utils.training + train_adherence_model) over millions of dose logs.
+
+Reuses the bench_export.py fixture. Every measurement runs in a fresh process, so
+its peak RSS covers that step alone:
+
+    stream        iter_training_chunks only: point-in-time features, no model
+    train         a full train_adherence_model run, publishing to a temp registry
+    incremental   --incremental on top of that version: the outcomes its holdout kept back
+
+    python benchmarks/bench_training.py --rows 5000000
+"""
+import argparse
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from io import StringIO
+
+from bench_export import DB_FILE, build_fixture
+from common import setup_django
+
+
+def measure(step, registry):
+    setup_django(DB_FILE)
+    from django.core.management import call_command
+    from django.test.utils import override_settings
+    from medicines.models import DoseLog
+    from medicines.utils.training import iter_training_chunks
+
+    rows = DoseLog.objects.filter(status__in=('taken', 'missed')).count()
+    start = time.perf_counter()
+    if step == 'stream':
+        streamed = sum(len(labels) for _, labels, _ in iter_training_chunks())
+    else:
+        out = StringIO()
+        options = ['--incremental', '--holdout-days', '0'] if step == 'incremental' else []
+        with override_settings(MODEL_REGISTRY_DIR=registry):
+            call_command('train_adherence_model', *options, stdout=out)
+        # Rows trained on, from the last progress line
+        streamed = int(out.getvalue().strip().splitlines()[-2].split()[2])
+    elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{step:>12} {rows:>12,} {streamed:>12,} {elapsed:>9.1f} {streamed / elapsed:>12,.0f} {peak_mb:>9.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=5000000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--measure', nargs=2, metavar=('STEP', 'REGISTRY'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(*args.measure)
+        return
+
+    build_fixture(args.rows, args.users)
+    print(f"{'step':>12} {'outcomes':>12} {'rows used':>12} {'seconds':>9} {'rows/s':>12} {'peak MB':>9}")
+    with tempfile.TemporaryDirectory() as registry:
+        for step in ('stream', 'train', 'incremental'):
+            subprocess.run([sys.executable, __file__, '--measure', step, registry], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Pushes per second with a fresh VAPID signature per push (pywebpush.webpush) vs. the
+per-audience header cache in medicines.notifications. Pushes go to a local HTTP
+server that answers 201, so the numbers are the client-side CPU cost.
+
+    python benchmarks/bench_vapid_cache.py --pushes 2000
+"""
+import argparse
+import base64
+import http.server
+import os
+import threading
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from common import setup_django
+
+
+class PushServiceHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('content-length', 0)))
+        self.send_response(201)
+        self.send_header('content-length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def b64(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def make_subscription(endpoint):
+    key = ec.generate_private_key(ec.SECP256R1())
+    public = key.public_key().public_bytes(
+        serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+    )
+    return {"endpoint": endpoint, "keys": {"p256dh": b64(public), "auth": b64(os.urandom(16))}}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pushes', type=int, default=2000)
+    parser.add_argument('--origins', type=int, default=3, help='Distinct push-service audiences')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from pywebpush import webpush
+    from medicines import notifications
+
+    vapid_key = ec.generate_private_key(ec.SECP256R1())
+    settings.VAPID_PRIVATE_KEY = b64(vapid_key.private_numbers().private_value.to_bytes(32, 'big'))
+
+    servers = []
+    for _ in range(args.origins):
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), PushServiceHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+
+    subscriptions = [
+        make_subscription(f"http://127.0.0.1:{servers[i % len(servers)].server_port}/push/{i}")
+        for i in range(args.pushes)
+    ]
+    message = '{"title": "Medicine Reminder", "body": "Time to take Bench (100 mg)"}'
+
+    def uncached(sub):
+        webpush(
+            subscription_info=sub,
+            data=message,
+            vapid_private_key=settings.VAPID_PRIVATE_KEY,
+            vapid_claims={"sub": notifications.VAPID_CLAIMS_SUB},
+            timeout=10,
+            requests_session=notifications._session_for(sub["endpoint"])
+        )
+
+    def cached(sub):
+        notifications._send_one(sub, message, 10)
+
+    # Warm connections and the header cache so only steady-state cost is measured
+    for sub in subscriptions[:args.origins]:
+        uncached(sub)
+        cached(sub)
+
+    print(f"{'mode':>20} {'pushes/s':>10}")
+    for name, send in (("sign every push", uncached), ("cached VAPID header", cached)):
+        start = time.perf_counter()
+        for sub in subscriptions:
+            send(sub)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>20} {args.pushes / elapsed:>10.0f}")
+
+    sign_start = time.perf_counter()
+    for sub in subscriptions:
+        notifications._vapid.sign({"sub": notifications.VAPID_CLAIMS_SUB, "aud": "http://127.0.0.1", "exp": int(time.time()) + 3600})
+    sign_us = (time.perf_counter() - sign_start) / args.pushes * 1e6
+    lookup_start = time.perf_counter()
+    for sub in subscriptions:
+        notifications.vapid_headers(sub["endpoint"])
+    lookup_us = (time.perf_counter() - lookup_start) / args.pushes * 1e6
+    print(f"VAPID sign: {sign_us:.1f} us/push, cached lookup: {lookup_us:.2f} us/push")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Shared setup for the benchmark scripts in this folder.
+
+Every benchmark runs against a throwaway test database (in-memory SQLite by
+default) so the real db.sqlite3 is never touched. Run them from the project
+root, e.g.  python benchmarks/bench_schedule_index.py --sizes 10000 100000
+"""
+import os
+import statistics
+import sys
+import time
+
+PROJECT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def setup_django(db_file=None):
+    """
+    Configure Django and create a fresh, migrated test database. With db_file the
+    database lives in that SQLite file and is reused if it already exists, so
+    large fixtures can be built once and measured from separate processes.
+    """
+    if PROJECT_PATH not in sys.path:
+        sys.path.insert(0, PROJECT_PATH)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crudapp.settings')
+
+    import django
+    django.setup()
+
+    from django.db import connection
+    if db_file:
+        connection.settings_dict['TEST']['NAME'] = db_file
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=True)
+    else:
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+
+def timed(fn, repeat=5):
+    """Run fn `repeat` times and return (median_ms, last_result)."""
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+def make_users(count, prefix='bench'):
+    from django.contrib.auth.models import User
+    User.objects.bulk_create(
+        [User(username=f"{prefix}{i}") for i in range(count)],
+        batch_size=5000
+    )
+    return list(User.objects.filter(username__startswith=prefix).values_list('id', flat=True))
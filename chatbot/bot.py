@@ -137,7 +137,10 @@ for tool in sql_tools:
             "Examples: 'show my medications', 'when was last dose taken','Doses missed' "
             "'what medicines am I taking'. "
             "NEVER use for general medical knowledge - use Medical Knowledge Base instead."
-            "Main tables: medicines_doselog (dose history), medicines_medication (prescriptions). "
+            "Main tables: medicines_doselog (dose history), medicines_medication (prescriptions), "
+            "medicines_dailyadherence (per-day expected/taken/missed counts, use for adherence over time). "
+            "medicines_missriskscore (predicted probability, 0-1, that a medication's next dose is missed; "
+            "one row per medication_id, also has user_id). "
             "Example: 'SELECT * FROM medicines_doselog WHERE user_id = 5 ORDER BY timestamp DESC LIMIT 1'"
         )
         break
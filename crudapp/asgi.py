@@ -2,6 +2,8 @@
 ASGI config for crudapp project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn crudapp.asgi:application``) to enable
+the live dose-status stream at /api/events/.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -14,3 +16,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crudapp.settings')
 
 application = get_asgi_application()
+
+# Server processes only: load the adherence model in the background before the first request
+from medicines.utils.model_loader import warm_up  # noqa: E402 (needs the apps loaded above)
+
+warm_up()
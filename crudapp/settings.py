@@ -108,6 +108,43 @@ MIDDLEWARE = [
 VAPID_PUBLIC_KEY = config("VAPID_PUBLIC_KEY", default="")
 VAPID_PRIVATE_KEY = config("VAPID_PRIVATE_KEY", default="")
 
+# Web push fan-out: concurrent sends per batch and per-request timeout (seconds)
+WEBPUSH_MAX_WORKERS = config("WEBPUSH_MAX_WORKERS", default=32, cast=int)
+WEBPUSH_TIMEOUT = config("WEBPUSH_TIMEOUT", default=10, cast=float)
+# Cached VAPID signatures are renewed when less than this many seconds of validity remain
+VAPID_HEADER_REFRESH_MARGIN = config("VAPID_HEADER_REFRESH_MARGIN", default=3600, cast=int)
+
+# Reminder scheduler: how many missed minutes a restarted scheduler will catch up on
+SCHEDULER_MAX_CATCHUP_MINUTES = config("SCHEDULER_MAX_CATCHUP_MINUTES", default=1440, cast=int)
+# Multi-worker mode: users are split into shards, each owned by one worker through a lease
+SCHEDULER_SHARDS = config("SCHEDULER_SHARDS", default=1, cast=int)
+SCHEDULER_LEASE_TTL = config("SCHEDULER_LEASE_TTL", default=120, cast=int)
+# Days of per-slot notification claims (NotificationLog) kept; must cover the catch-up window
+NOTIFICATION_LOG_RETENTION_DAYS = config("NOTIFICATION_LOG_RETENTION_DAYS", default=7, cast=int)
+# Event mode (run_medication_check --mode event): how often to poll ChangeLog for schedule edits,
+# and the longer poll (and missed-dose sweep) interval used while no dose is due that soon.
+# Edits are also read right before every fire; a dose time added between polls is caught up late, not lost
+SCHEDULER_CHANGE_POLL_SECONDS = config("SCHEDULER_CHANGE_POLL_SECONDS", default=30, cast=float)
+SCHEDULER_IDLE_POLL_SECONDS = config("SCHEDULER_IDLE_POLL_SECONDS", default=300, cast=float)
+
+# Background processes store their metrics for /api/metrics/ every METRICS_FLUSH_INTERVAL seconds;
+# snapshots not updated for METRICS_RETENTION_HOURS belong to stopped processes and are dropped
+METRICS_FLUSH_INTERVAL = config("METRICS_FLUSH_INTERVAL", default=30, cast=int)
+METRICS_RETENTION_HOURS = config("METRICS_RETENTION_HOURS", default=48, cast=int)
+
+# Missed-dose sweeper: pending doses older than the grace period are marked missed
+DOSE_MISSED_GRACE_MINUTES = config("DOSE_MISSED_GRACE_MINUTES", default=0, cast=int)
+DOSE_SWEEP_INTERVAL = config("DOSE_SWEEP_INTERVAL", default=60, cast=int)
+DOSE_SWEEP_BATCH_SIZE = config("DOSE_SWEEP_BATCH_SIZE", default=5000, cast=int)
+
+# Notification outbox drained by run_notification_delivery (delays in seconds)
+OUTBOX_BATCH_SIZE = config("OUTBOX_BATCH_SIZE", default=500, cast=int)
+OUTBOX_MAX_ATTEMPTS = config("OUTBOX_MAX_ATTEMPTS", default=8, cast=int)
+OUTBOX_BACKOFF_BASE = config("OUTBOX_BACKOFF_BASE", default=30, cast=int)
+OUTBOX_BACKOFF_MAX = config("OUTBOX_BACKOFF_MAX", default=3600, cast=int)
+OUTBOX_VISIBILITY_TIMEOUT = config("OUTBOX_VISIBILITY_TIMEOUT", default=300, cast=int)
+OUTBOX_RETENTION_DAYS = config("OUTBOX_RETENTION_DAYS", default=7, cast=int)
+
 ROOT_URLCONF = 'crudapp.urls'
 
 TEMPLATES = [
@@ -135,6 +172,56 @@ DATABASES = {
 	}
 }
 
+# Cache
+# locmem is per process, which is safe: cached dashboards are keyed by a version read from the
+# database. A shared backend (e.g. a Redis cache) only lets web workers reuse each other's payloads.
+CACHES = {
+	'default': {
+		'BACKEND': config("CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"),
+		'LOCATION': config("CACHE_LOCATION", default="medimimes"),
+	}
+}
+# Batch dose endpoint (/api/dose-events/batch/): most events accepted per request, and days
+# an idempotency key is remembered (a batch retried after that would be applied again)
+DOSE_BATCH_MAX_EVENTS = config("DOSE_BATCH_MAX_EVENTS", default=500, cast=int)
+DOSE_EVENT_KEY_RETENTION_DAYS = config("DOSE_EVENT_KEY_RETENTION_DAYS", default=30, cast=int)
+
+# Delta sync (/api/sync/): changes per response, days of dose history in a full snapshot,
+# and how long ChangeLog rows are kept (older cursors get a full snapshot instead)
+SYNC_PAGE_SIZE = config("SYNC_PAGE_SIZE", default=1000, cast=int)
+SYNC_SNAPSHOT_DAYS = config("SYNC_SNAPSHOT_DAYS", default=7, cast=int)
+CHANGELOG_RETENTION_DAYS = config("CHANGELOG_RETENTION_DAYS", default=30, cast=int)
+
+# Dose history export: rows fetched from the database per round trip
+EXPORT_CHUNK_SIZE = config("EXPORT_CHUNK_SIZE", default=2000, cast=int)
+
+# Miss-risk scoring (score_miss_risk): medications per feature query and predict_proba call,
+# and the probability from which a dose is flagged as likely to be missed
+MISS_RISK_CHUNK_SIZE = config("MISS_RISK_CHUNK_SIZE", default=5000, cast=int)
+MISS_RISK_THRESHOLD = config("MISS_RISK_THRESHOLD", default=0.5, cast=float)
+
+# Adherence model registry (medicines.utils.model_loader): version directories plus a CURRENT
+# pointer, how often (seconds) each process checks the pointer for a new version, and whether
+# server processes (wsgi/asgi, runserver) load the model in the background at startup
+MODEL_REGISTRY_DIR = config("MODEL_REGISTRY_DIR", default=str(BASE_DIR / 'medicines' / 'ml_model' / 'registry'))
+MODEL_RELOAD_INTERVAL = config("MODEL_RELOAD_INTERVAL", default=30, cast=int)
+MODEL_WARMUP = config("MODEL_WARMUP", default=True, cast=bool)
+
+# Model training (train_adherence_model): outcomes per partial_fit step, and recent days kept
+# out of training to report holdout metrics on
+TRAINING_CHUNK_SIZE = config("TRAINING_CHUNK_SIZE", default=50000, cast=int)
+TRAINING_HOLDOUT_DAYS = config("TRAINING_HOLDOUT_DAYS", default=7, cast=int)
+
+# Live dose-status events (/api/events/, needs the ASGI app): broker class, per-connection
+# buffer and keep-alive comment interval in seconds
+SSE_BROKER = config("SSE_BROKER", default="medicines.events.LocalBroker")
+SSE_QUEUE_SIZE = config("SSE_QUEUE_SIZE", default=100, cast=int)
+SSE_HEARTBEAT_SECONDS = config("SSE_HEARTBEAT_SECONDS", default=15, cast=int)
+# Per-user dashboard payloads, keyed by the user's newest ChangeLog id, so a per-process (locmem)
+# cache is still never stale: writes from any process move the version
+DASHBOARD_CACHE_ALIAS = config("DASHBOARD_CACHE_ALIAS", default="default")
+DASHBOARD_CACHE_TIMEOUT = config("DASHBOARD_CACHE_TIMEOUT", default=300, cast=int)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
 	{'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',},
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crudapp.settings')
 
 application = get_wsgi_application()
+
+# Server processes only: load the adherence model in the background before the first request
+from medicines.utils.model_loader import warm_up  # noqa: E402 (needs the apps loaded above)
+
+warm_up()
@@ -1,6 +1,13 @@
 from django.contrib import admin
-from .models import Medication,DoseLog
+from .models import Medication,DoseLog,DailyAdherence,MetricSnapshot,MissRiskScore,NotificationOutbox,SchedulerCursor,WorkerHeartbeat,WorkerLease
 
 admin.site.register(Medication)
 admin.site.register(DoseLog)
+admin.site.register(DailyAdherence)
+admin.site.register(MissRiskScore)
+admin.site.register(NotificationOutbox)
+admin.site.register(SchedulerCursor)
+admin.site.register(MetricSnapshot)
+admin.site.register(WorkerHeartbeat)
+admin.site.register(WorkerLease)
 
@@ -6,4 +6,4 @@ class MedicinesConfig(AppConfig):
     name = 'medicines'
     
     def ready(self):
-        pass
\ No newline at end of file
+        from . import signals  # noqa: F401 (registers model signal handlers)
\ No newline at end of file
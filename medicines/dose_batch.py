@@ -0,0 +1,124 @@
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .events import publish_dose_status
+from .models import DoseEventKey, DoseLog, Medication
+from .utils.adherence import local_day, refresh_daily_adherence
+from .utils.changelog import record_changes
+from .utils.dose_slots import materialize_dose_slots, scheduled_slot
+
+DOSE_EVENT_STATUSES = ('taken', 'missed')
+
+
+def _parse_event(event):
+    """
+    Validate one event. It names its dose either by dose_log_id or by med_id + time
+    (+ optional date, default today), like log_dose. Raises ValueError.
+    """
+    if not isinstance(event, dict):
+        raise ValueError("Event must be an object")
+    key = str(event.get('key') or '')
+    if not key or len(key) > 64:
+        raise ValueError("Missing or too long idempotency key")
+    status = event.get('status')
+    if status not in DOSE_EVENT_STATUSES:
+        raise ValueError("Invalid status")
+
+    taken_at = timezone.now()
+    if event.get('taken_at'):
+        taken_at = datetime.fromisoformat(str(event['taken_at']).replace('Z', '+00:00'))
+        if timezone.is_naive(taken_at):
+            taken_at = timezone.make_aware(taken_at)
+
+    if event.get('dose_log_id') is not None:
+        slot = ('log', int(event['dose_log_id']))
+    else:
+        day = date.fromisoformat(event['date']) if event.get('date') else date.today()
+        datetime.strptime(str(event.get('time')), "%H:%M")
+        slot = ('slot', int(event['med_id']), scheduled_slot(day, event['time']))
+    return key, status, taken_at, slot
+
+
+def apply_dose_events(user, events):
+    """
+    Apply a batch of dose events in one transaction. Events whose key was seen before
+    are reported as duplicates and not applied again, so clients can retry a whole
+    batch safely; when several events hit the same dose the last one wins.
+
+    Returns one {'key', 'result', ...} dict per event, in order. May raise
+    IntegrityError when a concurrent request is applying the same keys.
+    """
+    results = [None] * len(events)
+    parsed = []
+    for i, event in enumerate(events):
+        try:
+            parsed.append((i, *_parse_event(event)))
+        except (ValueError, TypeError, KeyError) as e:
+            key = event.get('key') if isinstance(event, dict) else None
+            results[i] = {'key': key, 'result': 'error', 'message': str(e)}
+
+    with transaction.atomic():
+        seen = set(
+            DoseEventKey.objects.filter(user=user, key__in=[key for _, key, _, _, _ in parsed])
+            .values_list('key', flat=True)
+        )
+        fresh = []
+        for i, key, status, taken_at, slot in parsed:
+            if key in seen:
+                results[i] = {'key': key, 'result': 'duplicate'}
+            else:
+                # A key repeated inside one batch only counts once too
+                seen.add(key)
+                fresh.append((i, key, status, taken_at, slot))
+
+        # Resolve every dose: existing logs by id, everything else through the slot table
+        log_ids = {slot[1] for _, _, _, _, slot in fresh if slot[0] == 'log'}
+        logs_by_id = DoseLog.objects.filter(user=user, id__in=log_ids).in_bulk()
+        med_ids = {slot[1] for _, _, _, _, slot in fresh if slot[0] == 'slot'}
+        meds = Medication.objects.filter(user=user, id__in=med_ids).in_bulk()
+        slot_logs = materialize_dose_slots({
+            (meds[slot[1]], slot[2]) for _, _, _, _, slot in fresh
+            if slot[0] == 'slot' and slot[1] in meds
+        })
+
+        changed = {}
+        keys = []
+        for i, key, status, taken_at, slot in fresh:
+            if slot[0] == 'log':
+                dose_log = logs_by_id.get(slot[1])
+            else:
+                dose_log = slot_logs.get((slot[1], slot[2]))
+            if dose_log is None:
+                results[i] = {'key': key, 'result': 'error', 'message': 'Dose not found'}
+                continue
+            dose_log.status = status
+            if status == 'taken':
+                dose_log.timestamp = taken_at
+            changed[dose_log.id] = dose_log
+            keys.append(DoseEventKey(user=user, key=key, dose_log=dose_log))
+            results[i] = {'key': key, 'result': 'applied', 'dose_log_id': dose_log.id, 'status': status}
+
+        DoseEventKey.objects.bulk_create(keys)
+        DoseLog.objects.bulk_update(list(changed.values()), ['status', 'timestamp'])
+
+        # bulk_update sends no signals
+        refresh_daily_adherence({(user.id, local_day(log.scheduled_time)) for log in changed.values()})
+        record_changes('doselog', [(log.id, log.user_id) for log in changed.values()])
+        publish_dose_status(
+            (log.id, log.user_id, log.medication_id, log.status) for log in changed.values()
+        )
+
+    return results
+
+
+def purge_dose_event_keys(days=None):
+    """
+    Drop idempotency keys older than DOSE_EVENT_KEY_RETENTION_DAYS. Keys only matter
+    while a client may still retry the batch that carried them.
+    """
+    days = settings.DOSE_EVENT_KEY_RETENTION_DAYS if days is None else days
+    deleted, _ = DoseEventKey.objects.filter(created_at__lt=timezone.now() - timedelta(days=days)).delete()
+    return deleted
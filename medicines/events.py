@@ -0,0 +1,127 @@
+"""
+In-process pub/sub for live dose-status events, consumed by the SSE endpoint.
+
+Publishers (signals, the sweeper) may run in any thread; subscribers are SSE
+connections on the ASGI event loop. Messages travel through a broker so a shared
+one (e.g. Redis pub/sub) can replace LocalBroker when web, scheduler and sweeper
+run as separate processes; LocalBroker only reaches subscribers in this process.
+"""
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from . import metrics
+
+
+class LocalBroker:
+    """Stand-in broker: delivers every published message to this process's hub."""
+
+    def __init__(self):
+        self._callback = None
+
+    def start(self, callback):
+        self._callback = callback
+
+    def publish(self, user_id, message):
+        if self._callback is not None:
+            self._callback(user_id, message)
+
+
+class Subscription:
+    """One SSE connection. Holds at most SSE_QUEUE_SIZE undelivered messages."""
+
+    def __init__(self, user_id, loop, maxsize):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        # Set when messages were dropped; the client must refetch instead of applying deltas
+        self.overflowed = False
+
+    def _put(self, message):
+        # Runs on the subscriber's loop
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            metrics.incr('events.dropped')
+
+    async def get(self, timeout):
+        """Next message, or None after `timeout` seconds of silence."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventHub:
+    def __init__(self, broker):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+        self.broker = broker
+        broker.start(self._dispatch)
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id, asyncio.get_running_loop(), settings.SSE_QUEUE_SIZE)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+            metrics.gauge('events.connections', sum(len(s) for s in self._subscriptions.values()))
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.user_id, None)
+            metrics.gauge('events.connections', sum(len(s) for s in self._subscriptions.values()))
+
+    def _dispatch(self, user_id, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._put, message)
+            except RuntimeError:
+                # The connection's loop has closed; its generator cleanup will unsubscribe it
+                continue
+        metrics.incr('events.published')
+
+    def publish(self, user_id, event, data):
+        self.broker.publish(user_id, json.dumps({'event': event, 'data': data}))
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            _hub = EventHub(import_string(settings.SSE_BROKER)())
+        return _hub
+
+
+def publish_dose_status(dose_logs):
+    """
+    Announce status changes once the transaction commits. `dose_logs` holds
+    (dose_log_id, user_id, medication_id, status) tuples.
+    """
+    dose_logs = list(dose_logs)
+    if not dose_logs:
+        return
+
+    def send():
+        hub = get_hub()
+        for dose_log_id, user_id, medication_id, status in dose_logs:
+            hub.publish(user_id, 'dose-status', {
+                'dose_log_id': dose_log_id,
+                'med_id': medication_id,
+                'status': status,
+            })
+
+    transaction.on_commit(send)
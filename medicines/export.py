@@ -0,0 +1,94 @@
+import csv
+import json
+import zlib
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import DoseLog
+
+EXPORT_FIELDS = [
+    'dose_log_id', 'user_id', 'medication_id', 'pill_name', 'dosage',
+    'scheduled_time', 'status', 'taken_time',
+]
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+
+def export_rows(user_id=None, chunk_size=None):
+    """
+    Every DoseLog (of one user, or all) joined with its medication, per user and
+    oldest first, as tuples in EXPORT_FIELDS order. Rows are streamed from the
+    database in chunks, and the order follows doselog_user_time_idx so the database
+    never sorts: memory does not grow with the number of rows.
+    """
+    logs = DoseLog.objects.all()
+    if user_id is not None:
+        logs = logs.filter(user_id=user_id)
+    rows = logs.order_by('user_id', 'scheduled_time', 'id').values_list(
+        'id', 'user_id', 'medication_id', 'medication__pill_name', 'medication__dosage',
+        'scheduled_time', 'status', 'timestamp',
+    )
+    for dose_id, user, med_id, pill_name, dosage, scheduled, status, taken in rows.iterator(
+        chunk_size=chunk_size or settings.EXPORT_CHUNK_SIZE
+    ):
+        yield (
+            dose_id, user, med_id, pill_name, dosage,
+            timezone.localtime(scheduled).isoformat(),
+            status,
+            timezone.localtime(taken).isoformat() if status == 'taken' else None,
+        )
+
+
+class _LineBuffer:
+    """File-like sink for csv.writer that hands back what was written."""
+
+    def write(self, value):
+        return value
+
+
+def csv_chunks(rows, buffer_size=64 * 1024):
+    """CSV text with a header row, yielded in ~buffer_size pieces instead of line by line."""
+    writer = csv.writer(_LineBuffer())
+    parts = [writer.writerow(EXPORT_FIELDS)]
+    size = 0
+    for row in rows:
+        line = writer.writerow(row)
+        parts.append(line)
+        size += len(line)
+        if size >= buffer_size:
+            yield ''.join(parts)
+            parts, size = [], 0
+    if parts:
+        yield ''.join(parts)
+
+
+def ndjson_chunks(rows, buffer_size=64 * 1024):
+    """One JSON object per line, yielded in ~buffer_size pieces."""
+    parts = []
+    size = 0
+    for row in rows:
+        line = json.dumps(dict(zip(EXPORT_FIELDS, row))) + '\n'
+        parts.append(line)
+        size += len(line)
+        if size >= buffer_size:
+            yield ''.join(parts)
+            parts, size = [], 0
+    if parts:
+        yield ''.join(parts)
+
+
+def gzip_chunks(chunks, level=6):
+    """Gzip a stream of text chunks on the fly."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(user_id=None, fmt='csv', gzip=False):
+    chunks = (csv_chunks if fmt == 'csv' else ndjson_chunks)(export_rows(user_id))
+    if gzip:
+        return gzip_chunks(chunks)
+    return (chunk.encode() for chunk in chunks)
@@ -0,0 +1,105 @@
+import heapq
+from datetime import timedelta
+
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import ChangeLog, MedicationSchedule
+from .utils.dose_slots import scheduled_slot
+
+
+def next_fire_time(t_str, after):
+    """First occurrence of the local "HH:MM" strictly after `after`."""
+    local_day = timezone.localtime(after).date()
+    fire = scheduled_slot(local_day, t_str)
+    if fire <= after:
+        fire = scheduled_slot(local_day + timedelta(days=1), t_str)
+    return fire
+
+
+class NextFireQueue:
+    """
+    Min-heap of the next fire time of every schedule entry, so the scheduler can sleep
+    until the earliest one instead of querying every minute.
+
+    Changes to Medication.times reach the queue through the ChangeLog table. A changed
+    medication gets a new generation number and fresh heap entries; entries of older
+    generations are dropped lazily when they reach the top of the heap.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._generation = {}
+        self.change_cursor = 0
+        # When the queue last reflected the schedule; see apply_changes()
+        self.synced_at = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    def load(self, now=None):
+        now = now or timezone.now()
+        # Read the cursor first so changes made while loading are replayed, not lost
+        self.change_cursor = ChangeLog.objects.aggregate(last=Max('id'))['last'] or 0
+        self.synced_at = now
+
+        self._heap = []
+        self._generation = {}
+        entries = MedicationSchedule.objects.filter(medication__user__isnull=False).values_list('medication_id', 'time')
+        for med_id, t_str in entries.iterator(chunk_size=10000):
+            self._generation.setdefault(med_id, 0)
+            self._heap.append((next_fire_time(t_str, now), med_id, t_str, 0))
+        heapq.heapify(self._heap)
+
+    def apply_changes(self, now=None):
+        """
+        Pick up medications changed since the last call. Returns how many changed.
+
+        Their entries are re-armed from the previous sync rather than from now, so a
+        dose time added since then that has already passed fires at once (and is
+        caught up from the scheduler cursor) instead of waiting for tomorrow.
+        """
+        now = now or timezone.now()
+        since, self.synced_at = self.synced_at or now, now
+        last = ChangeLog.objects.filter(id__gt=self.change_cursor).aggregate(last=Max('id'))['last']
+        if last is None:
+            return 0
+
+        changed = set(
+            ChangeLog.objects.filter(
+                model_name='medication', id__gt=self.change_cursor, id__lte=last
+            ).values_list('object_id', flat=True)
+        )
+        self.change_cursor = last
+        if not changed:
+            return 0
+
+        for med_id in changed:
+            self._generation[med_id] = self._generation.get(med_id, 0) + 1
+        entries = MedicationSchedule.objects.filter(
+            medication_id__in=changed, medication__user__isnull=False
+        ).values_list('medication_id', 'time')
+        for med_id, t_str in entries:
+            heapq.heappush(self._heap, (next_fire_time(t_str, since), med_id, t_str, self._generation[med_id]))
+        return len(changed)
+
+    def _drop_stale(self):
+        while self._heap and self._heap[0][3] != self._generation.get(self._heap[0][1]):
+            heapq.heappop(self._heap)
+
+    def next_fire_at(self):
+        """Earliest pending fire time, or None when nothing is scheduled."""
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now=None):
+        """Remove and return (fire_time, medication_id) for everything due; each entry is re-armed for its next day."""
+        now = now or timezone.now()
+        due = []
+        self._drop_stale()
+        while self._heap and self._heap[0][0] <= now:
+            fire, med_id, t_str, generation = heapq.heappop(self._heap)
+            due.append((fire, med_id))
+            heapq.heappush(self._heap, (next_fire_time(t_str, now), med_id, t_str, generation))
+            self._drop_stale()
+        return due
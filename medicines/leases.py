@@ -0,0 +1,117 @@
+import math
+import os
+import socket
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import NotificationLog, WorkerHeartbeat, WorkerLease
+
+
+def make_worker_id():
+    """Unique per process, so a restarted worker never reuses its predecessor's claims."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def acquire_leases(worker_id, num_shards, ttl=None):
+    """
+    Heartbeat the shards this worker owns and take over free or expired ones, up to a
+    fair share of num_shards among the live workers. Returns the owned shard numbers.
+    """
+    ttl = timedelta(seconds=ttl or settings.SCHEDULER_LEASE_TTL)
+    now = timezone.now()
+
+    # Shard rows are created once, unowned and already expired
+    WorkerLease.objects.bulk_create(
+        [WorkerLease(shard=shard, expires_at=now) for shard in range(num_shards)],
+        ignore_conflicts=True
+    )
+
+    # Heartbeat: announce ourselves and renew what we already hold
+    WorkerHeartbeat.objects.update_or_create(worker=worker_id, defaults={'heartbeat_at': now})
+    WorkerLease.objects.filter(owner=worker_id, shard__lt=num_shards).update(
+        expires_at=now + ttl, heartbeat_at=now
+    )
+
+    # Forget workers that died long ago (every process start gets a new id)
+    WorkerHeartbeat.objects.filter(heartbeat_at__lt=now - 10 * ttl).delete()
+    live_workers = WorkerHeartbeat.objects.filter(heartbeat_at__gt=now - ttl).count()
+    fair_share = math.ceil(num_shards / max(live_workers, 1))
+
+    owned = sorted(
+        WorkerLease.objects.filter(owner=worker_id, shard__lt=num_shards).values_list('shard', flat=True)
+    )
+
+    # Hand back shards above our share so newly started workers can pick them up
+    if len(owned) > fair_share:
+        release_leases(worker_id, owned[fair_share:])
+        owned = owned[:fair_share]
+
+    free = WorkerLease.objects.filter(shard__lt=num_shards).filter(
+        Q(owner="") | Q(expires_at__lte=now)
+    ).values_list('shard', flat=True)
+    for shard in free:
+        if len(owned) >= fair_share:
+            break
+        # Compare-and-set: only one worker's update can match the expired row
+        taken = WorkerLease.objects.filter(shard=shard).filter(
+            Q(owner="") | Q(expires_at__lte=now)
+        ).update(owner=worker_id, expires_at=now + ttl, heartbeat_at=now)
+        if taken:
+            owned.append(shard)
+
+    return sorted(owned)
+
+
+def release_leases(worker_id, shards=None):
+    """Give up this worker's leases (all of them by default) so others can take over at once."""
+    leases = WorkerLease.objects.filter(owner=worker_id)
+    if shards is not None:
+        leases = leases.filter(shard__in=shards)
+    leases.update(owner="", expires_at=timezone.now())
+    if shards is None:
+        WorkerHeartbeat.objects.filter(worker=worker_id).delete()
+
+
+def claim_notifications(due, worker_id):
+    """
+    Claim (medication, scheduled_time) slots for this worker through NotificationLog's
+    unique (medication, sent_date, sent_time) constraint, so that each slot is notified
+    at most once across all workers. Returns the subset of `due` this worker won.
+    """
+    keys = {}
+    for med, scheduled_dt in due:
+        local = timezone.localtime(scheduled_dt)
+        keys[(med.id, local.date(), local.strftime("%H:%M"))] = (med, scheduled_dt)
+    if not keys:
+        return []
+
+    NotificationLog.objects.bulk_create(
+        [
+            NotificationLog(medication_id=med_id, sent_date=sent_date, sent_time=sent_time, worker=worker_id)
+            for med_id, sent_date, sent_time in keys
+        ],
+        ignore_conflicts=True
+    )
+    claimed = set(
+        NotificationLog.objects.filter(
+            worker=worker_id,
+            medication_id__in={med_id for med_id, _, _ in keys},
+            sent_date__in={sent_date for _, sent_date, _ in keys}
+        ).values_list('medication_id', 'sent_date', 'sent_time')
+    )
+    return [slot for key, slot in keys.items() if key in claimed]
+
+
+def purge_notification_log(days=None):
+    """
+    Drop claims older than NOTIFICATION_LOG_RETENTION_DAYS. Claims only matter while
+    a slot can still be processed, i.e. within SCHEDULER_MAX_CATCHUP_MINUTES.
+    """
+    days = settings.NOTIFICATION_LOG_RETENTION_DAYS if days is None else days
+    cutoff = timezone.localdate() - timedelta(days=days)
+    deleted, _ = NotificationLog.objects.filter(sent_date__lt=cutoff).delete()
+    return deleted
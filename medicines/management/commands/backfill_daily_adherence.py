@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from medicines.models import DoseLog
+from medicines.utils.adherence import rebuild_daily_adherence
+
+class Command(BaseCommand):
+    help = 'Rebuild the DailyAdherence rollup from existing DoseLog rows, a chunk of users at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Users rebuilt per transaction')
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help='Only rebuild this user id (repeatable)')
+
+    def handle(self, *args, **options):
+        user_ids = options['users'] or list(
+            DoseLog.objects.order_by('user_id').values_list('user_id', flat=True).distinct()
+        )
+        chunk_size = options['chunk_size']
+        total_rows = 0
+
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            total_rows += rebuild_daily_adherence(chunk)
+            self.stdout.write(f" Rebuilt {min(start + chunk_size, len(user_ids))}/{len(user_ids)} users")
+
+        self.stdout.write(self.style.SUCCESS(f" Wrote {total_rows} daily adherence rows"))
@@ -0,0 +1,31 @@
+import sys
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from medicines.export import EXPORT_FORMATS, export_stream
+
+class Command(BaseCommand):
+    help = 'Stream dose history (one user or everyone) as CSV or NDJSON, optionally gzipped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='User id or username; all users when omitted')
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--output', help='File to write; stdout when omitted')
+
+    def handle(self, *args, **options):
+        user_id = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None and options['user'].isdigit():
+                user = User.objects.filter(id=int(options['user'])).first()
+            if user is None:
+                raise CommandError(f"No such user: {options['user']}")
+            user_id = user.id
+
+        out = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in export_stream(user_id, options['format'], options['gzip']):
+                out.write(chunk)
+        finally:
+            if options['output']:
+                out.close()
@@ -0,0 +1,43 @@
+import joblib
+from django.core.management.base import BaseCommand, CommandError
+from medicines.utils.model_loader import get_registry
+
+class Command(BaseCommand):
+    help = 'List adherence model versions, switch the served version, or register a pickled model'
+
+    def add_arguments(self, parser):
+        actions = parser.add_subparsers(dest='action', required=True)
+        actions.add_parser('list', help='Show every version; * marks the current one')
+        activate = actions.add_parser('activate', help='Serve VERSION (running processes pick it up on their next check)')
+        activate.add_argument('version')
+        register = actions.add_parser('register', help='Publish a joblib/pickle file as a new version')
+        register.add_argument('path')
+        register.add_argument('--no-activate', action='store_true')
+
+    def handle(self, *args, **options):
+        registry = get_registry()
+
+        if options['action'] == 'list':
+            current = registry.current_version()
+            for version in registry.versions():
+                meta = registry.metadata(version)
+                marker = '*' if version == current else ' '
+                self.stdout.write(f"{marker} {version}  {meta['estimator']}  {', '.join(meta['feature_order'])}")
+            if current is None:
+                self.stdout.write(" No current version: serving the legacy adherence_model.pkl")
+
+        elif options['action'] == 'activate':
+            try:
+                registry.activate(options['version'])
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f" Now serving {options['version']}"))
+
+        else:
+            model = joblib.load(options['path'])
+            if not hasattr(model, 'feature_names_in_'):
+                raise CommandError("The model was not fitted on a DataFrame, so its feature order is unknown")
+            version = registry.publish(
+                model, model.feature_names_in_, activate=not options['no_activate'], source=options['path']
+            )
+            self.stdout.write(self.style.SUCCESS(f" Registered {version}"))
@@ -18,12 +18,18 @@ class Command(BaseCommand):
                 call_command('run_medication_check')
                 time.sleep(60)  # Check every minute
         
-        # Start both threads
+        def run_notification_delivery():
+            """Deliver the notifications queued by the medication check"""
+            call_command('run_notification_delivery')
+        
+        # Start all threads
         server_thread = threading.Thread(target=run_server, daemon=True)
         check_thread = threading.Thread(target=run_medication_check, daemon=True)
+        delivery_thread = threading.Thread(target=run_notification_delivery, daemon=True)
         
         server_thread.start()
         check_thread.start()
+        delivery_thread.start()
         
         self.stdout.write(
             self.style.SUCCESS(' MediMimes application started successfully!')
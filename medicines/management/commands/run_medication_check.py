@@ -1,97 +1,192 @@
-import json
-from django.core.management.base import BaseCommand
-import datetime
-from django.utils import timezone
 import time
-from pywebpush import webpush, WebPushException
-from medicines.models import Medication, PushSubscription, DoseLog
 from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from medicines import metrics
+from medicines.dose_batch import purge_dose_event_keys
+from medicines.fire_queue import NextFireQueue
+from medicines.leases import acquire_leases, make_worker_id, purge_notification_log, release_leases
+from medicines.models import SchedulerCursor
+from medicines.scheduler import run_tick, sleep_until_next_minute
+from medicines.utils.changelog import purge_changelog
+from medicines.utils.dose_slots import materialize_day_slots, sweep_missed_doses, upcoming_days
 
 class Command(BaseCommand):
-    help = 'Run medication notifications in a single process'
-    
+    help = 'Run medication notifications; start several processes with the same --shards to split users between them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--shards', type=int, default=settings.SCHEDULER_SHARDS,
+            help='Number of user shards shared by all workers (must match across workers)'
+        )
+        parser.add_argument(
+            '--mode', choices=['tick', 'event'], default='tick',
+            help='tick: wake every minute; event: sleep until the next scheduled dose'
+        )
+
     def handle(self, *args, **options):
-        self.stdout.write(' Starting medication notification service...')
-        
+        self.num_shards = options['shards']
+        self.worker_id = make_worker_id()
+        self.metrics_source = f"run_medication_check@{self.worker_id}"
+        # One persistent cursor per shard: whoever owns the shard next resumes from it
+        self.cursors = {}
+        self.next_sweep = 0
+        self.next_purge = 0
+        # Local dates whose dose slots this worker has created
+        self.slot_days = set()
+        self.stdout.write(
+            f" Starting medication notification service "
+            f"(worker {self.worker_id}, {self.num_shards} shards, {options['mode']} mode)..."
+        )
+
+        try:
+            if options['mode'] == 'event':
+                self.run_event_loop()
+            else:
+                self.run_tick_loop()
+        except KeyboardInterrupt:
+            self.stdout.write(" Stopping service...")
+            release_leases(self.worker_id)
+            metrics.flush(self.metrics_source, force=True)
+
+    def process_shards(self, shards):
+        queued_count = 0
+        for shard in shards:
+            if shard not in self.cursors:
+                self.cursors[shard], _ = SchedulerCursor.objects.get_or_create(
+                    name=f"shard-{shard}-of-{self.num_shards}"
+                )
+            cursor = self.cursors[shard]
+            # Another worker may have advanced it while it owned the shard
+            cursor.refresh_from_db()
+            queued_count += run_tick(cursor, self.stdout.write, shard, self.num_shards, self.worker_id)
+        self.stdout.write(f" TOTAL: Queued {queued_count} notifications")
+
+    def maybe_sweep(self, shards, interval=None):
+        """
+        Mark overdue doses missed every DOSE_SWEEP_INTERVAL (or `interval`), and create
+        the dose slots of today and tomorrow once per day so the dashboard only reads
+        them; only the owner of shard 0 does either.
+        """
+        if 0 not in shards or time.monotonic() < self.next_sweep:
+            return
+        self.next_sweep = time.monotonic() + (interval or settings.DOSE_SWEEP_INTERVAL)
+        days = upcoming_days()
+        if set(days) != self.slot_days:
+            checked = materialize_day_slots([day for day in days if day not in self.slot_days])
+            self.slot_days = set(days)
+            self.stdout.write(f" Dose slots ready up to {days[-1]} ({checked} checked)")
+        start = time.perf_counter()
+        swept = sweep_missed_doses()
+        metrics.incr('sweeper.doses_missed', swept)
+        metrics.gauge('sweeper.duration_seconds', time.perf_counter() - start)
+        if swept:
+            self.stdout.write(f" Marked {swept} overdue doses as missed")
+
+        # Hourly housekeeping rides on the same owner
+        if time.monotonic() >= self.next_purge:
+            self.next_purge = time.monotonic() + 3600
+            purged = purge_changelog()
+            if purged:
+                self.stdout.write(f" Purged {purged} old change log rows")
+            purged = purge_notification_log()
+            if purged:
+                self.stdout.write(f" Purged {purged} old notification claims")
+            purged = purge_dose_event_keys()
+            if purged:
+                self.stdout.write(f" Purged {purged} old dose event keys")
+            metrics.purge_snapshots()
+
+    def run_tick_loop(self):
         while True:
             try:
                 # Use timezone-aware datetime
                 now = timezone.localtime(timezone.now())
-                current_time = now.strftime("%H:%M")
-                
+
                 self.stdout.write(f"Current local time: {now}")
-                self.stdout.write(f" Checking medications at {current_time}...")
-                
-                meds = Medication.objects.all()
-                notified_count = 0
-                
-                for med in meds:
-                    if med.times and current_time in med.times:
-                        self.stdout.write(f" MATCH: {med.pill_name} at {current_time} for {med.user.username}")
-                        
-                        # Create scheduled datetime for today
-                        scheduled_datetime = timezone.now().replace(
-                            hour=int(current_time.split(':')[0]),
-                            minute=int(current_time.split(':')[1]),
-                            second=0,
-                            microsecond=0
-                        )
-                        
-                        # Check if DoseLog already exists
-                        dose_log, created = DoseLog.objects.get_or_create(
-                            medication=med,
-                            user=med.user,
-                            scheduled_time=scheduled_datetime,
-                            defaults={'status': 'pending'}
-                        )
-                        
-                        # Get all subscriptions for this user
-                        subs = PushSubscription.objects.filter(user=med.user)
-                        
-                        # Send notification to all subscriptions
-                        notification_sent = False
-                        for sub in subs:
-                            if not sub.p256dh or not sub.auth:
-                                continue
-                                
-                            try:
-                                # SIMPLE NOTIFICATION - No action buttons
-                                webpush(
-                                    subscription_info={
-                                        "endpoint": sub.endpoint,
-                                        "keys": {
-                                            "p256dh": sub.p256dh,
-                                            "auth": sub.auth
-                                        }
-                                    },
-                                    data=json.dumps({
-                                        "title": " Medicine Reminder",
-                                        "body": f"Time to take {med.pill_name} ({med.dosage} mg)",
-                                        "data": {
-                                            "url": "/dashboard/"  # Always redirect to dashboard
-                                        }
-                                    }),
-                                    vapid_private_key=settings.VAPID_PRIVATE_KEY,
-                                    vapid_claims={"sub": "mailto:medication-tracker@example.com"}
-                                )
-                                notified_count += 1
-                                notification_sent = True
-                                self.stdout.write(f" Sent notification for {med.pill_name}")
-                                break
-                                
-                            except WebPushException as e:
-                                self.stdout.write(f" Error: {e}")
-                                continue
-                        
-                        if not notification_sent:
-                            self.stdout.write(f" Could not send notification for {med.pill_name}")
-                
-                self.stdout.write(f" TOTAL: Sent {notified_count} notifications at {current_time}")
-                time.sleep(60)
-                
+
+                # Heartbeat our leases and pick up shards whose worker died
+                shards = acquire_leases(self.worker_id, self.num_shards)
+                self.stdout.write(f" Checking medications at {now:%H:%M} for shards {shards}...")
+
+                self.process_shards(shards)
+                self.maybe_sweep(shards)
+                metrics.flush(self.metrics_source)
+                sleep_until_next_minute()
+
             except KeyboardInterrupt:
-                self.stdout.write(" Stopping service...")
-                break
+                raise
             except Exception as e:
                 self.stdout.write(f" Error: {e}")
-                time.sleep(60)
\ No newline at end of file
+                sleep_until_next_minute()
+
+    def run_event_loop(self):
+        """
+        Sleep until the earliest next fire time in the queue instead of waking every
+        minute. Schedule edits are polled from ChangeLog right before each fire and
+        otherwise every SCHEDULER_CHANGE_POLL_SECONDS, or SCHEDULER_IDLE_POLL_SECONDS
+        while nothing is due for that long. Doses only turn overdue after a fire, so
+        the sweep follows the fires, with the idle interval as a fallback.
+        """
+        queue = NextFireQueue()
+        queue.load()
+        self.stdout.write(f" Loaded {len(queue)} schedule entries")
+
+        # Same margin as tick mode, which heartbeats once a minute with the default 120s TTL
+        heartbeat_interval = settings.SCHEDULER_LEASE_TTL / 2
+        next_heartbeat = 0
+        next_poll = 0
+        shards = []
+        # Run once at start-up so missed minutes are caught up straight away
+        must_run = True
+
+        while True:
+            try:
+                if time.monotonic() >= next_heartbeat:
+                    owned = acquire_leases(self.worker_id, self.num_shards)
+                    # Newly taken-over shards catch up from their cursor at once
+                    must_run = must_run or bool(set(owned) - set(shards))
+                    shards = owned
+                    next_heartbeat = time.monotonic() + heartbeat_interval
+
+                now = timezone.now()
+                next_fire = queue.next_fire_at()
+                if time.monotonic() >= next_poll or (next_fire is not None and next_fire <= now):
+                    queue.apply_changes(now)
+                    next_poll = time.monotonic() + self.change_poll_interval(queue, now)
+                due = queue.pop_due(now)
+                if due or must_run:
+                    if due:
+                        # How late we woke up relative to the scheduled instant
+                        metrics.gauge('scheduler.fire_delay_seconds', (now - due[0][0]).total_seconds())
+                        self.stdout.write(f"Current local time: {timezone.localtime(now)} ({len(due)} doses due)")
+                    self.process_shards(shards)
+                    must_run = False
+                    # The doses just fired become overdue after the grace period
+                    self.next_sweep = min(
+                        self.next_sweep, time.monotonic() + settings.DOSE_MISSED_GRACE_MINUTES * 60
+                    )
+                self.maybe_sweep(shards, settings.SCHEDULER_IDLE_POLL_SECONDS)
+
+                metrics.gauge('scheduler.queue_size', len(queue))
+                metrics.flush(self.metrics_source)
+                wake_in = min(next_poll, next_heartbeat) - time.monotonic()
+                if 0 in shards:
+                    wake_in = min(wake_in, self.next_sweep - time.monotonic())
+                next_fire = queue.next_fire_at()
+                if next_fire is not None:
+                    wake_in = min(wake_in, (next_fire - timezone.now()).total_seconds())
+                time.sleep(max(wake_in, 0))
+
+            except KeyboardInterrupt:
+                raise
+            except Exception as e:
+                self.stdout.write(f" Error: {e}")
+                time.sleep(settings.SCHEDULER_CHANGE_POLL_SECONDS)
+
+    def change_poll_interval(self, queue, now):
+        """Poll ChangeLog less often while no dose is due within SCHEDULER_IDLE_POLL_SECONDS."""
+        next_fire = queue.next_fire_at()
+        if next_fire is not None and (next_fire - now).total_seconds() < settings.SCHEDULER_IDLE_POLL_SECONDS:
+            return settings.SCHEDULER_CHANGE_POLL_SECONDS
+        return settings.SCHEDULER_IDLE_POLL_SECONDS
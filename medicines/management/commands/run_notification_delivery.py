@@ -0,0 +1,44 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from medicines import metrics
+from medicines.leases import make_worker_id
+from medicines.outbox import deliver_batch, purge_delivered
+
+class Command(BaseCommand):
+    help = 'Drain the notification outbox: send queued pushes with retries and backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when nothing is due')
+
+    def handle(self, *args, **options):
+        worker_id = make_worker_id()
+        self.stdout.write(f' Starting notification delivery worker {worker_id}...')
+        metrics_source = f"run_notification_delivery@{worker_id}"
+        last_purge = 0
+
+        while True:
+            try:
+                metrics.flush(metrics_source)
+                processed = deliver_batch(worker_id, options['batch_size'])
+                if processed:
+                    self.stdout.write(f" Processed {processed} queued notifications")
+                    continue
+
+                # Idle: housekeeping at most once an hour, then wait for new work
+                if time.time() - last_purge > 3600:
+                    purged = purge_delivered()
+                    if purged:
+                        self.stdout.write(f" Purged {purged} old outbox rows")
+                    last_purge = time.time()
+                time.sleep(options['poll_interval'])
+
+            except KeyboardInterrupt:
+                self.stdout.write(" Stopping delivery worker...")
+                metrics.flush(metrics_source, force=True)
+                break
+            except Exception as e:
+                self.stdout.write(f" Error: {e}")
+                time.sleep(options['poll_interval'])
@@ -0,0 +1,53 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from medicines import metrics
+from medicines.utils.miss_risk import score_shard, shard_metrics_source
+from medicines.utils.model_loader import current_model
+
+class Command(BaseCommand):
+    help = (
+        'Score the miss risk of every active medication into MissRiskScore; run it on several '
+        'machines with the same --shards and different --shard values to split users between them'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shard', type=int, default=0, help='User shard to score (user_id %% shards)')
+        parser.add_argument('--shards', type=int, default=1, help='Number of user shards')
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Split the shard between this many local processes')
+        parser.add_argument('--chunk-size', type=int, default=settings.MISS_RISK_CHUNK_SIZE,
+                            help='Medications per feature query and predict_proba call')
+
+    def handle(self, *args, **options):
+        shard, shards, processes = options['shard'], options['shards'], options['processes']
+        if not 0 <= shard < shards or processes < 1:
+            raise CommandError("Need 0 <= --shard < --shards and --processes >= 1")
+
+        # Loaded once here; forked workers inherit it (and its memory-mapped arrays)
+        current_model()
+        now = timezone.now()
+        start = time.perf_counter()
+
+        if processes == 1:
+            scored = score_shard(shard, shards, options['chunk_size'], now)
+        else:
+            # Shard s of S splits into shards s, s + S, ... of S * processes
+            jobs = [(shard + shards * k, shards * processes, options['chunk_size'], now) for k in range(processes)]
+            # Each child must open its own database connection
+            connections.close_all()
+            with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('fork')) as pool:
+                scored = sum(pool.map(score_shard, *zip(*jobs)))
+
+        elapsed = time.perf_counter() - start
+        # miss_risk.scored is counted (and flushed) by whichever process scored each chunk
+        metrics.gauge('miss_risk.duration_seconds', elapsed)
+        # One snapshot per shard, replaced by each run; forced, as the process exits next
+        metrics.flush(shard_metrics_source(shard, shards), force=True)
+        self.stdout.write(self.style.SUCCESS(
+            f" Scored {scored} medications in {elapsed:.1f}s ({scored / elapsed if elapsed else 0:,.0f}/s)"
+        ))
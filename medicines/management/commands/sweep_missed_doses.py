@@ -0,0 +1,31 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from medicines.utils.dose_slots import materialize_day_slots, sweep_missed_doses, upcoming_days
+
+class Command(BaseCommand):
+    help = "Mark pending doses older than the grace period as missed and create today's and tomorrow's dose slots"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-minutes', type=int, default=settings.DOSE_MISSED_GRACE_MINUTES)
+        parser.add_argument('--batch-size', type=int, default=settings.DOSE_SWEEP_BATCH_SIZE)
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Repeat every N seconds instead of running once')
+
+    def handle(self, *args, **options):
+        slot_days = set()
+        while True:
+            # Once per day, so the dashboard finds every slot and only reads
+            days = upcoming_days()
+            if set(days) != slot_days:
+                checked = materialize_day_slots([day for day in days if day not in slot_days])
+                slot_days = set(days)
+                self.stdout.write(f" Dose slots ready up to {days[-1]} ({checked} checked)")
+            swept = sweep_missed_doses(options['grace_minutes'], options['batch_size'])
+            self.stdout.write(f" Marked {swept} overdue doses as missed")
+            if not options['interval']:
+                break
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                break
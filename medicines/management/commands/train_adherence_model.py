@@ -0,0 +1,100 @@
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import accuracy_score, log_loss
+from medicines.utils.batch_features import FEATURE_COLUMNS
+from medicines.utils.model_loader import get_registry
+from medicines.utils.training import iter_training_chunks
+
+CLASSES = np.array([0, 1])
+
+class Command(BaseCommand):
+    help = (
+        'Train the adherence model on DoseLog outcomes, streamed in chunks with point-in-time '
+        'features, and publish it as a new registry version'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true',
+                            help='Continue the current version with partial_fit on outcomes it has not seen')
+        parser.add_argument('--holdout-days', type=int, default=settings.TRAINING_HOLDOUT_DAYS,
+                            help='Keep the most recent days out of training and report metrics on them')
+        parser.add_argument('--chunk-size', type=int, default=settings.TRAINING_CHUNK_SIZE)
+        parser.add_argument('--max-holdout-rows', type=int, default=200000,
+                            help='Uniform sample of holdout rows kept for the metrics')
+        parser.add_argument('--no-activate', action='store_true', help='Publish without serving the new version')
+
+    def handle(self, *args, **options):
+        registry = get_registry()
+        now = timezone.now()
+        holdout_start = now - timedelta(days=options['holdout_days'])
+        rng = np.random.default_rng(0)
+
+        since = None
+        model = None
+        current = registry.current_version()
+        if options['incremental'] and current is not None:
+            meta = registry.metadata(current)
+            if meta.get('estimator') == 'SGDClassifier' and meta.get('trained_until'):
+                model = registry.estimator(current)
+                since = datetime.fromisoformat(meta['trained_until'])
+                self.stdout.write(f" Continuing {current} with outcomes from {since:%Y-%m-%d %H:%M}")
+        if model is None:
+            if options['incremental']:
+                self.stdout.write(" No incrementally trained version yet: training from scratch")
+            model = SGDClassifier(loss='log_loss', alpha=1e-4, random_state=0)
+
+        start = time.perf_counter()
+        trained = 0
+        holdout_x, holdout_y, holdout_keys = [], [], []
+        holdout_cutoff = int(holdout_start.timestamp())
+        for features, labels, seconds in iter_training_chunks(since, now, options['chunk_size']):
+            train = seconds < holdout_cutoff
+            if train.any():
+                # Rows arrive grouped by medication; shuffle so each step sees a mix
+                order = rng.permutation(np.flatnonzero(train))
+                model.partial_fit(
+                    pd.DataFrame(features[order], columns=FEATURE_COLUMNS), labels[order], classes=CLASSES
+                )
+                trained += len(order)
+            if (~train).any():
+                # Bounded uniform sample of the holdout: keep the rows with the smallest random keys
+                holdout_x.append(features[~train])
+                holdout_y.append(labels[~train])
+                holdout_keys.append(rng.random(int((~train).sum())))
+                if sum(len(k) for k in holdout_keys) > options['max_holdout_rows']:
+                    keys = np.concatenate(holdout_keys)
+                    keep = np.argpartition(keys, options['max_holdout_rows'])[:options['max_holdout_rows']]
+                    holdout_x = [np.concatenate(holdout_x)[keep]]
+                    holdout_y = [np.concatenate(holdout_y)[keep]]
+                    holdout_keys = [keys[keep]]
+            self.stdout.write(f" Trained on {trained} outcomes ({time.perf_counter() - start:.0f}s)")
+
+        if not trained:
+            raise CommandError("No new taken/missed outcomes before the holdout window: nothing to train on")
+
+        info = {
+            'trained_rows': trained + (registry.metadata(current).get('trained_rows', 0) if since else 0),
+            'trained_until': holdout_start.isoformat(),
+            'training_seconds': round(time.perf_counter() - start, 1),
+        }
+        if holdout_y:
+            x = pd.DataFrame(np.concatenate(holdout_x), columns=FEATURE_COLUMNS)
+            y = np.concatenate(holdout_y)
+            probabilities = model.predict_proba(x)[:, 1]
+            info.update({
+                'holdout_rows': len(y),
+                'holdout_miss_rate': round(float(y.mean()), 4),
+                'holdout_log_loss': round(float(log_loss(y, probabilities, labels=CLASSES)), 4),
+                'holdout_accuracy': round(float(accuracy_score(y, probabilities >= 0.5)), 4),
+            })
+
+        version = registry.publish(model, model.feature_names_in_, activate=not options['no_activate'], **info)
+        details = ', '.join(f"{key}={value}" for key, value in info.items())
+        self.stdout.write(self.style.SUCCESS(f" Published {version}: {details}"))
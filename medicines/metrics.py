@@ -0,0 +1,58 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import MetricSnapshot
+
+# In-process metrics: counters only go up, gauges hold the latest value
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+# source -> monotonic time of its next unforced flush
+_next_flush = {}
+
+
+def incr(name, amount=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def gauge(name, value):
+    with _lock:
+        _gauges[name] = value
+
+
+def snapshot():
+    """Copy of all metrics recorded by this process."""
+    with _lock:
+        return {'counters': dict(_counters), 'gauges': dict(_gauges)}
+
+
+def flush(source, force=False):
+    """
+    Store this process's metrics as the MetricSnapshot `source`, at most every
+    METRICS_FLUSH_INTERVAL seconds unless forced, so /api/metrics/ served by the
+    web process can report the counters of the scheduler and delivery workers.
+
+    The throttle is per process and per source. A forked worker starts with a copy
+    of its parent's metrics and deadlines, so short-lived processes (and any process
+    about to exit) must flush with force=True or their last counts are lost.
+    """
+    if not force and time.monotonic() < _next_flush.get(source, 0):
+        return False
+    _next_flush[source] = time.monotonic() + settings.METRICS_FLUSH_INTERVAL
+    # One UPDATE in the steady state; update_or_create would add a transaction and a SELECT
+    values = snapshot()
+    if not MetricSnapshot.objects.filter(source=source).update(updated_at=timezone.now(), **values):
+        MetricSnapshot.objects.create(source=source, **values)
+    return True
+
+
+def purge_snapshots(hours=None):
+    """Delete snapshots of processes that stopped reporting; every process start has a new source."""
+    hours = settings.METRICS_RETENTION_HOURS if hours is None else hours
+    deleted, _ = MetricSnapshot.objects.filter(updated_at__lt=timezone.now() - timedelta(hours=hours)).delete()
+    return deleted
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:03
+
+import django.db.models.deletion
+from datetime import datetime
+
+from django.db import migrations, models
+
+
+def backfill_schedule_index(apps, schema_editor):
+    Medication = apps.get_model('medicines', 'Medication')
+    MedicationSchedule = apps.get_model('medicines', 'MedicationSchedule')
+
+    entries = []
+    for med_id, times in Medication.objects.values_list('id', 'times').iterator():
+        if not isinstance(times, list):
+            continue
+        normalized = set()
+        for t_str in times:
+            try:
+                normalized.add(datetime.strptime(str(t_str), "%H:%M").strftime("%H:%M"))
+            except ValueError:
+                continue
+        entries.extend(MedicationSchedule(medication_id=med_id, time=t) for t in normalized)
+    MedicationSchedule.objects.bulk_create(entries, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicines', '0011_medication_google_event_ids_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MedicationSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time', models.CharField(db_index=True, max_length=5)),
+                ('medication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedule_entries', to='medicines.medication')),
+            ],
+            options={
+                'unique_together': {('medication', 'time')},
+            },
+        ),
+        migrations.RunPython(backfill_schedule_index, migrations.RunPython.noop),
+    ]
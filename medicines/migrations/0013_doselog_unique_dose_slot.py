@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:09
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def remove_duplicate_slots(apps, schema_editor):
+    """Keep one DoseLog per (medication, scheduled_time), preferring a recorded 'taken'."""
+    DoseLog = apps.get_model('medicines', 'DoseLog')
+    rank = {'taken': 0, 'missed': 1}
+
+    duplicates = (
+        DoseLog.objects.values('medication_id', 'scheduled_time')
+        .annotate(n=Count('id'))
+        .filter(n__gt=1)
+    )
+    for slot in duplicates:
+        logs = list(DoseLog.objects.filter(
+            medication_id=slot['medication_id'],
+            scheduled_time=slot['scheduled_time']
+        ))
+        logs.sort(key=lambda log: (rank.get(log.status, 2), log.id))
+        DoseLog.objects.filter(id__in=[log.id for log in logs[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicines', '0012_medicationschedule'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_slots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='doselog',
+            constraint=models.UniqueConstraint(fields=('medication', 'scheduled_time'), name='unique_dose_slot'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicines', '0013_doselog_unique_dose_slot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchedulerCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_processed_minute', models.DateTimeField(blank=True, null=True)),
+                ('last_tick_lag', models.FloatField(default=0, help_text='Seconds between the minute boundary and the end of its tick')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:13
+
+from django.db import migrations, models
+
+
+def rename_default_cursor(apps, schema_editor):
+    # The single-process cursor becomes the cursor of shard 0 out of 1
+    SchedulerCursor = apps.get_model('medicines', 'SchedulerCursor')
+    SchedulerCursor.objects.filter(name='default').update(name='shard-0-of-1')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicines', '0014_schedulercursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkerHeartbeat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('worker', models.CharField(max_length=100, unique=True)),
+                ('heartbeat_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WorkerLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveIntegerField(unique=True)),
+                ('owner', models.CharField(blank=True, default='', max_length=100)),
+                ('expires_at', models.DateTimeField()),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='notificationlog',
+            name='worker',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.RunPython(rename_default_cursor, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def remove_duplicate_subscriptions(apps, schema_editor):
+    """save_subscription used to add a row on every page load; keep the newest per endpoint."""
+    PushSubscription = apps.get_model('medicines', 'PushSubscription')
+    newest = PushSubscription.objects.values('user_id', 'endpoint').annotate(keep=Max('id'))
+    keep_ids = [row['keep'] for row in newest]
+    PushSubscription.objects.exclude(id__in=keep_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicines', '0015_reminder_worker_leases'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pushsubscription',
+            name='is_active',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.CreateModel(
+            name='NotificationOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.TextField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField()),
+                ('claimed_by', models.CharField(blank=True, default='', max_length=100)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('subscription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outbox', to='medicines.pushsubscription')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx')],
+            },
+        ),
+        migrations.RunPython(remove_duplicate_subscriptions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicines', '0018_dailyadherence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='doselog',
+            options={},
+        ),
+        migrations.AlterField(
+            model_name='doselog',
+            name='medication',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='logs', to='medicines.medication'),
+        ),
+        migrations.AlterField(
+            model_name='doselog',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='doselog',
+            index=models.Index(fields=['user', 'scheduled_time'], name='doselog_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doselog',
+            index=models.Index(fields=['user', 'status', 'scheduled_time'], name='doselog_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doselog',
+            index=models.Index(fields=['status', 'scheduled_time'], name='doselog_status_time_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicines', '0020_doseeventkey'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='changelog',
+            index=models.Index(fields=['user_id', 'id'], name='changelog_user_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicines', '0021_changelog_user_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MissRiskScore',
+            fields=[
+                ('medication', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='miss_risk', serialize=False, to='medicines.medication')),
+                ('probability', models.FloatField()),
+                ('model_version', models.CharField(blank=True, default='', max_length=50)),
+                ('scored_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='miss_risk_scores', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicines', '0022_missriskscore'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=150, unique=True)),
+                ('counters', models.JSONField(default=dict)),
+                ('gauges', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicines', '0023_metricsnapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doseeventkey',
+            index=models.Index(fields=['created_at'], name='doseeventkey_created_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 # medicines/models.py
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MaxValueValidator
@@ -29,6 +30,21 @@ class Medication(models.Model):
         username = self.user.username if self.user else "N/A"
         return f"{self.pill_name} - {self.dosage} ({username})"
 
+class MedicationSchedule(models.Model):
+    """One row per (medication, "HH:MM") dose time, kept in sync with Medication.times.
+
+    The scheduler looks up the medications due in a minute through the indexed
+    ``time`` column instead of scanning every Medication.
+    """
+    medication = models.ForeignKey(Medication, on_delete=models.CASCADE, related_name='schedule_entries')
+    time = models.CharField(max_length=5, db_index=True)
+
+    class Meta:
+        unique_together = ['medication', 'time']
+
+    def __str__(self):
+        return f"{self.medication.pill_name} @ {self.time}"
+
 # --------------------------------------------------------------------------------------------------
 
 class PushSubscription(models.Model):
@@ -36,16 +52,48 @@ class PushSubscription(models.Model):
     endpoint = models.TextField()
     p256dh = models.TextField(default="")
     auth = models.TextField(default="")
+    # Cleared when the push service reports the endpoint gone (404/410)
+    is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"{self.user.username} subscription"
+
+class NotificationOutbox(models.Model):
+    """A push waiting for (or done with) delivery by run_notification_delivery."""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+
+    subscription = models.ForeignKey(PushSubscription, on_delete=models.CASCADE, related_name='outbox')
+    payload = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField()
+    # Delivery worker currently holding the row, so parallel workers never send it twice
+    claimed_by = models.CharField(max_length=100, blank=True, default="")
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.status} push to {self.subscription.user.username} (attempt {self.attempts})"
         
 class NotificationLog(models.Model):
     medication = models.ForeignKey(Medication, on_delete=models.CASCADE)
     sent_date = models.DateField()  
     sent_time = models.CharField(max_length=5)  
     sent_at = models.DateTimeField(auto_now_add=True) 
+    # Reminder worker that claimed this (medication, minute) slot; the unique
+    # constraint below means only one worker ever gets to send it
+    worker = models.CharField(max_length=100, blank=True, default="")
     
     class Meta:
         unique_together = ['medication', 'sent_date', 'sent_time']
@@ -53,24 +101,157 @@ class NotificationLog(models.Model):
     def __str__(self):
         return f"{self.medication.pill_name} - {self.sent_time} on {self.sent_date}"
     
+class SchedulerCursor(models.Model):
+    """Last wall-clock minute a reminder scheduler has fully processed, so restarts can catch up."""
+    name = models.CharField(max_length=50, unique=True)
+    last_processed_minute = models.DateTimeField(null=True, blank=True)
+    last_tick_lag = models.FloatField(default=0, help_text="Seconds between the minute boundary and the end of its tick")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_processed_minute}"
+
+class MetricSnapshot(models.Model):
+    """Latest in-process metrics of one background process, written by medicines.metrics.flush()."""
+    source = models.CharField(max_length=150, unique=True)
+    counters = models.JSONField(default=dict)
+    gauges = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} @ {self.updated_at}"
+
+class WorkerHeartbeat(models.Model):
+    """Liveness of a reminder worker process, used to split shards fairly between live workers."""
+    worker = models.CharField(max_length=100, unique=True)
+    heartbeat_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.worker} @ {self.heartbeat_at}"
+
+class WorkerLease(models.Model):
+    """Ownership of one reminder shard (users with user_id % shard count == shard) by a worker process."""
+    shard = models.PositiveIntegerField(unique=True)
+    owner = models.CharField(max_length=100, blank=True, default="")
+    expires_at = models.DateTimeField()
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"shard {self.shard} -> {self.owner or 'free'}"
+
+class ChangeLog(models.Model):
+    """
+    Append-only record of model changes; its auto-increment id is a monotonically
+    increasing change version that other processes (e.g. the reminder scheduler) poll.
+    Deletes are kept as tombstones, so the row does not reference the changed object.
+    """
+    model_name = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    user_id = models.BigIntegerField(null=True, blank=True)
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model_name', 'id'], name='changelog_model_idx'),
+            # Per-user deltas for /api/sync/
+            models.Index(fields=['user_id', 'id'], name='changelog_user_idx'),
+        ]
+
+    def __str__(self):
+        action = "deleted" if self.deleted else "changed"
+        return f"#{self.id} {self.model_name} {self.object_id} {action}"
+
 class DoseLog(models.Model):
     STATUS_CHOICES = (
         ('taken', 'Taken'),
         ('missed', 'Missed'),
     )
 
-    medication = models.ForeignKey(Medication, on_delete=models.CASCADE, related_name='logs')
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # The single-column FK indexes are covered by the leading columns of the
+    # unique constraint and of doselog_user_time_idx below
+    medication = models.ForeignKey(Medication, on_delete=models.CASCADE, related_name='logs', db_index=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     timestamp = models.DateTimeField(auto_now_add=True) 
     scheduled_time = models.DateTimeField() 
     status = models.CharField(max_length=10, choices=STATUS_CHOICES)
 
     class Meta:
-        ordering = ['scheduled_time']
+        # No default ordering: queries that need an order ask for it, the rest skip the sort
+        constraints = [
+            # One log per dose slot; lets slot creation use bulk_create(ignore_conflicts=True).
+            # Also serves (user, medication, scheduled_time) lookups, as medication implies user.
+            models.UniqueConstraint(fields=['medication', 'scheduled_time'], name='unique_dose_slot'),
+        ]
+        indexes = [
+            # Per-user day/range scans and history pages, already in scheduled_time order
+            models.Index(fields=['user', 'scheduled_time'], name='doselog_user_time_idx'),
+            # Per-user status filters (missed counts, history by status)
+            models.Index(fields=['user', 'status', 'scheduled_time'], name='doselog_user_status_idx'),
+            # Missed-dose sweeper: status='pending' AND scheduled_time < cutoff
+            models.Index(fields=['status', 'scheduled_time'], name='doselog_status_time_idx'),
+        ]
 
     def __str__(self):
         return f"{self.medication.pill_name} - {self.status} @ {self.scheduled_time.strftime('%Y-%m-%d %H:%M')}"  
 
+class DoseEventKey(models.Model):
+    """Client idempotency key of a dose event applied through the batch endpoint."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=64)
+    dose_log = models.ForeignKey(DoseLog, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'key')
+        indexes = [
+            # Hourly purge of keys older than DOSE_EVENT_KEY_RETENTION_DAYS
+            models.Index(fields=['created_at'], name='doseeventkey_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} {self.key}"
+
+class DailyAdherence(models.Model):
+    """
+    Per-user, per-local-day rollup of DoseLog counts, kept current by
+    medicines.utils.adherence.refresh_daily_adherence on every DoseLog write.
+    expected counts every dose slot of the day, whatever its status.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_adherence')
+    date = models.DateField()
+    expected = models.PositiveIntegerField(default=0)
+    taken = models.PositiveIntegerField(default=0)
+    missed = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'date')
+
+    def __str__(self):
+        return f"{self.user.username} {self.date}: {self.taken}/{self.expected} taken"
+
+class MissRiskScore(models.Model):
+    """
+    Latest predicted probability that a medication's next dose is missed, written
+    by the score_miss_risk command. Keyed by the medication, so readers fetch it by
+    primary key or in the same query through select_related('miss_risk').
+    """
+    medication = models.OneToOneField(
+        Medication, on_delete=models.CASCADE, primary_key=True, related_name='miss_risk'
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='miss_risk_scores')
+    probability = models.FloatField()
+    model_version = models.CharField(max_length=50, blank=True, default="")
+    scored_at = models.DateTimeField()
+
+    @property
+    def is_high(self):
+        return self.probability >= settings.MISS_RISK_THRESHOLD
+
+    def __str__(self):
+        return f"{self.medication_id}: {self.probability:.2f} miss risk ({self.model_version})"
+
 class GoogleCredentials(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     access_token = models.TextField()
@@ -1,11 +1,136 @@
-from pywebpush import webpush
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from py_vapid import Vapid
+from pywebpush import WebPusher, WebPushException
 from django.conf import settings
 
-def send_web_push(subscription_info, message):
-    """Send a web push notification to a specific subscription"""
-    webpush(
-        subscription_info=subscription_info,
-        data=message,
-        vapid_private_key=settings.VAPID_PRIVATE_KEY,
-        vapid_claims={"sub": "mailto:medication-tracker@example.com"}
+# Outcome of one push: `endpoint` is the subscription that accepted it (or the last one tried)
+PushResult = namedtuple('PushResult', ['sent', 'endpoint', 'error'])
+
+VAPID_CLAIMS_SUB = "mailto:medication-tracker@example.com"
+# VAPID JWTs are issued for 12 hours (the most push services accept) and
+# re-signed once less than VAPID_HEADER_REFRESH_MARGIN seconds are left
+VAPID_TOKEN_LIFETIME = 12 * 60 * 60
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+_vapid = None
+_vapid_source = None
+_vapid_headers = {}
+_vapid_lock = threading.Lock()
+
+
+def _origin(endpoint):
+    url = urlparse(endpoint)
+    return f"{url.scheme}://{url.netloc}"
+
+
+def _load_vapid(private_key):
+    # Like pywebpush.webpush(): VAPID_PRIVATE_KEY is either a PEM file path or the key itself
+    if os.path.isfile(private_key):
+        return Vapid.from_file(private_key_file=private_key)
+    return Vapid.from_string(private_key=private_key)
+
+
+def vapid_headers(endpoint):
+    """
+    VAPID Authorization header for the endpoint's push service, cached per audience
+    origin. The private key is parsed once and an EC signature is only computed when
+    the cached token is close to expiry, instead of once per notification.
+    """
+    global _vapid, _vapid_source
+    audience = _origin(endpoint)
+    now = time.time()
+    with _vapid_lock:
+        if _vapid is None or _vapid_source != settings.VAPID_PRIVATE_KEY:
+            _vapid = _load_vapid(settings.VAPID_PRIVATE_KEY)
+            _vapid_source = settings.VAPID_PRIVATE_KEY
+            _vapid_headers.clear()
+
+        cached = _vapid_headers.get(audience)
+        if cached and cached[1] - now > settings.VAPID_HEADER_REFRESH_MARGIN:
+            return cached[0]
+
+        expires_at = int(now) + VAPID_TOKEN_LIFETIME
+        headers = _vapid.sign({"sub": VAPID_CLAIMS_SUB, "aud": audience, "exp": expires_at})
+        _vapid_headers[audience] = (headers, expires_at)
+        return headers
+
+
+def _session_for(endpoint):
+    """Shared keep-alive session per push-service origin (e.g. https://fcm.googleapis.com)."""
+    url = urlparse(endpoint)
+    origin = _origin(endpoint)
+    with _sessions_lock:
+        session = _sessions.get(origin)
+        if session is None:
+            session = requests.Session()
+            # Let every worker thread hold its own pooled connection to this origin
+            adapter = HTTPAdapter(pool_maxsize=settings.WEBPUSH_MAX_WORKERS)
+            session.mount(f"{url.scheme}://", adapter)
+            _sessions[origin] = session
+    return session
+
+
+def _send_one(subscription_info, message, timeout):
+    # Same request as pywebpush.webpush(), but with the cached VAPID header
+    endpoint = subscription_info["endpoint"]
+    response = WebPusher(subscription_info, requests_session=_session_for(endpoint)).send(
+        message,
+        dict(vapid_headers(endpoint)),
+        ttl=0,
+        timeout=timeout
     )
+    if response.status_code > 202:
+        raise WebPushException(
+            f"Push failed: {response.status_code} {response.reason}\nResponse body:{response.text}",
+            response=response
+        )
+
+
+def _deliver(subscriptions, message, timeout):
+    """
+    Try the subscriptions in order until one accepts the push. Any error is returned
+    in the PushResult rather than raised, so one broken subscription (say a p256dh
+    key that fails to parse with ValueError) cannot abort the rest of the batch.
+    """
+    result = PushResult(False, None, None)
+    for subscription_info in subscriptions:
+        try:
+            _send_one(subscription_info, message, timeout)
+            return PushResult(True, subscription_info["endpoint"], None)
+        except Exception as e:
+            result = PushResult(False, subscription_info["endpoint"], e)
+    return result
+
+
+def send_web_push(pushes, timeout=None, max_workers=None):
+    """
+    Send a batch of web push notifications concurrently.
+
+    `pushes` is a list of (subscriptions, message) pairs, where subscriptions is a
+    list of subscription_info dicts tried in order until one accepts the message.
+    Returns one PushResult per push, in the same order, so a slow push service
+    only holds up its own worker thread instead of the whole batch.
+    """
+    pushes = list(pushes)
+    if not pushes:
+        return []
+
+    timeout = timeout or settings.WEBPUSH_TIMEOUT
+    max_workers = min(max_workers or settings.WEBPUSH_MAX_WORKERS, len(pushes))
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='webpush') as executor:
+        futures = [
+            executor.submit(_deliver, subscriptions, message, timeout)
+            for subscriptions, message in pushes
+        ]
+        return [future.result() for future in futures]
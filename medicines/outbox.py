@@ -0,0 +1,118 @@
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import metrics
+from .models import NotificationOutbox, PushSubscription
+from .notifications import send_web_push
+
+# Push service answers meaning the subscription no longer exists
+GONE_STATUS_CODES = (404, 410)
+
+
+def enqueue_pushes(pushes):
+    """Queue (PushSubscription, payload) pairs for delivery; a single bulk insert."""
+    now = timezone.now()
+    rows = NotificationOutbox.objects.bulk_create([
+        NotificationOutbox(subscription=sub, payload=payload, next_attempt_at=now)
+        for sub, payload in pushes
+    ])
+    return len(rows)
+
+
+def backoff_delay(attempts):
+    """Exponential backoff with full jitter, never shorter than the base delay."""
+    base = settings.OUTBOX_BACKOFF_BASE
+    ceiling = min(settings.OUTBOX_BACKOFF_MAX, base * 2 ** attempts)
+    return timedelta(seconds=random.uniform(base, max(base, ceiling)))
+
+
+def claim_batch(worker_id, batch_size):
+    """Take up to batch_size due rows for this worker; claimed rows stay invisible to others for a while."""
+    now = timezone.now()
+    ids = list(
+        NotificationOutbox.objects.filter(status='pending', next_attempt_at__lte=now)
+        .order_by('next_attempt_at').values_list('id', flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+
+    # If this worker dies mid-batch the rows become due again after the visibility timeout
+    NotificationOutbox.objects.filter(id__in=ids, status='pending', next_attempt_at__lte=now).update(
+        claimed_by=worker_id,
+        next_attempt_at=now + timedelta(seconds=settings.OUTBOX_VISIBILITY_TIMEOUT)
+    )
+    return list(
+        NotificationOutbox.objects.filter(id__in=ids, claimed_by=worker_id, status='pending')
+        .select_related('subscription')
+    )
+
+
+def deliver_batch(worker_id, batch_size=None):
+    """
+    Send one batch of due outbox rows concurrently. Successes are marked sent,
+    failures are retried with backoff, and subscriptions the push service reports
+    gone are deactivated. Returns the number of rows processed.
+    """
+    rows = claim_batch(worker_id, batch_size or settings.OUTBOX_BATCH_SIZE)
+    if not rows:
+        return 0
+
+    results = send_web_push([
+        ([{
+            "endpoint": row.subscription.endpoint,
+            "keys": {
+                "p256dh": row.subscription.p256dh,
+                "auth": row.subscription.auth
+            }
+        }], row.payload)
+        for row in rows
+    ])
+
+    now = timezone.now()
+    sent_ids = []
+    gone_subscription_ids = set()
+    retried = []
+    for row, result in zip(rows, results):
+        if result.sent:
+            sent_ids.append(row.id)
+            continue
+
+        row.attempts += 1
+        row.last_error = str(result.error)[:1000]
+        status_code = getattr(getattr(result.error, 'response', None), 'status_code', None)
+        if status_code in GONE_STATUS_CODES:
+            gone_subscription_ids.add(row.subscription_id)
+            row.status = 'failed'
+        elif row.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            row.status = 'failed'
+        else:
+            row.next_attempt_at = now + backoff_delay(row.attempts)
+        retried.append(row)
+
+    if sent_ids:
+        NotificationOutbox.objects.filter(id__in=sent_ids).update(status='sent', sent_at=now)
+    if retried:
+        NotificationOutbox.objects.bulk_update(retried, ['attempts', 'last_error', 'status', 'next_attempt_at'])
+    if gone_subscription_ids:
+        PushSubscription.objects.filter(id__in=gone_subscription_ids).update(is_active=False)
+        # Nothing else queued for a dead endpoint can ever be delivered
+        NotificationOutbox.objects.filter(
+            subscription_id__in=gone_subscription_ids, status='pending'
+        ).update(status='failed', last_error='Subscription gone')
+
+    metrics.incr('outbox.sent', len(sent_ids))
+    metrics.incr('outbox.failed_attempts', len(retried))
+    metrics.incr('outbox.pruned_subscriptions', len(gone_subscription_ids))
+    return len(rows)
+
+
+def purge_delivered(days=None):
+    """Delete sent and failed rows older than OUTBOX_RETENTION_DAYS."""
+    cutoff = timezone.now() - timedelta(days=days or settings.OUTBOX_RETENTION_DAYS)
+    deleted, _ = NotificationOutbox.objects.filter(
+        status__in=['sent', 'failed'], created_at__lt=cutoff
+    ).delete()
+    return deleted
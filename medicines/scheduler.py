@@ -0,0 +1,154 @@
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import metrics
+from .leases import claim_notifications
+from .models import PushSubscription
+from .outbox import enqueue_pushes
+from .utils.dose_slots import materialize_dose_slots, scheduled_slot
+from .utils.schedule_index import schedule_entries_due
+
+
+def floor_minute(dt):
+    return dt.replace(second=0, microsecond=0)
+
+
+def sleep_until_next_minute():
+    """Sleep to the next wall-clock minute boundary, so processing time never adds drift."""
+    time.sleep(60 - time.time() % 60 + 0.05)
+
+
+def due_minutes(cursor, now=None):
+    """
+    Minutes after the cursor's last processed one, up to and including the current one.
+    A fresh cursor starts at the current minute; very long outages are capped at
+    SCHEDULER_MAX_CATCHUP_MINUTES.
+    """
+    current = floor_minute(now or timezone.now())
+    if cursor.last_processed_minute is None:
+        return [current]
+
+    start = floor_minute(cursor.last_processed_minute) + timedelta(minutes=1)
+    start = max(start, current - timedelta(minutes=settings.SCHEDULER_MAX_CATCHUP_MINUTES - 1))
+
+    minutes = []
+    while start <= current:
+        minutes.append(start)
+        start += timedelta(minutes=1)
+    return minutes
+
+
+def reminder_payload(doses):
+    """Push payload for one user's due (medication, scheduled_time) pairs; rendered by service-worker.js."""
+    pills = ", ".join(f"{med.pill_name} ({med.dosage} mg)" for med, _ in doses)
+    if len(doses) == 1:
+        body = f"Time to take {pills}"
+    else:
+        body = f"Time to take {len(doses)} medicines: {pills}"
+
+    # SIMPLE NOTIFICATION - No action buttons
+    return json.dumps({
+        "title": " Medicine Reminder",
+        "body": body,
+        "data": {
+            "url": "/dashboard/",  # Always redirect to dashboard
+            "doses": [
+                {
+                    "pill_name": med.pill_name,
+                    "dosage": med.dosage,
+                    "time": timezone.localtime(scheduled_dt).strftime("%H:%M"),
+                    "high_miss_risk": bool(getattr(med, 'miss_risk', None) and med.miss_risk.is_high),
+                }
+                for med, scheduled_dt in doses
+            ]
+        }
+    })
+
+
+def process_minutes(minutes, log=print, shard=0, num_shards=1, worker_id=""):
+    """
+    Notify every dose scheduled in the given minutes in one batched pass:
+    one schedule-index query, one bulk slot insert and one bulk outbox insert.
+    Only users in the given shard (user_id % num_shards) are handled, and only
+    slots this worker manages to claim are queued. Returns the number of pushes queued.
+    """
+    # Local "HH:MM" -> the local minutes that share it (more than one across a day boundary)
+    minutes_by_time = {}
+    for minute in minutes:
+        local = timezone.localtime(minute)
+        minutes_by_time.setdefault(local.strftime("%H:%M"), []).append(local)
+
+    entries = schedule_entries_due(minutes_by_time, shard, num_shards)
+    due = [
+        (entry.medication, scheduled_slot(local.date(), entry.time))
+        for entry in entries
+        for local in minutes_by_time[entry.time]
+    ]
+    if not due:
+        return 0
+
+    # Create all due DoseLog slots in one bulk insert
+    materialize_dose_slots(due)
+
+    # Claims and outbox rows commit together: a crash in between must not leave
+    # slots claimed (so never retried by anyone) without a queued push
+    with transaction.atomic():
+        # Another worker may already have sent some of them (e.g. before a lease takeover)
+        due = claim_notifications(due, worker_id)
+        if not due:
+            return 0
+
+        # Load every due user's active subscriptions in one query
+        subs_by_user = {}
+        for sub in PushSubscription.objects.filter(user_id__in={med.user_id for med, _ in due}, is_active=True):
+            if not sub.p256dh or not sub.auth:
+                continue
+            subs_by_user.setdefault(sub.user_id, []).append(sub)
+
+        # Coalesce: one reminder per user listing every pill due in this pass
+        doses_by_user = {}
+        for med, scheduled_dt in due:
+            log(f" MATCH: {med.pill_name} at {timezone.localtime(scheduled_dt):%H:%M} for {med.user.username}")
+            doses_by_user.setdefault(med.user_id, []).append((med, scheduled_dt))
+
+        pushes = []
+        for user_id, doses in doses_by_user.items():
+            subs = subs_by_user.get(user_id, [])
+            if not subs:
+                log(f" Could not send notification for {', '.join(med.pill_name for med, _ in doses)} (no subscription)")
+                continue
+            message = reminder_payload(doses)
+            pushes.extend((sub, message) for sub in subs)
+
+        # Delivery (retries, backoff, pruning) happens in run_notification_delivery,
+        # so the tick stays fast however slow the push services are
+        return enqueue_pushes(pushes)
+
+
+def run_tick(cursor, log=print, shard=0, num_shards=1, worker_id=""):
+    """Process every minute the cursor has not seen yet, then advance it and record the tick lag."""
+    minutes = due_minutes(cursor)
+    if not minutes:
+        return 0
+
+    if len(minutes) > 1:
+        log(f" Catching up {len(minutes)} minutes since {timezone.localtime(minutes[0]):%Y-%m-%d %H:%M}")
+        metrics.incr('scheduler.catchup_minutes', len(minutes) - 1)
+
+    queued_count = process_minutes(minutes, log, shard, num_shards, worker_id)
+
+    # Lag: how long after the newest minute's boundary its processing finished
+    lag = (timezone.now() - minutes[-1]).total_seconds()
+    cursor.last_processed_minute = minutes[-1]
+    cursor.last_tick_lag = lag
+    cursor.save(update_fields=['last_processed_minute', 'last_tick_lag', 'updated_at'])
+
+    metrics.incr('scheduler.minutes_processed', len(minutes))
+    metrics.incr('scheduler.notifications_queued', queued_count)
+    metrics.gauge('scheduler.tick_lag_seconds', lag)
+    return queued_count
@@ -0,0 +1,93 @@
+from django.contrib.auth.models import User
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .events import publish_dose_status
+from .models import DoseLog, Medication
+from .utils.adherence import local_day, refresh_daily_adherence
+from .utils.changelog import record_changes
+from .utils.schedule_index import sync_schedule_index
+
+
+def _deleting(origin, *models):
+    """
+    Whether a delete signal comes from deleting one of `models` (an instance or a
+    queryset of them). Django passes the object delete() was called on as `origin`
+    to every signal of the cascade, so nothing has to be remembered between the
+    pre_delete and post_delete receivers, and a delete that fails half way leaves
+    nothing behind to skip later writes.
+    """
+    if origin is None:
+        return False
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, models)
+
+
+@receiver(post_save, sender=Medication)
+def update_schedule_index(sender, instance, update_fields=None, **kwargs):
+    """Keep MedicationSchedule in sync; deletes are handled by the FK cascade."""
+    # Saves such as save(update_fields=['google_event_ids']) cannot change the schedule
+    if update_fields is not None and 'times' not in update_fields:
+        return
+    sync_schedule_index(instance)
+
+
+@receiver(post_save, sender=Medication)
+def record_medication_change(sender, instance, **kwargs):
+    record_changes('medication', [(instance.id, instance.user_id)])
+
+
+@receiver(post_delete, sender=Medication)
+def record_medication_delete(sender, instance, **kwargs):
+    record_changes('medication', [(instance.id, instance.user_id)], deleted=True)
+
+
+@receiver(post_save, sender=DoseLog)
+def record_dose_log_change(sender, instance, **kwargs):
+    record_changes('doselog', [(instance.id, instance.user_id)])
+
+
+@receiver(post_delete, sender=DoseLog)
+def record_dose_log_delete(sender, instance, origin=None, **kwargs):
+    # Cascades from a Medication or User delete are recorded in bulk below
+    if _deleting(origin, Medication, User):
+        return
+    record_changes('doselog', [(instance.id, instance.user_id)], deleted=True)
+
+
+@receiver(post_save, sender=DoseLog)
+@receiver(post_delete, sender=DoseLog)
+def update_daily_adherence(sender, instance, origin=None, **kwargs):
+    """Single-row DoseLog writes; bulk paths call refresh_daily_adherence themselves."""
+    if _deleting(origin, Medication, User):
+        return
+    refresh_daily_adherence({(instance.user_id, local_day(instance.scheduled_time))})
+
+
+@receiver(pre_delete, sender=Medication)
+def record_medication_cascade(sender, instance, origin=None, **kwargs):
+    """
+    Deleting a medication cascades to its DoseLogs. Record their tombstones with one
+    query here and refresh the rollup once per (user, day) afterwards, instead of
+    running the per-row DoseLog receivers (about five queries per log) for every one.
+    """
+    # Everything of a deleted user goes, DailyAdherence included: nothing to record or refresh
+    if _deleting(origin, User):
+        return
+    logs = list(DoseLog.objects.filter(medication=instance).values_list('id', 'user_id', 'scheduled_time'))
+    record_changes('doselog', [(log_id, user_id) for log_id, user_id, _ in logs], deleted=True)
+    # Kept on the instance being deleted, so a failed delete leaves nothing behind
+    instance._cascade_days = {(user_id, local_day(scheduled)) for _, user_id, scheduled in logs}
+
+
+@receiver(post_delete, sender=Medication)
+def refresh_after_medication_delete(sender, instance, **kwargs):
+    days = instance.__dict__.pop('_cascade_days', None)
+    if days:
+        refresh_daily_adherence(days)
+
+
+@receiver(post_save, sender=DoseLog)
+def announce_dose_status(sender, instance, **kwargs):
+    publish_dose_status([(instance.id, instance.user_id, instance.medication_id, instance.status)])
@@ -10,17 +10,27 @@ self.addEventListener('push', event => {
         };
     }
 
+    // Coalesced reminder: the server sends one push listing every pill due
+    const doses = (data.data && data.data.doses) || [];
+    let title = data.title;
+    let body = data.body;
+    if (doses.length > 1) {
+        title = `${data.title} (${doses.length} medicines)`;
+        body = doses.map(d => `• ${d.pill_name} (${d.dosage} mg) at ${d.time}`).join('\n');
+    }
+
     const options = {
-        body: data.body,
+        body: body,
         // icon: "/static/images/pill.png",
         // badge: "/static/images/badge.png",
         data: data.data || {},
-        // No actions - simple notification
-        requireInteraction: false // Don't force user to interact
+        // No actions - simple notification. Doses the nightly score flags as often
+        // missed stay on screen until the user interacts
+        requireInteraction: doses.some(d => d.high_miss_risk)
     };
 
     event.waitUntil(
-        self.registration.showNotification(data.title, options)
+        self.registration.showNotification(title, options)
     );
 });
 
@@ -31,4 +41,142 @@ self.addEventListener('notificationclick', function (event) {
     event.waitUntil(
         clients.openWindow('/dashboard/')
     );
-});
\ No newline at end of file
+});
+
+// ---- Offline dose taps ----
+// The dashboard hands taps it could not send to the worker. They wait in IndexedDB and
+// are flushed in one /api/dose-events/batch/ request; their idempotency keys make a
+// repeated flush harmless.
+const OFFLINE_DB = 'medimimes-offline';
+const DOSE_EVENTS_STORE = 'dose-events';
+const BATCH_URL = '/api/dose-events/batch/';
+const MAX_BATCH = 500;
+
+// Local copy of the user's data kept current by /api/sync/ deltas
+const MEDICATIONS_STORE = 'medications';
+const DOSE_LOGS_STORE = 'dose-logs';
+const META_STORE = 'meta';
+const SYNC_URL = '/api/sync/';
+
+function openOfflineDb() {
+    return new Promise((resolve, reject) => {
+        const request = indexedDB.open(OFFLINE_DB, 2);
+        request.onupgradeneeded = () => {
+            const db = request.result;
+            if (!db.objectStoreNames.contains(DOSE_EVENTS_STORE)) {
+                db.createObjectStore(DOSE_EVENTS_STORE, { keyPath: 'key' });
+            }
+            if (!db.objectStoreNames.contains(MEDICATIONS_STORE)) {
+                db.createObjectStore(MEDICATIONS_STORE, { keyPath: 'id' });
+                db.createObjectStore(DOSE_LOGS_STORE, { keyPath: 'id' });
+                db.createObjectStore(META_STORE);
+            }
+        };
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+function storeRequest(mode, fn, storeName = DOSE_EVENTS_STORE) {
+    return openOfflineDb().then(db => new Promise((resolve, reject) => {
+        const tx = db.transaction(storeName, mode);
+        const request = fn(tx.objectStore(storeName));
+        tx.oncomplete = () => resolve(request && request.result);
+        tx.onerror = () => reject(tx.error);
+    }));
+}
+
+function queueDoseEvent(doseEvent) {
+    return storeRequest('readwrite', store => store.put(doseEvent));
+}
+
+async function flushDoseEvents() {
+    let applied = 0;
+    while (true) {
+        const queued = await storeRequest('readonly', store => store.getAll(null, MAX_BATCH));
+        if (!queued || queued.length === 0) {
+            break;
+        }
+        const response = await fetch(BATCH_URL, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ events: queued })
+        });
+        if (!response.ok) {
+            // Offline again, logged out or a concurrent retry: keep everything for the next flush
+            break;
+        }
+        const data = await response.json();
+        applied += data.results.filter(r => r.result === 'applied').length;
+        // Every event got a definitive answer (applied, duplicate or error)
+        await storeRequest('readwrite', store => { queued.forEach(e => store.delete(e.key)); });
+    }
+    if (applied > 0) {
+        const windows = await clients.matchAll({ type: 'window', includeUncontrolled: true });
+        windows.forEach(client => client.postMessage({ type: 'dose-events-flushed', applied: applied }));
+    }
+}
+
+// Apply one /api/sync/ response in a single IndexedDB transaction, cursor included,
+// so an interrupted sync never leaves the copy ahead of or behind its cursor
+function applySyncResponse(db, data) {
+    return new Promise((resolve, reject) => {
+        const tx = db.transaction([MEDICATIONS_STORE, DOSE_LOGS_STORE, META_STORE], 'readwrite');
+        const meds = tx.objectStore(MEDICATIONS_STORE);
+        const logs = tx.objectStore(DOSE_LOGS_STORE);
+        if (data.reset) {
+            meds.clear();
+            logs.clear();
+        }
+        data.medications.forEach(m => meds.put(m));
+        data.dose_logs.forEach(d => logs.put(d));
+        data.deleted.medications.forEach(id => meds.delete(id));
+        data.deleted.dose_logs.forEach(id => logs.delete(id));
+        tx.objectStore(META_STORE).put(data.cursor, 'sync-cursor');
+        tx.oncomplete = () => resolve();
+        tx.onerror = () => reject(tx.error);
+    });
+}
+
+async function syncState() {
+    const db = await openOfflineDb();
+    let changed = false;
+    while (true) {
+        const cursor = await storeRequest('readonly', store => store.get('sync-cursor'), META_STORE) || 0;
+        const response = await fetch(`${SYNC_URL}?since=${cursor}`, { credentials: 'same-origin' });
+        if (!response.ok) {
+            break;
+        }
+        const data = await response.json();
+        await applySyncResponse(db, data);
+        changed = changed || data.reset || data.medications.length > 0 || data.dose_logs.length > 0
+            || data.deleted.medications.length > 0 || data.deleted.dose_logs.length > 0;
+        if (!data.more) {
+            break;
+        }
+    }
+    return changed;
+}
+
+self.addEventListener('message', event => {
+    if (event.data && event.data.type === 'queue-dose-event') {
+        event.waitUntil(
+            queueDoseEvent(event.data.event).then(() => {
+                // Background Sync flushes as soon as connectivity returns; elsewhere the page asks
+                if (self.registration.sync) {
+                    return self.registration.sync.register('flush-dose-events');
+                }
+            })
+        );
+    } else if (event.data && event.data.type === 'flush-dose-events') {
+        // Send queued taps first so the delta that follows already includes them
+        event.waitUntil(flushDoseEvents().catch(() => {}).then(() => syncState()).catch(() => {}));
+    }
+});
+
+self.addEventListener('sync', event => {
+    if (event.tag === 'flush-dose-events') {
+        event.waitUntil(flushDoseEvents());
+    }
+});
@@ -0,0 +1,86 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .models import ChangeLog, DoseLog, Medication
+
+
+def serialize_medication(med):
+    return {
+        'id': med.id,
+        'pill_name': med.pill_name,
+        'dosage': med.dosage,
+        'frequency': med.frequency,
+        'times_per_day': med.times_per_day,
+        'times': med.times,
+    }
+
+
+def serialize_dose_log(log):
+    return {
+        'id': log.id,
+        'med_id': log.medication_id,
+        'scheduled_time': timezone.localtime(log.scheduled_time).isoformat(),
+        'status': log.status,
+        'taken_time': timezone.localtime(log.timestamp).isoformat() if log.status == 'taken' else None,
+    }
+
+
+def snapshot(user):
+    """Every medication plus the last SYNC_SNAPSHOT_DAYS of dose logs, with the cursor to resume from."""
+    # Read the cursor first so changes made while reading are replayed, not lost
+    cursor = ChangeLog.objects.aggregate(last=Max('id'))['last'] or 0
+    since = timezone.now() - timedelta(days=settings.SYNC_SNAPSHOT_DAYS)
+    return {
+        'reset': True,
+        'cursor': cursor,
+        'more': False,
+        'medications': [serialize_medication(m) for m in Medication.objects.filter(user=user)],
+        'dose_logs': [
+            serialize_dose_log(log)
+            for log in DoseLog.objects.filter(user=user, scheduled_time__gte=since).order_by('scheduled_time')
+        ],
+        'deleted': {'medications': [], 'dose_logs': []},
+    }
+
+
+def delta(user, since, limit=None):
+    """
+    Medication and DoseLog rows changed after the `since` cursor, as current state
+    or tombstones. Falls back to a snapshot when the cursor is older than the
+    retained ChangeLog.
+    """
+    limit = limit or settings.SYNC_PAGE_SIZE
+    if since <= 0:
+        return snapshot(user)
+    oldest = ChangeLog.objects.aggregate(first=Min('id'))['first']
+    if oldest is not None and since < oldest - 1:
+        return snapshot(user)
+
+    changes = list(
+        ChangeLog.objects.filter(user_id=user.id, id__gt=since)
+        .order_by('id')
+        .values_list('id', 'model_name', 'object_id')[:limit]
+    )
+    # Several changes to one row collapse into its current state
+    changed = {'medication': set(), 'doselog': set()}
+    for _, model_name, object_id in changes:
+        if model_name in changed:
+            changed[model_name].add(object_id)
+
+    meds = Medication.objects.filter(user=user, id__in=changed['medication']).in_bulk()
+    logs = DoseLog.objects.filter(user=user, id__in=changed['doselog']).in_bulk()
+    return {
+        'reset': False,
+        'cursor': changes[-1][0] if changes else since,
+        'more': len(changes) == limit,
+        'medications': [serialize_medication(m) for m in meds.values()],
+        'dose_logs': [serialize_dose_log(log) for log in logs.values()],
+        # A row that no longer exists is a tombstone, whatever its last change said
+        'deleted': {
+            'medications': sorted(changed['medication'] - set(meds)),
+            'dose_logs': sorted(changed['doselog'] - set(logs)),
+        },
+    }
@@ -1,3 +1,1050 @@
-from django.test import TestCase
+import gzip
+import importlib
+import json
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from cryptography.hazmat.primitives.asymmetric import ec
+from py_vapid import Vapid, b64urlencode
+from pywebpush import WebPushException
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models.signals import post_delete
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import metrics, views
+from .dose_batch import purge_dose_event_keys
+from .events import get_hub
+from .fire_queue import NextFireQueue
+from .leases import acquire_leases, claim_notifications, purge_notification_log
+from .models import (
+    ChangeLog, DailyAdherence, DoseEventKey, DoseLog, Medication, MedicationSchedule, MetricSnapshot, MissRiskScore,
+    NotificationLog, NotificationOutbox, PushSubscription, SchedulerCursor, WorkerHeartbeat, WorkerLease
+)
+from .notifications import VAPID_TOKEN_LIFETIME, send_web_push, vapid_headers
+from .outbox import deliver_batch, enqueue_pushes
+from .scheduler import due_minutes, process_minutes, reminder_payload
+from .utils.adherence import rebuild_daily_adherence, streak_and_weekly_adherence
+from .utils.batch_features import FEATURE_COLUMNS, extract_features_batch
+from .utils.dose_slots import (
+    materialize_day_slots, materialize_dose_slots, scheduled_slot, sweep_missed_doses, upcoming_days
+)
+from .utils.feature_extractor import extract_features
+from .utils.linear_inference import LinearModel
+from .utils.miss_risk import score_shard
+from .utils.model_loader import LEGACY_VERSION, ModelRegistry, get_adherence_model, get_registry, warm_up
+from .utils.schedule_index import schedule_entries_due
+from .utils.training import iter_training_chunks
+
+
+class ScheduleIndexTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='patient', password='secret')
+        self.med = Medication.objects.create(
+            user=self.user, pill_name='Aspirin', dosage=100, times=['08:00', '8:00', '20:00', 'soon']
+        )
+
+    def index(self):
+        return sorted(MedicationSchedule.objects.filter(medication=self.med).values_list('time', flat=True))
+
+    def test_index_follows_medication_saves(self):
+        self.assertEqual(self.index(), ['08:00', '20:00'])
+
+        self.med.times = ['08:00', '13:30']
+        self.med.save()
+        self.assertEqual(self.index(), ['08:00', '13:30'])
+
+        # Saves that cannot touch times skip the sync
+        self.med.times = ['23:00']
+        self.med.save(update_fields=['pill_name'])
+        self.assertEqual(self.index(), ['08:00', '13:30'])
+
+        self.med.delete()
+        self.assertFalse(MedicationSchedule.objects.exists())
+
+    def test_entries_due_is_sharded_by_user(self):
+        other = User.objects.create_user(username='other', password='secret')
+        Medication.objects.create(user=other, pill_name='Zinc', dosage=50, times=['08:00'])
+        Medication.objects.create(user=None, pill_name='Orphan', dosage=50, times=['08:00'])
+
+        with self.assertNumQueries(1):
+            due = {entry.medication.user.username for entry in schedule_entries_due(['08:00', '13:30'])}
+        self.assertEqual(due, {'patient', 'other'})
+
+        shards = [
+            {entry.medication.user_id for entry in schedule_entries_due(['08:00'], shard, 2)}
+            for shard in range(2)
+        ]
+        self.assertEqual(shards[self.user.id % 2], {self.user.id})
+        self.assertEqual(shards[other.id % 2], {other.id})
+
+
+class SendWebPushTests(TestCase):
+    def test_results_keep_push_order_and_fall_back_to_the_next_subscription(self):
+        def send_one(subscription_info, message, timeout):
+            endpoint = subscription_info['endpoint']
+            if endpoint.endswith('/slow'):
+                time.sleep(0.05)
+            if endpoint.endswith('/gone'):
+                raise WebPushException('Push failed: 410 Gone')
+
+        pushes = [
+            ([{'endpoint': 'https://push.example/slow'}], 'first'),
+            ([{'endpoint': 'https://push.example/gone'}, {'endpoint': 'https://push.example/phone'}], 'second'),
+            ([{'endpoint': 'https://push.example/gone'}], 'third'),
+        ]
+        with mock.patch('medicines.notifications._send_one', side_effect=send_one) as sent:
+            results = send_web_push(pushes, max_workers=3)
+
+        self.assertEqual(sent.call_count, 4)
+        self.assertEqual(
+            [(r.sent, r.endpoint) for r in results],
+            [(True, 'https://push.example/slow'), (True, 'https://push.example/phone'),
+             (False, 'https://push.example/gone')]
+        )
+        self.assertIsInstance(results[2].error, WebPushException)
+        self.assertEqual(send_web_push([]), [])
+
+
+class MaterializeDoseSlotsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='patient', password='secret')
+        self.today = timezone.localdate()
+
+    def slots_for(self, count):
+        meds = [
+            Medication.objects.create(user=self.user, pill_name=f'Pill {i}', dosage=100, times=['08:00'])
+            for i in range(count)
+        ]
+        return [(med, scheduled_slot(self.today, '08:00')) for med in meds]
+
+    def test_query_count_does_not_grow_with_the_number_of_slots(self):
+        counts = []
+        for size in (2, 20):
+            slots = self.slots_for(size)
+            with CaptureQueriesContext(connection) as queries:
+                logs = materialize_dose_slots(slots)
+            self.assertEqual(len(logs), size)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_existing_slots_are_reused(self):
+        slots = self.slots_for(3)
+        first = materialize_dose_slots(slots[:2])
+        again = materialize_dose_slots(slots)
+
+        self.assertEqual(DoseLog.objects.count(), 3)
+        for key, log in first.items():
+            self.assertEqual(again[key].id, log.id)
+
+        # Only the slot that was missing is announced
+        changes = ChangeLog.objects.filter(model_name='doselog')
+        self.assertEqual(sorted(changes.values_list('object_id', flat=True)), sorted(log.id for log in again.values()))
+
+        with self.assertNumQueries(1):  # every slot exists: no writes, no change rows
+            materialize_dose_slots(slots)
+        self.assertEqual(changes.count(), 3)
+
+
+class SchedulerTickTests(TestCase):
+    def test_due_minutes_catches_up_from_the_cursor(self):
+        now = timezone.now().replace(hour=8, minute=30, second=42)
+        cursor = SchedulerCursor(name='test')
+        self.assertEqual(due_minutes(cursor, now), [now.replace(second=0, microsecond=0)])
+
+        cursor.last_processed_minute = now - timedelta(minutes=3)
+        minutes = due_minutes(cursor, now)
+        self.assertEqual([m.minute for m in minutes], [28, 29, 30])
+        self.assertTrue(all(m.second == 0 and m.microsecond == 0 for m in minutes))
+
+        cursor.last_processed_minute = now.replace(second=0, microsecond=0)
+        self.assertEqual(due_minutes(cursor, now), [])
+
+    @override_settings(SCHEDULER_MAX_CATCHUP_MINUTES=5)
+    def test_long_outages_are_capped(self):
+        now = timezone.now().replace(hour=8, minute=30, second=0, microsecond=0)
+        cursor = SchedulerCursor(name='test', last_processed_minute=now - timedelta(days=2))
+        minutes = due_minutes(cursor, now)
+        self.assertEqual(len(minutes), 5)
+        self.assertEqual(minutes[-1], now)
+
+    def test_metrics_of_other_processes_are_served_from_their_snapshots(self):
+        metrics.incr('scheduler.minutes_processed', 3)
+        self.assertTrue(metrics.flush('run_medication_check@test', force=True))
+        self.assertFalse(metrics.flush('run_medication_check@test'))  # within METRICS_FLUSH_INTERVAL
+        # The throttle is per source: another source of the same process still writes
+        self.assertTrue(metrics.flush('run_notification_delivery@test'))
+        MetricSnapshot.objects.filter(source='run_notification_delivery@test').delete()
+
+        User.objects.create_user(username='admin', password='secret', is_staff=True)
+        self.client.login(username='admin', password='secret')
+        processes = self.client.get(reverse('metrics')).json()['processes']
+        self.assertEqual([p['source'] for p in processes], ['run_medication_check@test'])
+        self.assertGreaterEqual(processes[0]['counters']['scheduler.minutes_processed'], 3)
+
+        MetricSnapshot.objects.update(updated_at=timezone.now() - timedelta(days=3))
+        self.assertEqual(metrics.purge_snapshots(), 1)
+
+
+class ReminderCoalescingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='patient', password='secret')
+        self.minute = scheduled_slot(timezone.localdate(), '08:00')
+
+    def test_payload_lists_every_dose(self):
+        aspirin = Medication(pill_name='Aspirin', dosage=100)
+        zinc = Medication(pill_name='Zinc', dosage=50)
+
+        single = json.loads(reminder_payload([(aspirin, self.minute)]))
+        self.assertEqual(single['body'], 'Time to take Aspirin (100 mg)')
+
+        both = json.loads(reminder_payload([(aspirin, self.minute), (zinc, self.minute)]))
+        self.assertEqual(both['body'], 'Time to take 2 medicines: Aspirin (100 mg), Zinc (50 mg)')
+        self.assertEqual([d['pill_name'] for d in both['data']['doses']], ['Aspirin', 'Zinc'])
+        self.assertEqual({d['time'] for d in both['data']['doses']}, {'08:00'})
+
+    def test_one_push_per_subscription_for_all_doses_due(self):
+        for name in ('Aspirin', 'Zinc'):
+            Medication.objects.create(user=self.user, pill_name=name, dosage=100, times=['08:00'])
+        for device in ('phone', 'laptop'):
+            PushSubscription.objects.create(
+                user=self.user, endpoint=f'https://push.example/{device}', p256dh='key', auth='auth'
+            )
+
+        queued = process_minutes([self.minute], log=lambda message: None, worker_id='a')
+
+        self.assertEqual(queued, 2)
+        payloads = [json.loads(p) for p in NotificationOutbox.objects.values_list('payload', flat=True)]
+        for payload in payloads:
+            self.assertEqual(sorted(d['pill_name'] for d in payload['data']['doses']), ['Aspirin', 'Zinc'])
+
+
+class NextFireQueueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='patient', password='secret')
+        self.med = Medication.objects.create(user=self.user, pill_name='Aspirin', dosage=100, times=['08:00'])
+        self.today = timezone.localdate()
+
+    def at(self, t_str, days=0):
+        return scheduled_slot(self.today + timedelta(days=days), t_str)
+
+    def test_edits_invalidate_older_entries(self):
+        queue = NextFireQueue()
+        queue.load(self.at('07:00'))
+        self.assertEqual(queue.next_fire_at(), self.at('08:00'))
+
+        self.med.times = ['09:00']
+        self.med.save()
+        self.assertEqual(queue.apply_changes(self.at('07:00')), 1)
+        # The 08:00 entry is still in the heap but belongs to an older generation
+        self.assertEqual(queue.next_fire_at(), self.at('09:00'))
+        self.assertEqual(queue.pop_due(self.at('08:30')), [])
+        self.assertEqual(queue.pop_due(self.at('09:00')), [(self.at('09:00'), self.med.id)])
+        self.assertEqual(queue.next_fire_at(), self.at('09:00', days=1))
+
+        self.med.delete()
+        queue.apply_changes(self.at('10:00'))
+        self.assertIsNone(queue.next_fire_at())
+
+    def test_time_added_between_polls_fires_at_once(self):
+        queue = NextFireQueue()
+        queue.load(self.at('07:00'))
+
+        self.med.times = ['07:30']
+        self.med.save()
+        # Polled only after 07:30 had passed: due now, not tomorrow
+        queue.apply_changes(self.at('07:45'))
+        self.assertEqual(queue.pop_due(self.at('07:45')), [(self.at('07:30'), self.med.id)])
+
+
+class WorkerLeaseTests(TestCase):
+    def test_shards_are_shared_fairly_and_taken_over_from_dead_workers(self):
+        self.assertEqual(acquire_leases('a', 4), [0, 1, 2, 3])
+
+        # A second worker waits until the first hands back what exceeds its share
+        self.assertEqual(acquire_leases('b', 4), [])
+        self.assertEqual(acquire_leases('a', 4), [0, 1])
+        self.assertEqual(acquire_leases('b', 4), [2, 3])
+
+        # 'a' stops heartbeating: once its leases expire 'b' takes everything over
+        past = timezone.now() - timedelta(seconds=settings.SCHEDULER_LEASE_TTL + 1)
+        WorkerHeartbeat.objects.filter(worker='a').update(heartbeat_at=past)
+        WorkerLease.objects.filter(owner='a').update(expires_at=past)
+        self.assertEqual(acquire_leases('b', 4), [0, 1, 2, 3])
+
+    def test_each_slot_is_claimed_by_one_worker_only(self):
+        user = User.objects.create_user(username='patient', password='secret')
+        med = Medication.objects.create(user=user, pill_name='Aspirin', dosage=100, times=['08:00'])
+        due = [(med, scheduled_slot(timezone.localdate(), '08:00'))]
+
+        self.assertEqual(claim_notifications(due, 'a'), due)
+        self.assertEqual(claim_notifications(due, 'b'), [])
+        self.assertEqual(NotificationLog.objects.get().worker, 'a')
+
+        NotificationLog.objects.update(sent_date=timezone.localdate() - timedelta(days=30))
+        self.assertEqual(purge_notification_log(7), 1)
+
+    def test_claims_roll_back_when_queueing_fails(self):
+        user = User.objects.create_user(username='patient', password='secret')
+        Medication.objects.create(user=user, pill_name='Aspirin', dosage=100, times=['08:00'])
+        minute = scheduled_slot(timezone.localdate(), '08:00')
+
+        with mock.patch('medicines.scheduler.enqueue_pushes', side_effect=RuntimeError('database gone')):
+            with self.assertRaises(RuntimeError):
+                process_minutes([minute], log=lambda message: None, worker_id='a')
+        # Unclaimed, so the next attempt (by any worker) can still send it
+        self.assertFalse(NotificationLog.objects.exists())
+        self.assertEqual(DoseLog.objects.count(), 1)
+
+
+class VapidHeaderTests(TestCase):
+    def setUp(self):
+        self.vapid = Vapid(private_key=ec.generate_private_key(ec.SECP256R1()))
+        self.key = b64urlencode(self.vapid.private_key.private_numbers().private_value.to_bytes(32, 'big'))
+
+    def headers_at(self, now, endpoint='https://fcm.googleapis.com/fcm/send/abc'):
+        with mock.patch('medicines.notifications.time.time', return_value=now):
+            return vapid_headers(endpoint)
+
+    @override_settings(VAPID_HEADER_REFRESH_MARGIN=3600)
+    def test_headers_are_cached_per_audience_until_close_to_expiry(self):
+        now = time.time()
+        with self.settings(VAPID_PRIVATE_KEY=self.key):
+            first = self.headers_at(now)
+            self.assertIn('Authorization', first)
+            self.assertIs(self.headers_at(now + 60, 'https://fcm.googleapis.com/fcm/send/other'), first)
+            self.assertIsNot(self.headers_at(now + 60, 'https://updates.push.services.mozilla.com/wpush/v2/x'), first)
+
+            # Re-signed once less than the refresh margin is left
+            self.assertIs(self.headers_at(now + VAPID_TOKEN_LIFETIME - 3700), first)
+            self.assertIsNot(self.headers_at(now + VAPID_TOKEN_LIFETIME - 3500), first)
+
+    def test_private_key_may_be_a_pem_file(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = f'{root}/vapid_private.pem'
+            self.vapid.save_key(path)
+            with self.settings(VAPID_PRIVATE_KEY=path):
+                self.assertIn('Authorization', vapid_headers('https://fcm.googleapis.com/fcm/send/abc'))
+
+
+@override_settings(OUTBOX_MAX_ATTEMPTS=2, OUTBOX_BACKOFF_BASE=30)
+class OutboxDeliveryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='patient', password='secret')
+
+    def subscribe(self, name):
+        return PushSubscription.objects.create(
+            user=self.user, endpoint=f'https://push.example/{name}', p256dh='key', auth='auth'
+        )
+
+    def deliver(self, send_one):
+        NotificationOutbox.objects.update(next_attempt_at=timezone.now())
+        with mock.patch('medicines.notifications._send_one', side_effect=send_one):
+            return deliver_batch('worker')
+
+    def test_retries_backoff_pruning_and_broken_keys(self):
+        def send_one(subscription_info, message, timeout):
+            name = subscription_info['endpoint'].rsplit('/', 1)[1]
+            if name == 'flaky':
+                raise WebPushException('Push failed: 503', response=mock.Mock(status_code=503))
+            if name == 'gone':
+                raise WebPushException('Push failed: 410', response=mock.Mock(status_code=410))
+            if name == 'bad-key':
+                raise ValueError('Invalid EC key')
+
+        subs = {name: self.subscribe(name) for name in ('ok', 'flaky', 'gone', 'bad-key')}
+        enqueue_pushes([(sub, '{}') for sub in subs.values()] + [(subs['gone'], '{"second": true}')])
+
+        before = timezone.now()
+        self.assertEqual(self.deliver(send_one), 5)
+
+        def row(name):
+            return NotificationOutbox.objects.filter(subscription=subs[name]).first()
+
+        self.assertEqual(row('ok').status, 'sent')
+        # A key that cannot be parsed is an ordinary failed attempt, not a crash of the batch
+        for name in ('flaky', 'bad-key'):
+            self.assertEqual((row(name).status, row(name).attempts), ('pending', 1))
+            self.assertGreaterEqual(row(name).next_attempt_at - before, timedelta(seconds=30))
+        self.assertIn('Invalid EC key', row('bad-key').last_error)
+
+        # 410: the subscription is pruned with everything still queued for it
+        subs['gone'].refresh_from_db()
+        self.assertFalse(subs['gone'].is_active)
+        self.assertEqual(
+            set(NotificationOutbox.objects.filter(subscription=subs['gone']).values_list('status', flat=True)),
+            {'failed'}
+        )
+
+        # Second failure reaches OUTBOX_MAX_ATTEMPTS
+        self.assertEqual(self.deliver(send_one), 2)
+        self.assertEqual((row('flaky').status, row('flaky').attempts), ('failed', 2))
+        self.assertEqual(NotificationOutbox.objects.filter(status='pending').count(), 0)
+
+
+class SweepMissedDosesTests(TestCase):
+    def test_overdue_doses_are_marked_missed_in_batches(self):
+        user = User.objects.create_user(username='patient', password='secret')
+        med = Medication.objects.create(user=user, pill_name='Aspirin', dosage=100, times=['08:00'])
+        now = timezone.now()
+        for hours_ago in range(1, 6):
+            DoseLog.objects.create(user=user, medication=med, scheduled_time=now - timedelta(hours=hours_ago),
+                                   status='pending')
+        taken = DoseLog.objects.create(user=user, medication=med, scheduled_time=now - timedelta(hours=6),
+                                       status='taken')
+        upcoming = DoseLog.objects.create(user=user, medication=med, scheduled_time=now + timedelta(hours=1),
+                                          status='pending')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(sweep_missed_doses(grace_minutes=0, batch_size=2), 5)
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "medicines_doselog"')]
+        self.assertEqual(len(updates), 3)
+
+        self.assertEqual(DoseLog.objects.filter(status='missed').count(), 5)
+        taken.refresh_from_db()
+        upcoming.refresh_from_db()
+        self.assertEqual((taken.status, upcoming.status), ('taken', 'pending'))
+        self.assertEqual(sweep_missed_doses(grace_minutes=0, batch_size=2), 0)
+
+    def test_dashboard_reads_slots_created_ahead_of_the_day(self):
+        user = User.objects.create_user(username='patient', password='secret')
+        Medication.objects.create(user=user, pill_name='Aspirin', dosage=100, times=['08:00'])
+        self.client.login(username='patient', password='secret')
+
+        # Before the sweeper has run the dose is shown without writing anything
+        dose = self.client.get(reverse('dashboard_data')).json()['dose_data'][0]
+        self.assertEqual((dose['status'], dose['dose_log_id']), ('pending', None))
+        self.assertFalse(DoseLog.objects.exists())
+        self.assertFalse(ChangeLog.objects.filter(model_name='doselog').exists())
+
+        call_command('sweep_missed_doses', stdout=StringIO())
+        today, tomorrow = upcoming_days()
+        self.assertEqual(
+            sorted(DoseLog.objects.values_list('scheduled_time', flat=True)),
+            [scheduled_slot(today, '08:00'), scheduled_slot(tomorrow, '08:00')]
+        )
+        # Already there: nothing is written again
+        self.assertEqual(materialize_day_slots([today, tomorrow]), 2)
+        self.assertEqual(ChangeLog.objects.filter(model_name='doselog').count(), 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            dose = self.client.get(reverse('dashboard_data')).json()['dose_data'][0]
+        self.assertEqual(dose['dose_log_id'], DoseLog.objects.get(scheduled_time=scheduled_slot(today, '08:00')).id)
+        self.assertFalse([q for q in queries if not q['sql'].startswith('SELECT')])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class DashboardAdherenceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='patient', password='secret')
+        self.med = Medication.objects.create(
+            user=self.user, pill_name='Aspirin', dosage=100, times=['08:00', '20:00']
+        )
+        self.today = date.today()
+
+    def log_day(self, days_ago, taken):
+        day = self.today - timedelta(days=days_ago)
+        for i, t_str in enumerate(self.med.times):
+            DoseLog.objects.create(
+                user=self.user,
+                medication=self.med,
+                scheduled_time=scheduled_slot(day, t_str),
+                status='taken' if i < taken else 'missed'
+            )
+
+    def test_streak_and_weekly_adherence(self):
+        for days_ago in range(3):
+            self.log_day(days_ago, taken=2)
+        self.log_day(3, taken=1)
+        self.log_day(4, taken=2)
+
+        with self.assertNumQueries(1):
+            streak, weekly = streak_and_weekly_adherence(self.user, self.today)
+
+        self.assertEqual(streak, 3)
+        self.assertEqual(weekly, [0, 0, 100.0, 50.0, 100.0, 100.0, 100.0])
+
+    def test_dashboard_query_count_does_not_grow_with_history(self):
+        self.client.login(username='patient', password='secret')
+        # The scheduler creates today's slots ahead of the day
+        materialize_day_slots([self.today])
+        self.client.get(reverse('dashboard'))
+
+        # Includes one data version read, shared by the cache key and the page's ETag
+        with self.assertNumQueries(6):
+            self.client.get(reverse('dashboard'))
+
+        for days_ago in range(1, 30):
+            self.log_day(days_ago, taken=2)
+
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['streak'], 0)
+        self.assertEqual(response.context['weekly_adherence_json'], '[100.0, 100.0, 100.0, 100.0, 100.0, 100.0, 0.0]')
+
+    def test_rollup_follows_every_write_path(self):
+        yesterday = self.today - timedelta(days=1)
+        slots = materialize_dose_slots(
+            [(self.med, scheduled_slot(yesterday, t_str)) for t_str in self.med.times]
+        )
+        dose = slots[(self.med.id, scheduled_slot(yesterday, '08:00'))]
+        dose.status = 'taken'
+        dose.save()
+        sweep_missed_doses(grace_minutes=0)
+
+        def snapshot():
+            return sorted(DailyAdherence.objects.values_list('date', 'expected', 'taken', 'missed'))
+
+        self.assertEqual(snapshot(), [(yesterday, 2, 1, 1)])
+        incremental = snapshot()
+        rebuild_daily_adherence([self.user.id])
+        self.assertEqual(snapshot(), incremental)
+
+
+    def test_medication_delete_handles_its_dose_logs_in_bulk(self):
+        other = Medication.objects.create(user=self.user, pill_name='Zinc', dosage=50, times=['08:00'])
+        for days_ago in range(1, 61):
+            self.log_day(days_ago, taken=1)
+        DoseLog.objects.create(
+            user=self.user, medication=other, status='taken',
+            scheduled_time=scheduled_slot(self.today - timedelta(days=1), '08:00')
+        )
+        log_ids = set(DoseLog.objects.filter(medication=self.med).values_list('id', flat=True))
+
+        # Was about five queries per DoseLog through the per-row receivers
+        with CaptureQueriesContext(connection) as queries:
+            self.med.delete()
+        self.assertLess(len(queries), 30)
+
+        tombstones = ChangeLog.objects.filter(model_name='doselog', deleted=True)
+        self.assertEqual(set(tombstones.values_list('object_id', flat=True)), log_ids)
+        yesterday = DailyAdherence.objects.get(user=self.user, date=self.today - timedelta(days=1))
+        self.assertEqual((yesterday.expected, yesterday.taken), (1, 1))
+        self.assertFalse(DailyAdherence.objects.filter(expected__gt=0, date__lt=yesterday.date).exists())
+
+        # Single-row deletes still go through the receivers
+        other.logs.get().delete()
+        yesterday.refresh_from_db()
+        self.assertEqual(yesterday.expected, 0)
+
+        self.user.delete()
+        self.assertFalse(DailyAdherence.objects.exists())
+
+    def test_failed_deletes_leave_later_writes_alone(self):
+        self.log_day(1, taken=1)
+
+        def fail(sender, **kwargs):
+            raise IntegrityError("forced")
+
+        post_delete.connect(fail, sender=DoseLog, dispatch_uid='fail-doselog-delete')
+        self.addCleanup(post_delete.disconnect, sender=DoseLog, dispatch_uid='fail-doselog-delete')
+        for obj in (self.med, self.user):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                obj.delete()
+        post_delete.disconnect(sender=DoseLog, dispatch_uid='fail-doselog-delete')
+
+        # Both deletes rolled back; the next write still reaches the rollup and ChangeLog
+        missed = DoseLog.objects.get(medication=self.med, status='missed')
+        missed.status = 'taken'
+        missed.save()
+        yesterday = DailyAdherence.objects.get(user=self.user, date=self.today - timedelta(days=1))
+        self.assertEqual((yesterday.expected, yesterday.taken), (2, 2))
+        log_id = missed.pk
+        missed.delete()
+        yesterday.refresh_from_db()
+        self.assertEqual((yesterday.expected, yesterday.taken), (1, 1))
+        self.assertTrue(ChangeLog.objects.filter(model_name='doselog', object_id=log_id, deleted=True).exists())
+
+
+class UserCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='patient', password='secret')
+        self.med = Medication.objects.create(
+            user=self.user, pill_name='Aspirin', dosage=100, times=['08:00', '20:00']
+        )
+        # The scheduler creates today's slots ahead of the day
+        materialize_day_slots(upcoming_days()[:1])
+        self.client.login(username='patient', password='secret')
+
+    def test_dashboard_data_is_served_from_cache_until_a_write(self):
+        # Reading never moves the version: the first load is cached
+        self.client.get(reverse('dashboard_data'))
+
+        with self.assertNumQueries(3):  # session, user and the data version (ETag and cache key)
+            response = self.client.get(reverse('dashboard_data'))
+        self.assertEqual(response.json()['pending_count'], 2)
+
+        dose_log_id = response.json()['dose_data'][0]['dose_log_id']
+        self.client.post(
+            reverse('toggle_dose_status'),
+            {'dose_log_id': dose_log_id, 'status': 'taken'},
+            content_type='application/json'
+        )
+
+        response = self.client.get(reverse('dashboard_data'))
+        self.assertEqual(response.json()['taken_count'], 1)
+        self.assertEqual(response.json()['pending_count'], 1)
+
+    def test_writes_from_other_processes_change_the_etag(self):
+        response = self.client.get(reverse('dashboard_data'))
+        etag = response['ETag']
+
+        # The sweeper runs in the scheduler process and never touches this process's cache;
+        # a negative grace period makes all of today's doses overdue
+        self.assertEqual(sweep_missed_doses(grace_minutes=-24 * 60), 2)
+
+        response = self.client.get(reverse('dashboard_data'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['missed_count'], 2)
+
+    def test_page_etag_is_never_newer_than_its_data(self):
+        build = views._build_today_dashboard
+
+        def build_then_write(user, today):
+            payload = build(user, today)
+            # Another request marks a dose while this page is still being rendered
+            DoseLog.objects.filter(medication=self.med).first().save()
+            return payload
+
+        with mock.patch.object(views, '_build_today_dashboard', build_then_write):
+            etag = self.client.get(reverse('dashboard')).context['dashboard_data_etag']
+        response = self.client.get(reverse('dashboard_data'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_unchanged_poll_is_answered_with_304(self):
+        for name in ('dashboard_data', 'today_dose_logs'):
+            response = self.client.get(reverse(name))
+            etag = response['ETag']
+            self.assertIn('no-cache', response['Cache-Control'])
+
+            with self.assertNumQueries(3):  # session, user and the data version
+                response = self.client.get(reverse(name), HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+            self.med.save()
+            response = self.client.get(reverse(name), HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+
+@override_settings(SSE_HEARTBEAT_SECONDS=0.1)
+class DoseEventsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='patient', password='secret')
+
+    def test_event_stream_requires_asgi(self):
+        self.client.login(username='patient', password='secret')
+        self.assertEqual(self.client.get(reverse('dose_events')).status_code, 503)
+
+    async def test_published_status_reaches_the_stream(self):
+        await self.async_client.alogin(username='patient', password='secret')
+        response = await self.async_client.get(reverse('dose_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        events = aiter(response.streaming_content)
+        self.assertEqual(await anext(events), b'retry: 5000\n\n')
+        get_hub().publish(self.user.id, 'dose-status', {'dose_log_id': 7, 'status': 'taken'})
+        self.assertEqual(
+            await anext(events),
+            b'event: dose-status\ndata: {"dose_log_id": 7, "status": "taken"}\n\n'
+        )
+        self.assertEqual(await anext(events), b': keep-alive\n\n')
+
+
+class DoseHistoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='patient', password='secret')
+        self.med = Medication.objects.create(
+            user=self.user, pill_name='Aspirin', dosage=100, times=['08:00', '20:00']
+        )
+        today = date.today()
+        for days_ago in range(10):
+            for t_str in self.med.times:
+                DoseLog.objects.create(
+                    user=self.user, medication=self.med,
+                    scheduled_time=scheduled_slot(today - timedelta(days=days_ago), t_str),
+                    status='missed' if days_ago % 3 == 0 else 'taken'
+                )
+        self.client.login(username='patient', password='secret')
+
+    def test_pages_cover_history_once_at_constant_cost(self):
+        seen = []
+        cursor = ''
+        while True:
+            with self.assertNumQueries(3):  # session, user, page
+                data = self.client.get(reverse('dose_history'), {'limit': 6, 'cursor': cursor}).json()
+            seen.extend(log['id'] for log in data['dose_logs'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+
+        expected = DoseLog.objects.order_by('-scheduled_time', '-id').values_list('id', flat=True)
+        self.assertEqual(seen, list(expected))
+
+    def test_filters(self):
+        data = self.client.get(reverse('dose_history'), {'status': 'missed'}).json()
+        self.assertEqual(len(data['dose_logs']), 8)
+        self.assertEqual(self.client.get(reverse('dose_history'), {'cursor': 'garbage'}).status_code, 400)
+
+
+class DoseEventsBatchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='patient', password='secret')
+        self.med = Medication.objects.create(
+            user=self.user, pill_name='Aspirin', dosage=100, times=['08:00', '20:00']
+        )
+        self.morning = DoseLog.objects.create(
+            user=self.user, medication=self.med,
+            scheduled_time=scheduled_slot(date.today(), '08:00'), status='pending'
+        )
+        self.client.login(username='patient', password='secret')
+
+    def post(self, events):
+        return self.client.post(reverse('dose_events_batch'), {'events': events}, content_type='application/json')
+
+    def test_retried_batch_is_applied_once(self):
+        events = [
+            {'key': 'a1', 'dose_log_id': self.morning.id, 'status': 'taken'},
+            {'key': 'a2', 'med_id': self.med.id, 'time': '20:00', 'status': 'missed'},
+            {'key': 'a3', 'dose_log_id': 999999, 'status': 'taken'},
+            {'key': 'a4', 'status': 'sleeping'},
+        ]
+        results = self.post(events).json()['results']
+        self.assertEqual([r['result'] for r in results], ['applied', 'applied', 'error', 'error'])
+        self.assertEqual(
+            sorted(DoseLog.objects.values_list('status', flat=True)), ['missed', 'taken']
+        )
+
+        # The user changes their mind in between; replaying the old batch must not undo it
+        self.morning.refresh_from_db()
+        self.morning.status = 'missed'
+        self.morning.save()
+        results = self.post(events[:2]).json()['results']
+        self.assertEqual([r['result'] for r in results], ['duplicate', 'duplicate'])
+        self.morning.refresh_from_db()
+        self.assertEqual(self.morning.status, 'missed')
+
+        rollup = DailyAdherence.objects.get(user=self.user, date=date.today())
+        self.assertEqual((rollup.expected, rollup.taken, rollup.missed), (2, 0, 2))
+
+    @override_settings(DOSE_EVENT_KEY_RETENTION_DAYS=30)
+    def test_old_keys_are_purged(self):
+        self.post([{'key': 'old', 'dose_log_id': self.morning.id, 'status': 'taken'}])
+        self.post([{'key': 'new', 'dose_log_id': self.morning.id, 'status': 'taken'}])
+        DoseEventKey.objects.filter(key='old').update(created_at=timezone.now() - timedelta(days=31))
+
+        self.assertEqual(purge_dose_event_keys(), 1)
+        self.assertEqual(list(DoseEventKey.objects.values_list('key', flat=True)), ['new'])
+
+
+class SyncTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='patient', password='secret')
+        self.med = Medication.objects.create(
+            user=self.user, pill_name='Aspirin', dosage=100, times=['08:00']
+        )
+        self.dose = DoseLog.objects.create(
+            user=self.user, medication=self.med,
+            scheduled_time=scheduled_slot(date.today(), '08:00'), status='pending'
+        )
+        self.client.login(username='patient', password='secret')
+
+    def sync(self, since):
+        return self.client.get(reverse('sync'), {'since': since}).json()
+
+    def test_snapshot_then_deltas_with_tombstones(self):
+        first = self.sync(0)
+        self.assertTrue(first['reset'])
+        self.assertEqual([m['id'] for m in first['medications']], [self.med.id])
+        self.assertEqual([d['id'] for d in first['dose_logs']], [self.dose.id])
+
+        self.assertEqual(self.sync(first['cursor'])['dose_logs'], [])
+
+        self.dose.status = 'taken'
+        self.dose.save()
+        changed = self.sync(first['cursor'])
+        self.assertFalse(changed['reset'])
+        self.assertEqual([(d['id'], d['status']) for d in changed['dose_logs']], [(self.dose.id, 'taken')])
+
+        med_id = self.med.id
+        self.med.delete()
+        gone = self.sync(changed['cursor'])
+        self.assertEqual(gone['deleted'], {'medications': [med_id], 'dose_logs': [self.dose.id]})
+
+
+class ExportTests(TestCase):
+    def test_csv_and_gzipped_ndjson_downloads(self):
+        user = User.objects.create_user(username='patient', password='secret')
+        med = Medication.objects.create(user=user, pill_name='Aspirin, coated', dosage=100, times=['08:00'])
+        for days_ago in range(3):
+            DoseLog.objects.create(
+                user=user, medication=med,
+                scheduled_time=scheduled_slot(date.today() - timedelta(days=days_ago), '08:00'),
+                status='taken'
+            )
+        self.client.login(username='patient', password='secret')
+
+        response = self.client.get(reverse('export_dose_history'))
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['dose_log_id', 'user_id', 'medication_id'])
+        self.assertEqual(len(lines), 4)
+        self.assertIn('"Aspirin, coated"', lines[1])
+
+        response = self.client.get(reverse('export_dose_history'), {'format': 'ndjson', 'gzip': '1'})
+        rows = [json.loads(line) for line in gzip.decompress(b''.join(response.streaming_content)).splitlines()]
+        self.assertEqual([row['status'] for row in rows], ['taken'] * 3)
+
+
+class BatchFeatureTests(TestCase):
+    def test_batch_matches_scalar_extractor(self):
+        now = timezone.now()
+        user = User.objects.create_user(username='patient')
+        other = User.objects.create_user(username='other')
+        meds = [
+            Medication.objects.create(user=user, pill_name='Aspirin', dosage=100, times_per_day=2, times=['08:00']),
+            Medication.objects.create(user=user, pill_name='Statin', dosage=20, times_per_day=1, times=['21:00']),
+            Medication.objects.create(user=other, pill_name='Insulin', dosage=10, times_per_day=3, times=['13:00']),
+            # No logs at all: defaults for every feature
+            Medication.objects.create(user=other, pill_name='Vitamin D', dosage=5, times=['09:00']),
+        ]
+        # Hours away from "now" so both extractors agree on which logs are recent or upcoming;
+        # pending slots and anything scheduled after now must not count as history
+        plans = {
+            meds[0]: [(-200, 'taken'), (-50, 'missed'), (-30, 'taken'), (-20, 'taken'), (-5, 'pending'), (30, 'pending')],
+            meds[1]: [(-300, 'missed'), (-250, 'missed'), (-200, 'taken'), (-2, 'pending'), (20, 'pending'), (44, 'pending')],
+            meds[2]: [(-40, 'taken'), (-30, 'taken'), (-20, 'taken'), (-10, 'missed'), (-9, 'taken'), (3, 'taken')],
+        }
+        for med, plan in plans.items():
+            for hours, status in plan:
+                DoseLog.objects.create(
+                    user=med.user, medication=med, status=status,
+                    scheduled_time=(now + timedelta(hours=hours)).replace(minute=0, second=0, microsecond=0)
+                )
+
+        with self.assertNumQueries(2):
+            frame = extract_features_batch(now=now)
+
+        self.assertEqual(list(frame.columns), FEATURE_COLUMNS)
+        self.assertEqual(len(frame), len(meds))
+        for med in meds:
+            expected = extract_features(med.user, med, now=now)
+            actual = frame.loc[(med.user_id, med.id)].to_dict()
+            self.assertEqual(list(expected), FEATURE_COLUMNS)
+            for column in FEATURE_COLUMNS:
+                self.assertAlmostEqual(actual[column], expected[column], msg=f"{med.pill_name} {column}")
+
+
+class MissRiskScoreTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='patient', password='secret')
+        self.meds = [
+            Medication.objects.create(user=self.user, pill_name='Aspirin', dosage=100, times=['08:00']),
+            Medication.objects.create(user=self.user, pill_name='Statin', dosage=20, times_per_day=3, times=['21:00']),
+        ]
+        now = timezone.now().replace(minute=0, second=0, microsecond=0)
+        for hours in range(1, 6):
+            DoseLog.objects.create(
+                user=self.user, medication=self.meds[1], status='missed',
+                scheduled_time=now - timedelta(hours=24 * hours)
+            )
+
+    def test_command_stores_one_predict_proba_per_medication(self):
+        model = get_adherence_model()
+        call_command('score_miss_risk', stdout=StringIO())
+        call_command('score_miss_risk', '--chunk-size', '1', stdout=StringIO())
+
+        self.assertEqual(MissRiskScore.objects.count(), 2)
+        for med in self.meds:
+            features = pd.DataFrame([extract_features(self.user, med)])[model.feature_names_in_]
+            expected = model.predict_proba(features)[0][list(model.classes_).index(1)]
+            self.assertAlmostEqual(MissRiskScore.objects.get(pk=med.id).probability, expected)
+
+    def test_each_worker_flushes_its_own_metrics(self):
+        # A forked worker inherits the parent's flush deadlines; its chunks still reach the database
+        shard = self.user.id % 2
+        source = f'score_miss_risk@shard-{shard}-of-2'
+        metrics.flush(source)
+        self.assertEqual(score_shard(shard, 2, chunk_size=1), 2)
+        snapshot = MetricSnapshot.objects.get(source=source)
+        self.assertEqual(snapshot.counters['miss_risk.scored'], metrics.snapshot()['counters']['miss_risk.scored'])
+
+    def test_dashboard_flags_high_risk_doses(self):
+        MissRiskScore.objects.create(
+            medication=self.meds[1], user=self.user, probability=0.9, scored_at=timezone.now()
+        )
+        self.client.login(username='patient', password='secret')
+        dose_data = self.client.get(reverse('dashboard_data')).json()['dose_data']
+        flags = {d['pill_name']: (d['miss_risk'], d['high_miss_risk']) for d in dose_data}
+        self.assertEqual(flags, {'Aspirin': (None, False), 'Statin': (0.9, True)})
+
+
+    def test_new_scores_reach_cached_dashboards(self):
+        self.client.login(username='patient', password='secret')
+        self.client.get(reverse('dashboard_data'))
+        cached = self.client.get(reverse('dashboard_data')).json()['dose_data']
+        self.assertEqual({d['miss_risk'] for d in cached}, {None})
+
+        call_command('score_miss_risk', stdout=StringIO())
+        dose_data = self.client.get(reverse('dashboard_data')).json()['dose_data']
+        self.assertNotIn(None, {d['miss_risk'] for d in dose_data})
+
+class ModelRegistryTests(TestCase):
+    def test_publish_and_hot_swap(self):
+        with tempfile.TemporaryDirectory() as root:
+            registry = ModelRegistry(root, check_interval=0)
+            legacy = registry.get()
+            self.assertEqual(legacy.version, LEGACY_VERSION)
+
+            first = registry.publish(legacy.model, legacy.metadata['feature_order'])
+            loaded = registry.get()
+            self.assertEqual(loaded.version, first)
+            self.assertEqual(loaded.metadata['feature_order'], list(legacy.model.feature_names_in_))
+            self.assertIsInstance(loaded.model.coef_, np.memmap)
+
+            second = registry.publish(legacy.model, legacy.metadata['feature_order'], activate=False)
+            self.assertEqual(registry.get().version, first)
+            registry.activate(second)
+            self.assertEqual(registry.get().version, second)
+            self.assertEqual(registry.versions(), [first, second])
+            with self.assertRaises(ValueError):
+                registry.activate('missing')
+
+    @override_settings(MODEL_WARMUP=True)
+    def test_only_server_entry_points_warm_up(self):
+        with mock.patch('medicines.utils.model_loader.threading') as threading:
+            thread = threading.Thread
+            # What every manage.py command runs
+            apps.get_app_config('medicines').ready()
+            thread.assert_not_called()
+
+            sys.modules.pop('crudapp.wsgi', None)
+            importlib.import_module('crudapp.wsgi')
+            thread.assert_called_once()
+            thread.return_value.start.assert_called_once()
+
+            with override_settings(MODEL_WARMUP=False):
+                self.assertIsNone(warm_up())
+            thread.assert_called_once()
+
+
+class LinearInferenceTests(TestCase):
+    def test_matches_sklearn_predict_proba(self):
+        model = get_adherence_model()
+        linear = LinearModel.from_estimator(model)
+        rng = np.random.default_rng(0)
+        frame = pd.DataFrame({
+            'dose_complexity': rng.integers(1, 5, 1000),
+            'past_adherence_rate': rng.random(1000),
+            'lifestyle_routine': rng.integers(0, 2, 1000),
+            **{name: 0 for name in ('Morning', 'Afternoon', 'Evening', 'Night')},
+        })
+        for i, name in enumerate(rng.choice(['Morning', 'Afternoon', 'Evening', 'Night'], 1000)):
+            frame.loc[i, name] = 1
+        expected = model.predict_proba(frame[model.feature_names_in_])[:, list(model.classes_).index(1)]
+
+        matrix = frame[list(linear.feature_order)].to_numpy()
+        batch = linear.miss_probabilities(matrix)
+        np.testing.assert_allclose(batch, expected, rtol=1e-12)
+        # Single rows take feature dicts, whatever their key order
+        for row, p in zip(frame[FEATURE_COLUMNS].to_dict('records')[:50], expected):
+            self.assertAlmostEqual(linear.miss_probability(row), p, places=12)
+
+        with tempfile.TemporaryDirectory() as root:
+            linear.save(f"{root}/linear.npz")
+            loaded = LinearModel.load(f"{root}/linear.npz")
+        self.assertEqual(loaded.feature_order, tuple(model.feature_names_in_))
+        np.testing.assert_array_equal(loaded.miss_probabilities(matrix), batch)
+
+
+class TrainingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='patient')
+        self.meds = [
+            Medication.objects.create(user=self.user, pill_name='Aspirin', dosage=100, times_per_day=2, times=['08:00']),
+            Medication.objects.create(user=self.user, pill_name='Statin', dosage=20, times=['21:00']),
+        ]
+        start = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(days=12)
+        statuses = ['taken', 'missed', 'taken', 'taken', 'missed', 'taken', 'taken']
+        for i in range(40):
+            for n, med in enumerate(self.meds):
+                DoseLog.objects.create(
+                    user=self.user, medication=med, status=statuses[(i + n) % len(statuses)],
+                    scheduled_time=start + timedelta(hours=7 * i + n)
+                )
+
+    def expected_features(self, log):
+        """extract_features as of just before the dose, straight from the ORM."""
+        earlier = DoseLog.objects.filter(medication=log.medication, scheduled_time__lt=log.scheduled_time)
+        total, taken = earlier.count(), earlier.filter(status='taken').count()
+        recent = earlier.filter(scheduled_time__gte=log.scheduled_time - timedelta(days=4))
+        hour = log.scheduled_time.hour
+        return [
+            log.medication.times_per_day,
+            taken / total if total else 1.0,
+            int(recent.exists() and recent.filter(status='taken').count() >= 0.8 * recent.count()),
+            int(5 <= hour < 12), int(12 <= hour < 17), int(17 <= hour < 21), int(hour < 5 or hour >= 21),
+        ]
+
+    def test_streamed_features_are_point_in_time(self):
+        logs = list(DoseLog.objects.select_related('medication').order_by('medication_id', 'scheduled_time'))
+        since = logs[20].scheduled_time
+        for chunk_since, rows in ((None, logs), (since, [log for log in logs if log.scheduled_time >= since])):
+            chunks = list(iter_training_chunks(chunk_since, chunk_size=7))
+            features = np.concatenate([f for f, _, _ in chunks])
+            labels = np.concatenate([y for _, y, _ in chunks])
+            self.assertGreater(len(chunks), 1)
+            np.testing.assert_allclose(features, [self.expected_features(log) for log in rows])
+            self.assertEqual(labels.tolist(), [int(log.status == 'missed') for log in rows])
+
+    def test_serving_features_match_training_rows(self):
+        # Open slots around the outcomes, as the scheduler and the dashboard leave them
+        for med in self.meds:
+            last = DoseLog.objects.filter(medication=med).latest('scheduled_time').scheduled_time
+            for hours in (-30, -3, 2, 26):
+                DoseLog.objects.create(
+                    user=self.user, medication=med, status='pending',
+                    scheduled_time=last + timedelta(hours=hours, minutes=30)
+                )
+        rows = list(
+            DoseLog.objects.filter(status__in=('taken', 'missed')).select_related('medication')
+            .order_by('medication_id', 'scheduled_time')
+        )
+        trained = np.concatenate([f for f, _, _ in iter_training_chunks()])
+        self.assertEqual(len(trained), len(rows))
+
+        # Scored at the moment a dose is due, a medication gets the row training saw for it
+        for log, features in list(zip(rows, trained))[::6]:
+            served = extract_features_batch(Medication.objects.filter(pk=log.medication_id), now=log.scheduled_time)
+            np.testing.assert_allclose(served.loc[(self.user.id, log.medication_id)].to_numpy(dtype=float), features)
+            single = extract_features(self.user, log.medication, now=log.scheduled_time)
+            np.testing.assert_allclose([single[column] for column in FEATURE_COLUMNS], features)
+
+    def test_train_and_continue_incrementally(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(MODEL_REGISTRY_DIR=root):
+            call_command('train_adherence_model', '--holdout-days', '3', '--chunk-size', '10', stdout=StringIO())
+            registry = get_registry()
+            first = registry.metadata(registry.current_version())
+            self.assertEqual(first['feature_order'], FEATURE_COLUMNS)
+            self.assertGreater(first['holdout_rows'], 0)
+
+            call_command('train_adherence_model', '--incremental', '--holdout-days', '0', stdout=StringIO())
+            second = registry.metadata(registry.current_version())
+            self.assertEqual(second['trained_rows'], DoseLog.objects.count())
+            self.assertIsNotNone(registry.get().linear)
@@ -24,7 +24,13 @@ urlpatterns = [
     path('api/log-dose/', views.log_dose, name='log_dose'),
     path('api/toggle-dose-status/', views.toggle_dose_status, name='toggle_dose_status'),
     path('api/mark-dose-taken/', views.mark_dose_taken, name='mark_dose_taken'),
+    path('api/dose-events/batch/', views.dose_events_batch, name='dose_events_batch'),
     path('api/today-dose-logs/', views.get_today_dose_logs, name='today_dose_logs'),
+    path('api/dose-history/', views.dose_history, name='dose_history'),
+    path('api/export/', views.export_dose_history, name='export_dose_history'),
+    path('api/sync/', views.sync_view, name='sync'),
+    path('api/events/', views.dose_events, name='dose_events'),
+    path('api/metrics/', views.metrics_view, name='metrics'),
 
     # Notifications
     path('get-vapid-public-key/', views.get_vapid_public_key, name='get_vapid_public_key'),
@@ -0,0 +1,47 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Max
+
+from . import metrics
+from .models import ChangeLog
+
+
+def _cache():
+    return caches[settings.DASHBOARD_CACHE_ALIAS]
+
+
+def data_version(user_id):
+    """
+    Current version of a user's medication and dose data: the id of their newest
+    ChangeLog row. Every write path records its changes there in the same transaction,
+    whichever process it runs in (web workers, scheduler, sweeper, scoring), so the
+    version is shared without a shared cache and moves only once the write commits.
+    One indexed lookup on changelog_user_idx.
+    """
+    return ChangeLog.objects.filter(user_id=user_id).aggregate(last=Max('id'))['last'] or 0
+
+
+def cached_for_user(user_id, name, build, version=None):
+    """
+    Return build() for this user, cached until their data version changes. Pass the
+    version when the request has already read it (e.g. for its ETag).
+    """
+    cache = _cache()
+    if version is None:
+        version = data_version(user_id)
+    key = f"user-data:{name}:{user_id}:{version}"
+    value = cache.get(key)
+    if value is not None:
+        metrics.incr(f'user_cache.{name}.hits')
+        return value
+
+    metrics.incr(f'user_cache.{name}.misses')
+    start = time.perf_counter()
+    value = build()
+    build_seconds = time.perf_counter() - start
+    metrics.incr(f'user_cache.{name}.build_seconds_total', build_seconds)
+    metrics.gauge(f'user_cache.{name}.last_build_seconds', build_seconds)
+    cache.set(key, value, timeout=settings.DASHBOARD_CACHE_TIMEOUT)
+    return value
@@ -0,0 +1,119 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from medicines.models import DailyAdherence, DoseLog
+
+
+def local_day(dt):
+    """Local date (settings.TIME_ZONE) a scheduled_time belongs to."""
+    return timezone.localtime(dt).date()
+
+
+def day_bounds(first_day, last_day):
+    """Aware datetimes spanning first_day 00:00 to last_day 23:59:59.999999 local time."""
+    return (
+        timezone.make_aware(datetime.combine(first_day, datetime.min.time())),
+        timezone.make_aware(datetime.combine(last_day, datetime.max.time())),
+    )
+
+
+def refresh_daily_adherence(keys):
+    """
+    Recompute the DailyAdherence rows for the given (user_id, date) pairs from DoseLog
+    and upsert them. Each call rebuilds the affected days from scratch, so it is safe
+    to repeat. One grouped query per user, one upsert for everything.
+    """
+    days_by_user = defaultdict(set)
+    for user_id, day in keys:
+        days_by_user[user_id].add(day)
+    if not days_by_user:
+        return 0
+
+    rows = []
+    with transaction.atomic():
+        for user_id, days in days_by_user.items():
+            counts = (
+                DoseLog.objects.filter(user_id=user_id, scheduled_time__range=day_bounds(min(days), max(days)))
+                .annotate(day=TruncDate('scheduled_time', tzinfo=timezone.get_current_timezone()))
+                .values('day')
+                .annotate(
+                    expected=Count('id'),
+                    taken=Count('id', filter=Q(status='taken')),
+                    missed=Count('id', filter=Q(status='missed')),
+                )
+                .order_by()
+            )
+            counts = {row['day']: row for row in counts}
+            for day in days:
+                row = counts.get(day, {})
+                rows.append(DailyAdherence(
+                    user_id=user_id,
+                    date=day,
+                    expected=row.get('expected', 0),
+                    taken=row.get('taken', 0),
+                    missed=row.get('missed', 0),
+                ))
+
+        DailyAdherence.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['user', 'date'],
+            update_fields=['expected', 'taken', 'missed', 'updated_at'],
+        )
+    return len(rows)
+
+
+def streak_and_weekly_adherence(user, today, streak_days=30):
+    """
+    Perfect-day streak (up to streak_days, counting back from today) and the adherence
+    percentage for each of the last 7 days, oldest first, read from DailyAdherence.
+    """
+    rows = DailyAdherence.objects.filter(
+        user=user, date__range=(today - timedelta(days=streak_days - 1), today)
+    ).values_list('date', 'expected', 'taken')
+    by_day = {day: (expected, taken) for day, expected, taken in rows}
+
+    streak = 0
+    for i in range(streak_days):
+        expected, taken = by_day.get(today - timedelta(days=i), (0, 0))
+        # A perfect day means all expected doses for that day were taken
+        if expected > 0 and taken == expected:
+            streak += 1
+        else:
+            break
+
+    weekly_adherence = []
+    for i in range(6, -1, -1):
+        expected, taken = by_day.get(today - timedelta(days=i), (0, 0))
+        weekly_adherence.append(round((taken / expected) * 100, 1) if expected > 0 else 0)
+
+    return streak, weekly_adherence
+
+
+def rebuild_daily_adherence(user_ids):
+    """Replace all DailyAdherence rows of the given users with counts from their full DoseLog history."""
+    counts = (
+        DoseLog.objects.filter(user_id__in=user_ids)
+        .annotate(day=TruncDate('scheduled_time', tzinfo=timezone.get_current_timezone()))
+        .values('user_id', 'day')
+        .annotate(
+            expected=Count('id'),
+            taken=Count('id', filter=Q(status='taken')),
+            missed=Count('id', filter=Q(status='missed')),
+        )
+        .order_by()
+    )
+    with transaction.atomic():
+        rows = [
+            DailyAdherence(
+                user_id=row['user_id'], date=row['day'],
+                expected=row['expected'], taken=row['taken'], missed=row['missed']
+            )
+            for row in counts
+        ]
+        DailyAdherence.objects.filter(user_id__in=user_ids).delete()
+        DailyAdherence.objects.bulk_create(rows, batch_size=5000)
+    return len(rows)
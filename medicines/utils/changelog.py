@@ -0,0 +1,28 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from medicines.models import ChangeLog
+
+
+def record_changes(model_name, rows, deleted=False):
+    """Append one ChangeLog row per (object_id, user_id) with a single insert."""
+    ChangeLog.objects.bulk_create([
+        ChangeLog(model_name=model_name, object_id=object_id, user_id=user_id, deleted=deleted)
+        for object_id, user_id in rows
+    ])
+
+
+def purge_changelog(days=None):
+    """
+    Drop changes older than CHANGELOG_RETENTION_DAYS. The newest row is always kept so
+    ids keep increasing; sync clients whose cursor predates the purge get a full reset.
+    """
+    days = settings.CHANGELOG_RETENTION_DAYS if days is None else days
+    newest = ChangeLog.objects.aggregate(last=Max('id'))['last']
+    if newest is None:
+        return 0
+    deleted, _ = ChangeLog.objects.filter(
+        created_at__lt=timezone.now() - timedelta(days=days), id__lt=newest
+    ).delete()
+    return deleted
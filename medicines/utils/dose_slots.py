@@ -0,0 +1,147 @@
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from medicines.events import publish_dose_status
+from medicines.models import DoseLog, Medication
+from medicines.utils.adherence import local_day, refresh_daily_adherence
+from medicines.utils.changelog import record_changes
+from medicines.utils.schedule_index import normalize_times
+
+
+def scheduled_slot(day, t_str):
+    """Aware datetime for an "HH:MM" dose time on a given local date."""
+    t_obj = datetime.strptime(t_str, "%H:%M").time()
+    return timezone.make_aware(datetime.combine(day, t_obj))
+
+
+def day_slots(medications, days):
+    """(medication, scheduled_time) for every dose time of the medications on the given local dates."""
+    return [
+        (med, scheduled_slot(day, t_str))
+        for med in medications
+        for t_str in normalize_times(med.times)
+        for day in days
+    ]
+
+
+def upcoming_days():
+    """Today and tomorrow (local): the days whose slots are created ahead of any read."""
+    today = timezone.localdate()
+    return [today, today + timedelta(days=1)]
+
+
+def read_dose_slots(slots):
+    """
+    {(medication_id, scheduled_time): DoseLog} for the slots that exist, in one query
+    and without writing; for read paths such as the dashboard.
+    """
+    return _read_slots({(med.id, scheduled_dt) for med, scheduled_dt in slots})
+
+
+def _read_slots(wanted):
+    logs = DoseLog.objects.filter(
+        medication_id__in={med_id for med_id, _ in wanted},
+        scheduled_time__in={scheduled_dt for _, scheduled_dt in wanted}
+    )
+    # The IN/IN filter can also match other pairs of the same medications and times
+    return {
+        (log.medication_id, log.scheduled_time): log
+        for log in logs
+        if (log.medication_id, log.scheduled_time) in wanted
+    }
+
+
+def materialize_dose_slots(slots, status='pending'):
+    """
+    Make sure a DoseLog exists for every (medication, scheduled_time) slot.
+
+    The existing rows are read first; when none are missing nothing is written.
+    Missing rows are inserted with one bulk_create(ignore_conflicts=True), relying
+    on the unique (medication, scheduled_time) constraint, and read back with a
+    single query. Only the inserted rows reach the daily rollup and the change log,
+    so an unchanged slot never moves a user's data version.
+    Returns {(medication_id, scheduled_time): DoseLog}.
+    """
+    slots = list(slots)
+    if not slots:
+        return {}
+
+    wanted = {(med.id, scheduled_dt) for med, scheduled_dt in slots}
+    existing = _read_slots(wanted)
+    missing = {(med.id, scheduled_dt): med for med, scheduled_dt in slots if (med.id, scheduled_dt) not in existing}
+    if not missing:
+        return existing
+
+    with transaction.atomic():
+        DoseLog.objects.bulk_create(
+            [
+                DoseLog(medication=med, user_id=med.user_id, scheduled_time=scheduled_dt, status=status)
+                for (_, scheduled_dt), med in missing.items()
+            ],
+            ignore_conflicts=True
+        )
+        logs = _read_slots(wanted)
+        # bulk_create sends no signals, so keep the daily rollup and the change log current here.
+        # A slot another process inserted since the first read is announced by both; only
+        # that race can repeat a change
+        inserted = [logs[key] for key in missing if key in logs]
+        refresh_daily_adherence({(log.user_id, local_day(log.scheduled_time)) for log in inserted})
+        record_changes('doselog', [(log.id, log.user_id) for log in inserted])
+    return logs
+
+
+def materialize_day_slots(days, medications=None, chunk_size=5000):
+    """
+    Create the DoseLog slots of every medication for the given local dates, one
+    chunk of medications at a time, so that read paths find them and never write.
+    Called ahead of each day by the scheduler and the sweeper. Returns the number
+    of slots checked.
+    """
+    if medications is None:
+        medications = Medication.objects.filter(user__isnull=False)
+    meds = medications.order_by('id').only('id', 'user_id', 'times')
+
+    checked = 0
+    chunk = []
+    for med in meds.iterator(chunk_size=chunk_size):
+        chunk.append(med)
+        if len(chunk) >= chunk_size:
+            checked += len(materialize_dose_slots(day_slots(chunk, days)))
+            chunk = []
+    if chunk:
+        checked += len(materialize_dose_slots(day_slots(chunk, days)))
+    return checked
+
+
+def sweep_missed_doses(grace_minutes=None, batch_size=None):
+    """
+    Mark overdue 'pending' doses as 'missed' with set-based UPDATEs of at most
+    batch_size rows each. Returns the number of doses marked missed.
+    """
+    if grace_minutes is None:
+        grace_minutes = settings.DOSE_MISSED_GRACE_MINUTES
+    batch_size = batch_size or settings.DOSE_SWEEP_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(minutes=grace_minutes)
+
+    swept = 0
+    while True:
+        batch = list(
+            DoseLog.objects.filter(status='pending', scheduled_time__lt=cutoff)
+            .values_list('id', 'user_id', 'scheduled_time')[:batch_size]
+        )
+        if not batch:
+            return swept
+        with transaction.atomic():
+            # Re-check the status so a dose marked taken in the meantime is left alone
+            ids = [dose_id for dose_id, _, _ in batch]
+            swept += DoseLog.objects.filter(id__in=ids, status='pending').update(status='missed')
+            missed = list(
+                DoseLog.objects.filter(id__in=ids, status='missed')
+                .values_list('id', 'user_id', 'medication_id', 'status')
+            )
+            publish_dose_status(missed)
+            record_changes('doselog', [(dose_id, user_id) for dose_id, user_id, _, _ in missed])
+            refresh_daily_adherence({(user_id, local_day(scheduled_dt)) for _, user_id, scheduled_dt in batch})
+        if len(batch) < batch_size:
+            return swept
@@ -1,16 +1,26 @@
-from datetime import datetime, timedelta
+from datetime import timedelta
+from django.utils import timezone
 from medicines.models import DoseLog, Medication
 
-def extract_features(user, medication):
-    # 1. Past adherence rate for this medication
+# History is the recorded outcomes scheduled before now. Pending slots, including the
+# future ones the scheduler and dashboard create ahead of time, are not outcomes yet.
+# medicines.utils.training builds its rows the same way, so the model is served the
+# features it was trained on.
+OUTCOMES = ('taken', 'missed')
+
+def extract_features(user, medication, now=None):
+    now = now or timezone.now()
     logs = DoseLog.objects.filter(user=user, medication=medication)
-    total = logs.count()
-    taken = logs.filter(status='taken').count()
+    history = logs.filter(status__in=OUTCOMES, scheduled_time__lt=now)
+
+    # 1. Past adherence rate for this medication
+    total = history.count()
+    taken = history.filter(status='taken').count()
     past_adherence_rate = taken / total if total > 0 else 1.0
 
     # 2. Lifestyle routine (taken all doses in last 4 days?)
-    four_days_ago = datetime.now() - timedelta(days=4)
-    recent_logs = logs.filter(scheduled_time__gte= four_days_ago)
+    four_days_ago = now - timedelta(days=4)
+    recent_logs = history.filter(scheduled_time__gte= four_days_ago)
     if recent_logs.exists():
         lifestyle_routine = 1 if recent_logs.filter(status='taken').count() >= 0.8*recent_logs.count() else 0
     else:
@@ -20,7 +30,7 @@ def extract_features(user, medication):
     dose_complexity = medication.times_per_day
 
     # 4. Time of day (based on next scheduled dose)
-    next_dose = logs.filter(scheduled_time__gte=datetime.now()).order_by('scheduled_time').first()
+    next_dose = logs.filter(scheduled_time__gte=now).order_by('scheduled_time').first()
     if next_dose:
         hour = next_dose.scheduled_time.hour
     else:
@@ -0,0 +1,51 @@
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(scheduled_time, pk):
+    """Opaque cursor for the row a page ended on."""
+    raw = json.dumps([scheduled_time.isoformat(), pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        scheduled_time, pk = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(scheduled_time), int(pk)
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+
+
+def keyset_page(queryset, cursor, limit, descending=True):
+    """
+    One page of `queryset` ordered by (scheduled_time, id), starting after `cursor`.
+    Seeking on the key instead of OFFSET keeps page N as cheap as page 1.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    if descending:
+        queryset = queryset.order_by('-scheduled_time', '-id')
+    else:
+        queryset = queryset.order_by('scheduled_time', 'id')
+
+    if cursor:
+        scheduled_time, pk = decode_cursor(cursor)
+        if descending:
+            after = Q(scheduled_time__lt=scheduled_time) | Q(scheduled_time=scheduled_time, id__lt=pk)
+        else:
+            after = Q(scheduled_time__gt=scheduled_time) | Q(scheduled_time=scheduled_time, id__gt=pk)
+        queryset = queryset.filter(after)
+
+    # One extra row tells whether another page exists
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].scheduled_time, rows[-1].id)
@@ -0,0 +1,64 @@
+import math
+
+import numpy as np
+
+MISS_LABEL = 1  # will_miss_dose in predictor_model/AdherencePredictor.py
+
+
+class LinearModel:
+    """
+    A fitted binary logistic regression reduced to its weights, in the model's own
+    feature order. Scoring is a dot product and a sigmoid: no DataFrame, no sklearn.
+    """
+
+    def __init__(self, feature_order, coef, intercept):
+        self.feature_order = tuple(feature_order)
+        self.coef = np.ascontiguousarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        # Plain floats for the single-row path, where numpy's per-call overhead dominates
+        self._weights = [float(w) for w in self.coef]
+
+    @classmethod
+    def supports(cls, estimator):
+        classes = list(getattr(estimator, 'classes_', []))
+        coef = getattr(estimator, 'coef_', None)
+        return (
+            coef is not None and coef.shape[0] == 1 and len(classes) == 2
+            and MISS_LABEL in classes and hasattr(estimator, 'feature_names_in_')
+        )
+
+    @classmethod
+    def from_estimator(cls, estimator):
+        """Weights of a fitted sklearn LogisticRegression (or SGDClassifier with log loss)."""
+        if not cls.supports(estimator):
+            raise ValueError(f"{type(estimator).__name__} is not a binary linear model fitted on named features")
+        coef, intercept = estimator.coef_[0], estimator.intercept_[0]
+        # decision_function is the log-odds of classes_[1]; flip it when that is not "miss"
+        if list(estimator.classes_).index(MISS_LABEL) == 0:
+            coef, intercept = -coef, -intercept
+        return cls(estimator.feature_names_in_, coef, intercept)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['feature_order'].tolist(), data['coef'], data['intercept'])
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            np.savez(f, feature_order=np.array(self.feature_order), coef=self.coef, intercept=self.intercept)
+
+    def miss_probability(self, features):
+        """P(miss) for one feature dict such as extract_features returns."""
+        z = self.intercept
+        for name, weight in zip(self.feature_order, self._weights):
+            z += weight * features[name]
+        # Numerically stable sigmoid
+        if z >= 0:
+            return 1.0 / (1.0 + math.exp(-z))
+        e = math.exp(z)
+        return e / (1.0 + e)
+
+    def miss_probabilities(self, matrix):
+        """P(miss) for every row of a 2-D array whose columns follow feature_order."""
+        z = np.asarray(matrix, dtype=np.float64) @ self.coef + self.intercept
+        return np.exp(-np.logaddexp(0.0, -z))
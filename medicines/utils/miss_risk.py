@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Mod
+from django.utils import timezone
+
+from medicines import metrics
+from medicines.models import Medication, MissRiskScore
+from medicines.utils.batch_features import FEATURE_COLUMNS, iter_feature_chunks
+from medicines.utils.changelog import record_changes
+from medicines.utils.linear_inference import MISS_LABEL, LinearModel
+from medicines.utils.model_loader import current_model
+
+
+def miss_probabilities(model, features):
+    """
+    P(miss) for every row of a FEATURE_COLUMNS frame in one vectorized call, with a
+    LinearModel or, for other estimators, one predict_proba.
+    """
+    if isinstance(model, LinearModel):
+        return model.miss_probabilities(features[list(model.feature_order)].to_numpy())
+    # The model was fitted on its own column order (feature_names_in_), not FEATURE_COLUMNS
+    columns = list(getattr(model, 'feature_names_in_', FEATURE_COLUMNS))
+    miss_column = list(model.classes_).index(MISS_LABEL)
+    return model.predict_proba(features[columns])[:, miss_column]
+
+
+def active_medications(shard=0, num_shards=1):
+    """Medications that belong to a user, restricted to users with user_id % num_shards == shard."""
+    meds = Medication.objects.filter(user__isnull=False)
+    if num_shards > 1:
+        meds = meds.alias(shard=Mod('user_id', num_shards)).filter(shard=shard)
+    return meds
+
+
+def score_medications(model, medications, model_version="", chunk_size=None, now=None, log=None,
+                      metrics_source=None):
+    """
+    Score medications a chunk at a time (batch features, one predict_proba, one
+    upsert per chunk) and store the results in MissRiskScore. With metrics_source
+    the counts are flushed after every chunk, so a worker process that dies or
+    exits early has reported what it did. Returns the number of medications scored.
+    """
+    chunk_size = chunk_size or settings.MISS_RISK_CHUNK_SIZE
+    now = now or timezone.now()
+    scored = 0
+    for features in iter_feature_chunks(medications, now, chunk_size):
+        probabilities = miss_probabilities(model, features)
+        with transaction.atomic():
+            MissRiskScore.objects.bulk_create(
+                [
+                    MissRiskScore(
+                        medication_id=med_id, user_id=user_id, probability=float(probability),
+                        model_version=model_version, scored_at=now,
+                    )
+                    for (user_id, med_id), probability in zip(features.index, probabilities)
+                ],
+                update_conflicts=True,
+                unique_fields=['medication'],
+                update_fields=['user', 'probability', 'model_version', 'scored_at'],
+            )
+            # Moves the owners' data versions, so cached dashboards pick up the new scores
+            record_changes('missriskscore', [(med_id, user_id) for user_id, med_id in features.index])
+        scored += len(features)
+        metrics.incr('miss_risk.scored', len(features))
+        if metrics_source:
+            metrics.flush(metrics_source, force=True)
+        if log:
+            log(f" Scored {scored} medications")
+    return scored
+
+
+def score_shard(shard, num_shards, chunk_size=None, now=None):
+    """
+    Score one user shard with the served adherence model; the unit of work of one
+    process, whose metrics are stored as score_miss_risk@shard-<shard>-of-<num_shards>.
+    """
+    loaded = current_model()
+    return score_medications(
+        loaded.linear or loaded.model, active_medications(shard, num_shards), loaded.version, chunk_size, now,
+        metrics_source=shard_metrics_source(shard, num_shards)
+    )
+
+
+def shard_metrics_source(shard, num_shards):
+    return f"score_miss_risk@shard-{shard}-of-{num_shards}"
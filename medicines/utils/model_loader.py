@@ -1,12 +1,217 @@
+import json
 import os
+import threading
+import time
+from collections import namedtuple
+
 import joblib
 from django.conf import settings
+from django.utils import timezone
+
+from medicines import metrics
+from medicines.utils.linear_inference import LinearModel
+
+# Pre-registry artifact, served when the registry has no current version yet
+LEGACY_MODEL_FILE = 'adherence_model.pkl'
+LEGACY_VERSION = 'legacy'
+
+CURRENT_POINTER = 'CURRENT'
+ARTIFACT_FILE = 'model.joblib'
+METADATA_FILE = 'metadata.json'
+LINEAR_FILE = 'linear.npz'
+
+# linear: the LinearModel fast path, or None when the estimator is not a binary linear model
+LoadedModel = namedtuple('LoadedModel', ['version', 'model', 'metadata', 'linear'])
+
+
+class ModelRegistry:
+    """
+    Versioned model artifacts on disk:
+
+        <root>/<version>/model.joblib    uncompressed joblib, so its arrays can be memory-mapped
+        <root>/<version>/metadata.json   feature order, classes, estimator and training info
+        <root>/<version>/linear.npz      weights for LinearModel, when the estimator is linear
+        <root>/CURRENT                   name of the version being served
+
+    Versions are immutable once published; switching models only rewrites CURRENT,
+    atomically. get() notices the switch by the pointer's mtime and swaps the loaded
+    model in without a restart.
+    """
+
+    def __init__(self, root, check_interval=None):
+        self.root = str(root)
+        self.check_interval = settings.MODEL_RELOAD_INTERVAL if check_interval is None else check_interval
+        self._lock = threading.Lock()
+        self._loaded = None
+        self._pointer_mtime = None
+        self._next_check = 0
+
+    def versions(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if os.path.isfile(os.path.join(self.root, name, METADATA_FILE))
+        )
+
+    def current_version(self):
+        try:
+            with open(os.path.join(self.root, CURRENT_POINTER)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def metadata(self, version):
+        with open(os.path.join(self.root, version, METADATA_FILE)) as f:
+            return json.load(f)
+
+    def publish(self, model, feature_order, activate=True, **info):
+        """
+        Write a new version (into a temp dir, then renamed, so readers never see it
+        half-written) and optionally make it current. Returns the version name.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        version = timezone.now().strftime('%Y%m%d-%H%M%S')
+        suffix = 1
+        while os.path.exists(os.path.join(self.root, version)):
+            suffix += 1
+            version = f"{timezone.now():%Y%m%d-%H%M%S}-{suffix}"
+
+        staging = os.path.join(self.root, f".staging-{version}")
+        os.makedirs(staging)
+        joblib.dump(model, os.path.join(staging, ARTIFACT_FILE), compress=0)
+        if LinearModel.supports(model):
+            LinearModel.from_estimator(model).save(os.path.join(staging, LINEAR_FILE))
+        metadata = {
+            'version': version,
+            'created_at': timezone.now().isoformat(),
+            'estimator': type(model).__name__,
+            'feature_order': list(feature_order),
+            'classes': [int(c) for c in getattr(model, 'classes_', [])],
+            **info,
+        }
+        with open(os.path.join(staging, METADATA_FILE), 'w') as f:
+            json.dump(metadata, f, indent=2)
+        os.rename(staging, os.path.join(self.root, version))
+
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version):
+        """Point CURRENT at an existing version; every process picks it up on its next check."""
+        if version not in self.versions():
+            raise ValueError(f"Unknown model version: {version}")
+        tmp = os.path.join(self.root, f".{CURRENT_POINTER}.{os.getpid()}")
+        with open(tmp, 'w') as f:
+            f.write(version)
+        os.replace(tmp, os.path.join(self.root, CURRENT_POINTER))
+
+    def load(self, version):
+        if version is None:
+            path = os.path.join(settings.BASE_DIR, 'medicines', 'ml_model', LEGACY_MODEL_FILE)
+            model = joblib.load(path)
+            metadata = {
+                'version': LEGACY_VERSION,
+                'estimator': type(model).__name__,
+                'feature_order': list(model.feature_names_in_),
+                'classes': [int(c) for c in model.classes_],
+            }
+            return LoadedModel(LEGACY_VERSION, model, metadata, _linear_of(model))
+
+        # mmap_mode: numpy arrays stay in the OS page cache, shared by every worker
+        model = joblib.load(os.path.join(self.root, version, ARTIFACT_FILE), mmap_mode='r')
+        linear_path = os.path.join(self.root, version, LINEAR_FILE)
+        linear = LinearModel.load(linear_path) if os.path.exists(linear_path) else _linear_of(model)
+        return LoadedModel(version, model, self.metadata(version), linear)
+
+    def estimator(self, version):
+        """A private, writable copy of a version's estimator (e.g. to continue training it)."""
+        return joblib.load(os.path.join(self.root, version, ARTIFACT_FILE))
+
+    def _pointer_changed(self):
+        try:
+            mtime = os.stat(os.path.join(self.root, CURRENT_POINTER)).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        changed = mtime != self._pointer_mtime
+        self._pointer_mtime = mtime
+        return changed
+
+    def get(self):
+        """
+        The model currently being served. At most every check_interval seconds one
+        caller stats the CURRENT pointer and, if it moved, loads the new version
+        while everyone else keeps using the old one.
+        """
+        loaded = self._loaded
+        if loaded is not None and time.monotonic() < self._next_check:
+            return loaded
+
+        with self._lock:
+            if self._loaded is not None and time.monotonic() < self._next_check:
+                return self._loaded
+            self._next_check = time.monotonic() + self.check_interval
+            if self._loaded is None or self._pointer_changed():
+                version = self.current_version()
+                if self._loaded is None or version != self._loaded.version:
+                    try:
+                        self._loaded = self.load(version)
+                        metrics.incr('model_registry.loads')
+                    except Exception:
+                        # Keep serving the previous model and retry on the next check;
+                        # with none loaded there is nothing to fall back to
+                        metrics.incr('model_registry.load_errors')
+                        self._pointer_mtime = None
+                        if self._loaded is None:
+                            raise
+            return self._loaded
+
+
+def _linear_of(model):
+    return LinearModel.from_estimator(model) if LinearModel.supports(model) else None
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    global _registry
+    root = str(settings.MODEL_REGISTRY_DIR)
+    if _registry is None or _registry.root != root:
+        with _registry_lock:
+            if _registry is None or _registry.root != root:
+                _registry = ModelRegistry(root)
+    return _registry
+
+
+def current_model():
+    """LoadedModel (version, estimator, metadata) of the adherence model being served."""
+    return get_registry().get()
 
-_model = None
 
 def get_adherence_model():
-    global _model
-    if _model is None:
-        model_path = os.path.join(settings.BASE_DIR, 'medicines', 'ml_model', 'adherence_model.pkl')
-        _model = joblib.load(model_path)
-    return _model
+    return current_model().model
+
+
+def _warm():
+    try:
+        current_model()
+    except Exception:
+        pass  # counted in model_registry.load_errors; the first prediction will raise it
+
+
+def warm_up():
+    """
+    Load the current model in a background thread when MODEL_WARMUP is on, so startup
+    does not wait for it and the first prediction usually finds it loaded. Called by
+    the server entry points (crudapp.wsgi, which runserver also loads, and crudapp.asgi)
+    only: other manage.py commands never predict, or load the model themselves.
+    Returns the thread, or None when warm-up is off.
+    """
+    if not settings.MODEL_WARMUP:
+        return None
+    thread = threading.Thread(target=_warm, name='model-warm-up', daemon=True)
+    thread.start()
+    return thread
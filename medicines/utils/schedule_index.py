@@ -0,0 +1,74 @@
+from datetime import datetime
+
+from django.db.models.functions import Mod
+
+from medicines.models import Medication, MedicationSchedule
+
+
+def normalize_times(times):
+    """Return the distinct, well-formed "HH:MM" strings from a Medication.times value."""
+    if not isinstance(times, list):
+        return []
+
+    normalized = set()
+    for t_str in times:
+        try:
+            normalized.add(datetime.strptime(str(t_str), "%H:%M").strftime("%H:%M"))
+        except ValueError:
+            # Skip malformed entries instead of failing the whole medication
+            continue
+    return sorted(normalized)
+
+
+def sync_schedule_index(medication):
+    """Bring the MedicationSchedule rows of one medication in line with its times."""
+    wanted = set(normalize_times(medication.times))
+    existing = set(
+        MedicationSchedule.objects.filter(medication=medication).values_list('time', flat=True)
+    )
+
+    stale = existing - wanted
+    if stale:
+        MedicationSchedule.objects.filter(medication=medication, time__in=stale).delete()
+
+    missing = wanted - existing
+    if missing:
+        MedicationSchedule.objects.bulk_create(
+            [MedicationSchedule(medication=medication, time=t) for t in missing],
+            ignore_conflicts=True
+        )
+
+
+def rebuild_schedule_index(medications=None, batch_size=5000):
+    """
+    Rebuild the index from scratch for the given medications (default: all).
+    Needed after writes that bypass model signals, e.g. bulk_create or queryset.update().
+    """
+    if medications is None:
+        medications = Medication.objects.all()
+
+    MedicationSchedule.objects.filter(medication__in=medications).delete()
+
+    entries = []
+    for med_id, times in medications.values_list('id', 'times').iterator(chunk_size=batch_size):
+        entries.extend(MedicationSchedule(medication_id=med_id, time=t) for t in normalize_times(times))
+        if len(entries) >= batch_size:
+            MedicationSchedule.objects.bulk_create(entries, batch_size=batch_size, ignore_conflicts=True)
+            entries = []
+    if entries:
+        MedicationSchedule.objects.bulk_create(entries, batch_size=batch_size, ignore_conflicts=True)
+
+
+def schedule_entries_due(times, shard=0, num_shards=1):
+    """
+    The reminder scheduler's per-tick query: MedicationSchedule rows due at any of
+    the given "HH:MM" times, with their medication, user and stored miss risk, for
+    users in one shard (user_id % num_shards).
+    """
+    entries = MedicationSchedule.objects.filter(
+        time__in=times,
+        medication__user__isnull=False
+    ).select_related('medication__user', 'medication__miss_risk')
+    if num_shards > 1:
+        entries = entries.alias(shard=Mod('medication__user_id', num_shards)).filter(shard=shard)
+    return entries
@@ -0,0 +1,123 @@
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Q
+
+from medicines.models import DoseLog
+from medicines.utils.batch_features import FEATURE_COLUMNS
+from medicines.utils.feature_extractor import OUTCOMES
+
+ROUTINE_WINDOW = timedelta(days=4)  # lifestyle_routine looks at the last four days, like extract_features
+
+
+def _prior_counts(before):
+    """Per-medication (outcomes, taken) scheduled before `before`: the history a stream starting there skips."""
+    rows = (
+        DoseLog.objects.filter(status__in=OUTCOMES, scheduled_time__lt=before)
+        .values('medication_id')
+        .annotate(total=Count('id'), taken=Count('id', filter=Q(status='taken')))
+        .order_by()
+    )
+    return {row['medication_id']: (row['total'], row['taken']) for row in rows}
+
+
+def point_in_time_features(med_ids, seconds, taken, times_per_day, prior=None):
+    """
+    extract_features for every outcome as it looked just before its own dose was
+    due: only outcomes scheduled earlier count towards past_adherence_rate and
+    lifestyle_routine, so nothing from the future leaks into a row.
+
+    Inputs are parallel arrays sorted by (medication, scheduled_time), each
+    medication's rows complete; seconds are epoch seconds (UTC). prior maps a
+    medication to the (total, taken) outcomes before the first row given.
+    Returns an (n, 7) float array in FEATURE_COLUMNS order.
+    """
+    n = len(med_ids)
+    if n == 0:
+        return np.empty((0, len(FEATURE_COLUMNS)))
+    med_ids = np.asarray(med_ids)
+    seconds = np.asarray(seconds, dtype=np.int64)
+    taken = np.asarray(taken, dtype=np.int64)
+
+    starts = np.r_[0, np.flatnonzero(med_ids[1:] != med_ids[:-1]) + 1]
+    group = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, n]))
+    group_start = starts[group]
+    idx = np.arange(n)
+    # taken_before[i]: taken outcomes among rows 0..i-1
+    taken_before = np.r_[0, np.cumsum(taken)]
+
+    prior = prior or {}
+    prior_total = np.array([prior.get(m, (0, 0))[0] for m in med_ids[starts]], dtype=np.int64)[group]
+    prior_taken = np.array([prior.get(m, (0, 0))[1] for m in med_ids[starts]], dtype=np.int64)[group]
+    total = prior_total + idx - group_start
+    taken_so_far = prior_taken + taken_before[idx] - taken_before[group_start]
+
+    # First row of the same medication inside the routine window: search one sorted key
+    # that puts every medication's times in its own non-overlapping range
+    window = int(ROUTINE_WINDOW.total_seconds())
+    offset = seconds - seconds.min()
+    key = group * (int(offset.max()) + window + 1) + offset
+    window_start = np.searchsorted(key, key - window, side='left')
+    recent = idx - window_start
+    recent_taken = taken_before[idx] - taken_before[window_start]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        past_adherence_rate = np.where(total > 0, taken_so_far / total, 1.0)
+    lifestyle_routine = (recent > 0) & (recent_taken >= 0.8 * recent)
+    # The dose itself is the "next dose"; its hour as stored (UTC), like extract_features
+    hours = (seconds // 3600) % 24
+    columns = {
+        'dose_complexity': np.asarray(times_per_day, dtype=float),
+        'past_adherence_rate': past_adherence_rate,
+        'lifestyle_routine': lifestyle_routine,
+        'Morning': (hours >= 5) & (hours < 12),
+        'Afternoon': (hours >= 12) & (hours < 17),
+        'Evening': (hours >= 17) & (hours < 21),
+        'Night': (hours < 5) | (hours >= 21),
+    }
+    return np.column_stack([columns[name] for name in FEATURE_COLUMNS]).astype(float)
+
+
+def iter_training_chunks(since=None, until=None, chunk_size=None):
+    """
+    Stream taken/missed outcomes scheduled in [since, until) as (features, labels,
+    seconds) chunks of roughly chunk_size rows; label 1 means missed.
+
+    Rows are read in (medication, scheduled_time) order, which the unique_dose_slot
+    index serves without sorting, and a chunk always ends on a medication boundary.
+    History before `since` enters through per-medication counts plus the rows of
+    the routine window, so memory is bounded by the chunk, not the table.
+    """
+    chunk_size = chunk_size or settings.TRAINING_CHUNK_SIZE
+    logs = DoseLog.objects.filter(status__in=OUTCOMES)
+    prior = None
+    if since is not None:
+        context_start = since - ROUTINE_WINDOW
+        prior = _prior_counts(context_start)
+        logs = logs.filter(scheduled_time__gte=context_start)
+    if until is not None:
+        logs = logs.filter(scheduled_time__lt=until)
+    rows = logs.order_by('medication_id', 'scheduled_time').values_list(
+        'medication_id', 'scheduled_time', 'status', 'medication__times_per_day'
+    )
+    since_seconds = int(since.timestamp()) if since is not None else None
+
+    def emit(buffer):
+        med_ids, seconds, taken, times_per_day = (np.array(column) for column in zip(*buffer))
+        features = point_in_time_features(med_ids, seconds, taken, times_per_day, prior)
+        labels = 1 - taken
+        if since_seconds is not None:
+            # Rows before `since` were only context for the window
+            keep = seconds >= since_seconds
+            features, labels, seconds = features[keep], labels[keep], seconds[keep]
+        return features, labels, seconds
+
+    buffer = []
+    for med_id, scheduled, status, times_per_day in rows.iterator(chunk_size=min(chunk_size, 10000)):
+        if len(buffer) >= chunk_size and med_id != buffer[-1][0]:
+            yield emit(buffer)
+            buffer = []
+        buffer.append((med_id, int(scheduled.timestamp()), int(status == 'taken'), times_per_day))
+    if buffer:
+        yield emit(buffer)
@@ -1,19 +1,23 @@
-from .models import Medication, DoseLog, PushSubscription, GoogleCredentials
+from .models import Medication, DoseLog, PushSubscription, GoogleCredentials, MetricSnapshot, SchedulerCursor
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.core.serializers.json import DjangoJSONEncoder
 from django.urls import reverse
+from django.utils.http import quote_etag
+from django.db import IntegrityError, transaction
 import json
 from datetime import date, datetime, timedelta
 
 from django.utils import timezone
-from django.views.decorators.http import require_POST
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
 from django.http import JsonResponse
 
 # Google API imports
@@ -21,6 +25,16 @@ from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 from google_auth_oauthlib.flow import Flow
 
+from . import metrics
+from .dose_batch import apply_dose_events
+from .events import get_hub
+from . import sync
+from .export import EXPORT_FORMATS, export_stream
+from .user_cache import cached_for_user, data_version
+from .utils.adherence import streak_and_weekly_adherence
+from .utils.dose_slots import read_dose_slots, scheduled_slot
+from .utils.keyset import InvalidCursor, keyset_page
+
 # import from chatbot package
 from chatbot import get_chatbot_response
 
@@ -313,13 +327,16 @@ def save_subscription(request):
     if request.method == "POST":
         try:
             data = json.loads(request.body)
-            subscription = PushSubscription(
+            # One row per browser endpoint; re-subscribing refreshes keys and reactivates it
+            PushSubscription.objects.update_or_create(
                 user=request.user,  
                 endpoint=data['endpoint'],
-                p256dh=data['p256dh'],  
-                auth=data['auth']
+                defaults={
+                    'p256dh': data['p256dh'],  
+                    'auth': data['auth'],
+                    'is_active': True,
+                }
             )
-            subscription.save()
             return JsonResponse({'status': 'success'})
         except Exception as e:
             print(f"Error saving subscription: {e}")
@@ -335,41 +352,38 @@ def get_vapid_public_key(request):
 # ===========================
 # DASHBOARD VIEWS
 # ===========================
-@login_required
-def dashboard_view(request):
-    meds = Medication.objects.filter(user=request.user)
-    today = date.today()
-    now = timezone.now()
+def _build_today_dashboard(user, today):
+    """Today's dose list, counters, streak and weekly series; cached per user by _today_dashboard."""
+    # Stored miss-risk scores come in the same query
+    meds = Medication.objects.filter(user=user).select_related('miss_risk')
 
-    dose_data = []
+    # Collect today's slots for every medication
+    slots = []
     for med in meds:
         # Safety check: Ensure med.times is a list before iterating
         times_list = med.times if isinstance(med.times, list) else [] 
-        
         for t_str in times_list:
-            t_obj = datetime.strptime(t_str, "%H:%M").time()
-            scheduled_dt = timezone.make_aware(datetime.combine(today, t_obj))
-            
-            # ALWAYS create DoseLog entry to ensure we have an ID
-            dose_log, created = DoseLog.objects.get_or_create(
-                user=request.user,
-                medication=med,
-                scheduled_time=scheduled_dt,
-                defaults={'status': 'pending'}
-            )
-            
-            # Auto-mark as missed if time has passed and still pending
-            if dose_log.status == 'pending' and scheduled_dt < now:
-                dose_log.status = 'missed'
-                dose_log.save()
-            
-            dose_data.append({
-                'med_id': med.id,
-                'pill_name': med.pill_name,
-                'time': t_str,
-                'status': dose_log.status,
-                'dose_log_id': dose_log.id 
-            })
+            slots.append((med, t_str, scheduled_slot(today, t_str)))
+
+    # Read only: the slots are created ahead of the day by the scheduler and the sweeper.
+    # Overdue doses are marked missed by the sweeper.
+    dose_logs = read_dose_slots((med, scheduled_dt) for med, _, scheduled_dt in slots)
+
+    dose_data = []
+    for med, t_str, scheduled_dt in slots:
+        # Not created yet (a medication added today, or no scheduler running): shown as
+        # pending and marked by medication and time, which creates the slot
+        dose_log = dose_logs.get((med.id, scheduled_dt))
+        risk = getattr(med, 'miss_risk', None)
+        dose_data.append({
+            'med_id': med.id,
+            'pill_name': med.pill_name,
+            'time': t_str,
+            'status': dose_log.status if dose_log else 'pending',
+            'dose_log_id': dose_log.id if dose_log else None,
+            'miss_risk': round(risk.probability, 2) if risk else None,
+            'high_miss_risk': bool(risk and risk.is_high),
+        })
 
     # --- PRIMARY CHANGE FOR SEQUENTIAL ORDER ---
     # Sort dose_data by time string (e.g., "08:00" comes before "12:00")
@@ -382,33 +396,59 @@ def dashboard_view(request):
     missed_doses = sum(1 for d in dose_data if d['status'] == 'missed')
     adherence = round((taken_doses / total_doses) * 100, 1) if total_doses else 0
 
-    # Calculate streak
-    streak = 0
-    # Use a set of all unique medications to calculate expected doses per day
-    all_meds = Medication.objects.filter(user=request.user)
-    
-    for i in range(30):
-        day = today - timedelta(days=i)
-        day_start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
-        day_end = timezone.make_aware(datetime.combine(day, datetime.max.time()))
-        
-        # We need to consider all possible scheduled doses for that day
-        expected_doses_count = sum(len(m.times) for m in all_meds if isinstance(m.times, list))
-        
-        # Check the logs for that specific day
-        day_logs = DoseLog.objects.filter(
-            user=request.user, 
-            # Note: scheduled_time is used to track the *intended* date
-            scheduled_time__range=(day_start, day_end) 
-        )
+    # Streak and weekly chart come from the DailyAdherence rollup
+    streak, weekly_adherence = streak_and_weekly_adherence(user, today)
 
-        taken_doses_count = day_logs.filter(status='taken').count()
-        
-        # A perfect day means all expected doses for that day were taken
-        if expected_doses_count > 0 and taken_doses_count == expected_doses_count:
-            streak += 1
-        else:
-            break
+    return {
+        'dose_data': dose_data,
+        'total_doses': total_doses,
+        'taken_doses': taken_doses,
+        'missed_doses': missed_doses,
+        'pending_doses': total_doses - taken_doses - missed_doses,
+        'adherence': adherence,
+        'streak': streak,
+        'weekly_adherence': weekly_adherence,
+    }
+
+
+def _today_dashboard(request):
+    user = request.user
+    today = date.today()
+    # The date is part of the key so the payload rolls over at midnight
+    return cached_for_user(
+        user.id, f'dashboard:{today.isoformat()}', lambda: _build_today_dashboard(user, today),
+        version=getattr(request, 'data_version', None)
+    )
+
+
+def _user_data_etag(name):
+    """
+    etag_func for condition(): changes whenever the user's data version or the day does,
+    so an unchanged poll is answered with 304 before the view touches DoseLog. The
+    version comes from ChangeLog, so writes made by the scheduler or any other process
+    change it too. It is kept on the request for the view's cache key.
+    """
+    def etag(request, *args, **kwargs):
+        request.data_version = data_version(request.user.id)
+        return _data_etag(name, request)
+    return etag
+
+
+def _data_etag(name, request):
+    """The ETag for the data version already read into request.data_version."""
+    return f"{name}-{request.user.id}-{request.data_version}-{date.today().isoformat()}"
+
+
+@login_required
+def dashboard_view(request):
+    meds = Medication.objects.filter(user=request.user)
+    today = date.today()
+    now = timezone.now()
+    # Read the version once, before building: the cache key and the embedded ETag both use
+    # it, so the ETag is never newer than the data rendered and a later write is not a 304
+    request.data_version = data_version(request.user.id)
+    payload = _today_dashboard(request)
+    dose_data = payload['dose_data']
 
     # Next dose
     next_dose_time = "--:--"
@@ -420,39 +460,22 @@ def dashboard_view(request):
             next_dose_time = d['time']
             break
 
-    # Weekly adherence data
-    weekly_adherence = []
-    week_days = []
-    for i in range(6, -1, -1): # Last 7 days including today
-        day = today - timedelta(days=i)
-        week_days.append(day.strftime('%a'))
-        
-        day_start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
-        day_end = timezone.make_aware(datetime.combine(day, datetime.max.time()))
-        
-        day_logs = DoseLog.objects.filter(
-            user=request.user, 
-            scheduled_time__range=(day_start, day_end)
-        )
-        
-        expected_doses = sum(len(m.times) for m in all_meds if isinstance(m.times, list))
-        taken_doses_for_day = day_logs.filter(status='taken').count()
-        
-        day_adherence = round((taken_doses_for_day / expected_doses) * 100, 1) if expected_doses > 0 else 0
-        weekly_adherence.append(day_adherence)
+    week_days = [(today - timedelta(days=i)).strftime('%a') for i in range(6, -1, -1)]
 
     context = {
         'meds': meds,
         'dose_data': dose_data,
         'dose_data_json': json.dumps(dose_data),
-        'adherence': adherence,
-        'streak': streak,
+        'adherence': payload['adherence'],
+        'streak': payload['streak'],
         'next_dose': next_dose_time,
-        'total_doses': total_doses,
-        'taken_doses': taken_doses,
-        'missed_doses': missed_doses,
-        'weekly_adherence_json': json.dumps(weekly_adherence),
+        'total_doses': payload['total_doses'],
+        'taken_doses': payload['taken_doses'],
+        'missed_doses': payload['missed_doses'],
+        'weekly_adherence_json': json.dumps(payload['weekly_adherence']),
         'week_days_json': json.dumps(week_days),
+        # Lets the polling script revalidate /api/dashboard-data/ from its first request
+        'dashboard_data_etag': quote_etag(_data_etag('dashboard-data', request)),
     }
     return render(request, "medicines/dashboard.html", context)
 
@@ -480,12 +503,13 @@ def toggle_dose_status(request):
             
             dose_log = DoseLog.objects.get(id=dose_log_id, user=request.user)
             
-            # Update status
+            # Update status (the DailyAdherence rollup is refreshed in the same transaction)
             dose_log.status = new_status
             if new_status == 'taken':
                 dose_log.timestamp = timezone.now()
             
-            dose_log.save()
+            with transaction.atomic():
+                dose_log.save()
             
             return JsonResponse({
                 'status': 'success',
@@ -500,39 +524,16 @@ def toggle_dose_status(request):
     return JsonResponse({'status': 'error', 'message': 'Invalid method'})
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_user_data_etag('dashboard-data'))
 def dashboard_data(request):
-    meds = Medication.objects.filter(user=request.user)
-    today = date.today()
-
-    dose_data = []
-    for med in meds:
-        # Safety check: Ensure med.times is a list before iterating
-        times_list = med.times if isinstance(med.times, list) else [] 
-        for t_str in times_list:
-            t_obj = datetime.strptime(t_str, "%H:%M").time()
-            scheduled_dt = timezone.make_aware(datetime.combine(today, t_obj))
-            try:
-                log = DoseLog.objects.get(user=request.user, medication=med, scheduled_time=scheduled_dt)
-                status = log.status
-            except DoseLog.DoesNotExist:
-                status = 'pending'
-            dose_data.append({
-                'med_id': med.id,
-                'pill_name': med.pill_name,
-                'time': t_str,
-                'status': status
-            })
-
-    taken_count = sum(1 for d in dose_data if d['status'] == 'taken')
-    missed_count = sum(1 for d in dose_data if d['status'] == 'missed')
-    pending_count = sum(1 for d in dose_data if d['status'] == 'pending')
-
+    payload = _today_dashboard(request)
     return JsonResponse({
-        'dose_data': dose_data,
-        'taken_count': taken_count,
-        'missed_count': missed_count,
-        'pending_count': pending_count,
-        'total_doses': len(dose_data)
+        'dose_data': payload['dose_data'],
+        'taken_count': payload['taken_doses'],
+        'missed_count': payload['missed_doses'],
+        'pending_count': payload['pending_doses'],
+        'total_doses': payload['total_doses']
     })
 
 
@@ -565,6 +566,39 @@ def log_dose(request):
     return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=405)
 
 
+# ===========================
+# BATCH DOSE EVENTS (offline sync)
+# ===========================
+@login_required
+@csrf_exempt
+def dose_events_batch(request):
+    """
+    Apply several dose taps at once: {"events": [{"key", "status", "dose_log_id" |
+    "med_id" + "time" [+ "date"], "taken_at"?}, ...]}. Keys make retries safe.
+    """
+    if request.method != "POST":
+        return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=405)
+    try:
+        events = json.loads(request.body).get('events')
+    except (ValueError, AttributeError):
+        events = None
+    if not isinstance(events, list):
+        return JsonResponse({'status': 'error', 'message': 'Expected {"events": [...]}'}, status=400)
+    if len(events) > settings.DOSE_BATCH_MAX_EVENTS:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'At most {settings.DOSE_BATCH_MAX_EVENTS} events per request'
+        }, status=413)
+
+    try:
+        results = apply_dose_events(request.user, events)
+    except IntegrityError:
+        # Another request is applying some of the same keys right now; a retry will see them
+        return JsonResponse({'status': 'error', 'message': 'Concurrent retry, try again'}, status=409)
+    metrics.incr('dose_batch.events', len(events))
+    return JsonResponse({'status': 'success', 'results': results})
+
+
 # ===========================
 # MARK DOSE TAKEN (For push notification action)
 # ===========================
@@ -580,7 +614,8 @@ def mark_dose_taken(request):
             )
             dose_log.status = 'taken'
             dose_log.timestamp = timezone.now()  # Update timestamp to when taken
-            dose_log.save()
+            with transaction.atomic():
+                dose_log.save()
             
             return JsonResponse({
                 'status': 'success', 
@@ -608,6 +643,8 @@ def mark_dose_taken(request):
 # GET TODAY'S DOSE LOGS
 # ===========================
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_user_data_etag('today-dose-logs'))
 def get_today_dose_logs(request):
     today = date.today()
     today_start = timezone.make_aware(datetime.combine(today, datetime.min.time()))
@@ -616,7 +653,7 @@ def get_today_dose_logs(request):
     dose_logs = DoseLog.objects.filter(
         user=request.user,
         scheduled_time__range=(today_start, today_end)
-    ).select_related('medication')
+    ).select_related('medication').order_by('scheduled_time')
     
     logs_data = []
     for log in dose_logs:
@@ -631,6 +668,163 @@ def get_today_dose_logs(request):
     return JsonResponse({'dose_logs': logs_data})
 
 
+# ===========================
+# DOSE HISTORY (keyset pagination)
+# ===========================
+@login_required
+def dose_history(request):
+    """
+    Newest-first dose history. Filters: start/end (YYYY-MM-DD, local dates), medication
+    (id), status; page with `cursor` = the previous response's next_cursor.
+    """
+    try:
+        limit = min(max(int(request.GET.get('limit', 50)), 1), 200)
+        logs = DoseLog.objects.filter(user=request.user)
+        if request.GET.get('start'):
+            start = datetime.strptime(request.GET['start'], "%Y-%m-%d").date()
+            logs = logs.filter(scheduled_time__gte=scheduled_slot(start, "00:00"))
+        if request.GET.get('end'):
+            end = datetime.strptime(request.GET['end'], "%Y-%m-%d").date()
+            logs = logs.filter(scheduled_time__lt=scheduled_slot(end + timedelta(days=1), "00:00"))
+        if request.GET.get('medication'):
+            logs = logs.filter(medication_id=int(request.GET['medication']))
+        if request.GET.get('status'):
+            logs = logs.filter(status=request.GET['status'])
+
+        logs = logs.select_related('medication').only(
+            'id', 'scheduled_time', 'timestamp', 'status',
+            'medication__id', 'medication__pill_name', 'medication__dosage'
+        )
+        page, next_cursor = keyset_page(logs, request.GET.get('cursor'), limit)
+    except (ValueError, InvalidCursor):
+        return JsonResponse({'status': 'error', 'message': 'Invalid filter or cursor'}, status=400)
+
+    return JsonResponse({
+        'dose_logs': [
+            {
+                'id': log.id,
+                'med_id': log.medication.id,
+                'medication_name': log.medication.pill_name,
+                'dosage': log.medication.dosage,
+                'scheduled_time': timezone.localtime(log.scheduled_time).isoformat(),
+                'status': log.status,
+                'taken_time': timezone.localtime(log.timestamp).isoformat() if log.status == 'taken' else None,
+            }
+            for log in page
+        ],
+        'next_cursor': next_cursor,
+    })
+
+
+# ===========================
+# DOSE HISTORY EXPORT
+# ===========================
+@login_required
+def export_dose_history(request):
+    """Full dose history as a streamed download: ?format=csv|ndjson&gzip=1"""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return JsonResponse({'status': 'error', 'message': 'format must be csv or ndjson'}, status=400)
+    gzip = request.GET.get('gzip') in ('1', 'true')
+
+    filename = f"dose-history-{timezone.localdate():%Y%m%d}.{fmt}" + (".gz" if gzip else "")
+    response = StreamingHttpResponse(
+        export_stream(request.user.id, fmt, gzip),
+        content_type='application/gzip' if gzip else ('text/csv' if fmt == 'csv' else 'application/x-ndjson')
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+# ===========================
+# DELTA SYNC (PWA)
+# ===========================
+@login_required
+def sync_view(request):
+    """
+    Changes since `since` (the previous response's cursor); without it, or when the
+    cursor is too old, a full snapshot with reset=true. Keep calling while more=true.
+    """
+    try:
+        since = int(request.GET.get('since') or 0)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid cursor'}, status=400)
+    return JsonResponse(sync.delta(request.user, since))
+
+
+# ===========================
+# LIVE DOSE EVENTS (SSE)
+# ===========================
+@login_required
+async def dose_events(request):
+    """
+    Server-sent events with this user's dose-status changes. Needs the ASGI app
+    (e.g. uvicorn crudapp.asgi:application): under WSGI an endless stream would
+    hold a worker thread, so the client is told to keep polling instead.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'status': 'error', 'message': 'Event stream requires ASGI'}, status=503)
+
+    user = await request.auser()
+    hub = get_hub()
+
+    async def stream():
+        subscription = hub.subscribe(user.id)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                message = await subscription.get(timeout=settings.SSE_HEARTBEAT_SECONDS)
+                if subscription.overflowed:
+                    # Events were dropped: discard the rest and have the client refetch
+                    while not subscription.queue.empty():
+                        subscription.queue.get_nowait()
+                    subscription.overflowed = False
+                    yield "event: resync\ndata: {}\n\n"
+                elif message is None:
+                    # Comment line: keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                else:
+                    message = json.loads(message)
+                    yield f"event: {message['event']}\ndata: {json.dumps(message['data'])}\n\n"
+        finally:
+            hub.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# ===========================
+# METRICS (staff only)
+# ===========================
+@login_required
+def metrics_view(request):
+    if not request.user.is_staff:
+        return JsonResponse({'status': 'error', 'message': 'Forbidden'}, status=403)
+
+    schedulers = [
+        {
+            'name': cursor.name,
+            'last_processed_minute': cursor.last_processed_minute,
+            'tick_lag_seconds': cursor.last_tick_lag,
+            'updated_at': cursor.updated_at,
+        }
+        for cursor in SchedulerCursor.objects.all()
+    ]
+    # Scheduler, delivery and scoring processes keep their own counters; these are their last flushes
+    processes = [
+        {
+            'source': snap.source,
+            'counters': snap.counters,
+            'gauges': snap.gauges,
+            'updated_at': snap.updated_at,
+        }
+        for snap in MetricSnapshot.objects.order_by('source')
+    ]
+    return JsonResponse({'process': metrics.snapshot(), 'processes': processes, 'schedulers': schedulers})
+
+
 # ===========================
 # GOOGLE CALENDAR INTEGRATION
 # ===========================
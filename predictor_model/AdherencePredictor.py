@@ -1,3 +1,6 @@
+# The served model is trained on real DoseLog outcomes by `python manage.py train_adherence_model`
+# (see medicines/utils/training.py); this script only reproduces the original dummy-data model.
+
 #  features of model :  "time_of_day", "dose_complexity", "past_adherence_rate", "lifestyle_routine"
 # mapping :-
 # lifestyle routine : {"regular": 1 , irregualr:0}
@@ -16,22 +16,22 @@ django.setup()
 from django.contrib.auth.models import User
 from medicines.models import Medication
 from medicines.utils.feature_extractor import extract_features
-from medicines.utils.model_loader import get_adherence_model
-import pandas as pd
+from medicines.utils.model_loader import current_model
 
 def predict_user_medication(user, medication):
     """Predict whether user will take or miss a medication"""
     try:
         features = extract_features(user, medication)
-        model = get_adherence_model()
-        
-        if model is None:
+        linear = current_model().linear
+
+        if linear is None:
             print("Model not loaded")
             return None, 0
-            
-        df = pd.DataFrame([features])
-        prediction = model.predict(df)[0]
-        prob = model.predict_proba(df)[0][prediction]
+
+        # Plain dot product + sigmoid on the feature dict; no DataFrame or sklearn call
+        miss_prob = linear.miss_probability(features)
+        prediction = 1 if miss_prob >= 0.5 else 0
+        prob = miss_prob if prediction == 1 else 1 - miss_prob
         return prediction, prob
         
     except Exception as e: